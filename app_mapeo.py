@@ -26,15 +26,15 @@ import traceback
 # Importar módulos del sistema de mapeo
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 try:
-    from ia_mapeo import analizar_archivo, extraer_atributos, inferir_categoria, enriquecer_datos
+    from ia_mapeo import analizar_archivo, extraer_atributos, inferir_categoria, enriquecer_bloques
     from convertidor_proveedores import (
-        detectar_proveedor, 
-        leer_archivo, 
-        generar_product_template,
-        procesar_almce,
-        procesar_bsh,
-        procesar_cecotec
+        identificar_archivo,
+        bloques_archivo, 
+        normalizar_bloques,
+        plantillas_odoo,
+        ErrorLectura
     )
+    import tuberia
 except ImportError as e:
     print(f"Error al importar módulos: {e}")
 
@@ -121,36 +121,28 @@ def analizar(filename):
     
     try:
         # Detectar proveedor
-        proveedor = detectar_proveedor(filename)
+        proveedor, _ = identificar_archivo(filepath)
         if not proveedor:
             flash('No se pudo detectar el proveedor del archivo')
             return redirect(url_for('index'))
         
-        # Leer archivo
-        df = leer_archivo(filepath)
-        if df is None:
-            flash('Error al leer el archivo')
-            return redirect(url_for('index'))
-        
-        # Procesar según el proveedor
-        if proveedor == 'ALMCE':
-            df = procesar_almce(df)
-        elif proveedor == 'BSH':
-            df = procesar_bsh(df)
-        elif proveedor == 'CECOTEC':
-            df = procesar_cecotec(df)
-        
-        # Generar plantilla de producto
-        df_template = generar_product_template(df, proveedor)
-        
-        # Guardar resultados
+        # Leer, procesar según el perfil del proveedor y guardar la plantilla de
+        # producto con las mismas etapas de la tubería que el convertidor
         nombre_base = os.path.splitext(filename)[0]
         ruta_salida = os.path.join(DIR_SALIDA, f"{nombre_base}_template.csv")
-        df_template.to_csv(ruta_salida, index=False)
+        tuberia.ejecutar(
+            bloques_archivo(filepath),
+            [('proceso', lambda bloques: normalizar_bloques(bloques, proveedor)),
+             ('plantillas', lambda bloques: plantillas_odoo(bloques, proveedor))],
+            [tuberia.SumideroCSV({'product_template': ruta_salida})]
+        )
         
         flash(f'Archivo analizado correctamente. Resultados guardados en {ruta_salida}')
         return redirect(url_for('index'))
         
+    except ErrorLectura:
+        flash('Error al leer el archivo')
+        return redirect(url_for('index'))
     except Exception as e:
         flash(f'Error al procesar el archivo: {str(e)}')
         traceback.print_exc()  # Imprimir el traceback completo para debugging
@@ -169,20 +161,21 @@ def convertir(filename):
         return redirect(url_for('index'))
     
     try:
-        # Analizar archivo
-        df_enriquecido = analizar_archivo(filepath)
-        
-        if df_enriquecido is None:
+        proveedor, _ = identificar_archivo(filepath)
+        if not proveedor:
             flash(f'No se pudo analizar el archivo {filename}')
             return redirect(url_for('index'))
         
-        # Convertir a formato Odoo
-        df_odoo = generar_product_template(df_enriquecido)
-        
-        # Guardar archivo
+        # Leer, enriquecer y convertir a formato Odoo bloque a bloque
         nombre_base = os.path.splitext(filename)[0]
         ruta_salida = os.path.join(DIR_SALIDA, f"{nombre_base}_odoo.csv")
-        df_odoo.to_csv(ruta_salida, index=False)
+        tuberia.ejecutar(
+            bloques_archivo(filepath),
+            [('proceso', lambda bloques: normalizar_bloques(bloques, proveedor)),
+             ('enriquecimiento', enriquecer_bloques),
+             ('plantillas', lambda bloques: plantillas_odoo(bloques, proveedor))],
+            [tuberia.SumideroCSV({'product_template': ruta_salida})]
+        )
         
         flash(f'Archivo convertido y guardado como {nombre_base}_odoo.csv')
         return redirect(url_for('index'))
@@ -228,7 +221,7 @@ def api_analizar(filename):
     
     try:
         # Detectar proveedor
-        proveedor = detectar_proveedor(filename)
+        proveedor, _ = identificar_archivo(filepath)
         
         # Analizar archivo
         df_enriquecido = analizar_archivo(filepath)
@@ -249,7 +242,7 @@ def api_analizar(filename):
         # Convertir a formato Odoo
         df_odoo = None
         try:
-            df_odoo = generar_product_template(df_enriquecido)
+            df_odoo = next(plantillas_odoo([df_enriquecido], proveedor))['product_template']
         except Exception as e:
             print(f"Error al generar formato Odoo: {str(e)}")
         
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de serialización del catálogo de productos
+
+Compara el coste de CPU por petición de /api/v1/products con un catálogo de
+10.000 productos en dos variantes:
+- Ruta de FastAPI con response_model: validación Pydantic, jsonable_encoder y
+  json.dumps en cada petición.
+- Ruta rápida: bytes JSON pre-codificados servidos desde PayloadCache.
+
+Uso:
+    python benchmarks/bench_catalogo_json.py [--productos 10000] [--repeticiones 20]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from main import Product
+from response_cache import PayloadCache, RawJSONResponse
+
+
+def generar_catalogo(n):
+    """Genera un catálogo sintético con la forma que devuelve get_products"""
+    return [
+        {
+            "id": i,
+            "name": f"Producto de prueba {i} con descripción larga",
+            "code": f"PROD-{i:06d}",
+            "category": f"Categoría {i % 25}",
+            "price": round(10 + (i % 1000) * 1.37, 2),
+            "stock": i % 40,
+            "image_url": f"https://example.com/images/product_{i}.jpg",
+        }
+        for i in range(n)
+    ]
+
+
+def medir(funcion, repeticiones):
+    """Devuelve el tiempo de CPU medio por llamada en milisegundos"""
+    funcion()  # calentamiento
+    inicio = time.process_time()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.process_time() - inicio) / repeticiones * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de serialización del catálogo')
+    parser.add_argument('--productos', type=int, default=10000, help='Número de productos del catálogo')
+    parser.add_argument('--repeticiones', type=int, default=20, help='Peticiones simuladas por variante')
+    args = parser.parse_args()
+
+    catalogo = generar_catalogo(args.productos)
+    campo = create_response_field(name="Response_Get_Products", type_=List[Product])
+
+    bucle = asyncio.new_event_loop()
+
+    def ruta_response_model():
+        contenido = bucle.run_until_complete(serialize_response(field=campo, response_content=catalogo))
+        return JSONResponse(contenido).body
+
+    cache = PayloadCache(ttl_seconds=3600)
+    inicio = time.process_time()
+    cache.put("products", Product, catalogo)
+    coste_llenado = (time.process_time() - inicio) * 1000
+
+    def ruta_cache():
+        return RawJSONResponse(cache.get("products").body).body
+
+    assert len(ruta_cache()) > 0
+
+    ms_modelo = medir(ruta_response_model, args.repeticiones)
+    ms_cache = medir(ruta_cache, args.repeticiones)
+
+    print(f"Catálogo: {args.productos} productos, {args.repeticiones} peticiones por variante")
+    print(f"response_model (por petición):   {ms_modelo:10.3f} ms CPU")
+    print(f"caché pre-codificada (por pet.): {ms_cache:10.3f} ms CPU")
+    print(f"llenado de caché (una vez):      {coste_llenado:10.3f} ms CPU")
+    print(f"CPU ahorrada por petición:       {ms_modelo - ms_cache:10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark del motor de conversión de tarifas de proveedores
+
+Genera tarifas sintéticas con la disposición de los CSV de ejemplos/ (fila de
+título con el proveedor, cabecera CÓDIGO / DESCRIPCIÓN / ... / TOTAL /
+P.V.P FINAL CLIENTE, filas de categoría con solo el código y productos con
+marca, capacidad y potencia en la descripción) y mide por separado cada etapa
+de la conversión:
+
+- lectura: leer_hojas (read_csv con las opciones del perfil)
+- proceso: procesar_hojas (categorías, productos y precios)
+- enriquecimiento: enriquecer_datos de ia_mapeo (atributos y categorías)
+- plantillas: tablas product_template y product_product con sus IDs externos
+- escritura: CSV y tabla Arrow de las dos tablas
+- conversion: convertir_archivo completo (tubería de extremo a extremo)
+
+Cada tamaño se mide dos veces: una sin instrumentar para los tiempos y otra
+con tracemalloc para la memoria máxima reservada durante cada etapa (solo lo
+que reserva Python y numpy; los búferes de pyarrow no se cuentan). Los
+resultados se guardan en JSON para compararlos entre commits:
+
+    python benchmarks/bench_conversion.py --guardar base.json
+    (cambios)
+    python benchmarks/bench_conversion.py --comparar base.json
+
+Uso:
+    python benchmarks/bench_conversion.py [--tamanos 1000 100000 1000000] [--max-enriquecimiento 100000]
+                                          [--guardar RUTA] [--comparar RUTA] [--umbral 0.2]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tuberia
+from convertidor_proveedores import convertir_archivo, leer_hojas, plantillas_odoo, procesar_hojas
+from ia_mapeo import enriquecer_datos
+
+PROVEEDOR = 'BSH'
+
+# Cabecera de las tarifas con formato de BSH, CECOTEC, MIELECTRO... (14 columnas)
+CABECERA = ['CÓDIGO', 'DESCRIPCIÓN', 'UNID.', 'IMPORTE BRUTO', 'DTO', 'TOTAL', 'IVA 21% + RECARGO 5,2%',
+            'MARGEN ', 'PVP WEB', 'P.V.P FINAL CLIENTE', 'BENEFICIO UNITARIO', 'BENEFICIO TOTAL',
+            'VENDIDAS', 'QUEDAN EN TIENDA']
+
+CATEGORIAS = ['LAVADORAS', 'FRIGORIFICOS', 'LAVAVAJILLAS', 'HORNOS', 'CAMPANAS', 'SECADORAS',
+              'CONGELADORES', 'PAE', 'A/A', 'TELEVISORES']
+MARCAS = ['BALAY', 'BOSCH', 'SIEMENS', 'NEFF', 'CORBERO', 'BEKO', 'ARTICA', 'TEKA']
+PRODUCTOS = ['LAVADORA {kg}KG, {rpm} RPM "{letra}"', 'FRIGORIFICO COMBI 186x60 "{letra}"',
+             'LAVAVAJILLAS 60CM {kg} SERVICIOS', 'HORNO MULTIFUNCION {litros}L {w}W', 'CAMPANA DECORATIVA 90CM',
+             'SECADORA BOMBA DE CALOR {kg}KG', 'CONGELADOR VERTICAL {litros}L', 'BATIDORA VARILLA {w}W',
+             'A/A INVERTER 3000F WIFI', 'TELEVISOR LED 55"']
+
+# Cada cuántos productos empieza una categoría y cada cuántos hay una fila vacía
+PRODUCTOS_POR_CATEGORIA = 40
+FILAS_VACIAS = 97
+
+ETAPAS = ['lectura', 'proceso', 'enriquecimiento', 'plantillas', 'escritura', 'conversion']
+
+
+def generar_tarifa(ruta, n, semilla=0):
+    """Escribe una tarifa CSV sintética de `n` productos con la disposición de ejemplos/"""
+    rng = np.random.default_rng(semilla)
+    indices = np.arange(n)
+    descripciones = pd.Series(np.array(PRODUCTOS, dtype=object)[indices % len(PRODUCTOS)])
+    for marcador, valores in (('{kg}', rng.integers(6, 13, n)), ('{rpm}', rng.choice([1000, 1200, 1400], n)),
+                              ('{letra}', rng.choice(list('ABCDE'), n)), ('{litros}', rng.integers(50, 400, n)),
+                              ('{w}', rng.integers(4, 30, n) * 100)):
+        # Cada marcador aparece como mucho una vez por plantilla: antes + valor + después
+        con_marcador = descripciones.str.contains(marcador, regex=False).to_numpy()
+        partes = descripciones[con_marcador].str.split(marcador, n=1, expand=True)
+        valores = pd.Series(valores[con_marcador], index=partes.index).astype(str)
+        descripciones[con_marcador] = partes[0] + valores + partes[1]
+    marcas = np.array(MARCAS, dtype=object)[rng.integers(0, len(MARCAS), n)]
+    descripciones = '(' + pd.Series(marcas) + ') ' + descripciones
+
+    bruto = np.round(rng.uniform(20, 900, n), 2)
+    dto = np.where(rng.random(n) < 0.3, np.round(bruto * 0.1, 2), np.nan)
+    total = np.round(bruto - np.nan_to_num(dto), 2)
+    iva = np.round(total * 1.262, 4)
+    margen = np.round(iva * 1.3, 4)
+    pvp = np.round(margen, 0)
+    unidades = pd.array(rng.integers(1, 8, n), dtype='Int64')
+    productos = pd.DataFrame({
+        0: pd.Series(indices).map('{:07d}'.format).radd('3TS'),
+        1: descripciones,
+        2: unidades,
+        3: bruto,
+        4: dto,
+        5: total,
+        6: iva,
+        7: margen,
+        8: np.where(rng.random(n) < 0.5, np.round(pvp * 1.1, 2), np.nan),
+        # Precio con formato contable de Excel en algunas filas ("  -   € " es cero)
+        9: pd.Series(pvp).astype(object).where(rng.random(n) >= 0.01, '  -   € '),
+        10: np.round(pvp - iva, 4),
+        11: np.round((pvp - iva) * unidades, 4),
+        12: pd.Series(rng.integers(1, 4, n), dtype='Int64').where(rng.random(n) < 0.2),
+        13: np.nan,
+    })
+    # Posición de cada fila: una de categoría antes de cada grupo y alguna vacía entre medias
+    posicion = indices + indices // PRODUCTOS_POR_CATEGORIA + 1 + indices // FILAS_VACIAS
+    inicios = indices[::PRODUCTOS_POR_CATEGORIA]
+    categorias = pd.DataFrame({0: np.array(CATEGORIAS, dtype=object)[(inicios // PRODUCTOS_POR_CATEGORIA)
+                                                                      % len(CATEGORIAS)]})
+    categorias.index = posicion[inicios] - 1
+    vacias = indices[FILAS_VACIAS - 1::FILAS_VACIAS]
+    productos.index = posicion
+    filas = pd.concat([productos, categorias, pd.DataFrame(index=posicion[vacias] + 1)]).sort_index()
+    filas = filas.reindex(columns=range(len(CABECERA)))
+
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        # Título con el nombre del proveedor y cabecera, como en las exportaciones de ejemplos/
+        f.write(','.join([PROVEEDOR] + [f"__EMPTY_{i}" for i in range(1, len(CABECERA))]) + '\n')
+        pd.DataFrame([CABECERA]).to_csv(f, header=False, index=False)
+        filas.to_csv(f, header=False, index=False)
+    return ruta
+
+
+def _escribir(tablas, directorio):
+    rutas = {nombre: os.path.join(directorio, f"bench_{nombre}.csv") for nombre in tablas}
+    for sumidero in (tuberia.SumideroCSV(rutas), tuberia.SumideroArrow(rutas)):
+        sumidero.escribir(tablas)
+        sumidero.cerrar()
+
+
+def medir_etapas(ruta, directorio, n, enriquecer=True, memoria=False):
+    """Segundos (o MB máximos reservados, con `memoria`) de cada etapa de la conversión de una tarifa de `n` productos"""
+    medidas = {}
+
+    def medir(nombre, funcion, *args):
+        if memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        segundos = time.perf_counter() - inicio
+        if memoria:
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            medidas[nombre] = round(pico / (1024 * 1024), 1)
+        else:
+            medidas[nombre] = round(segundos, 4)
+        return resultado
+
+    hojas = medir('lectura', leer_hojas, ruta)
+    productos = medir('proceso', procesar_hojas, hojas, PROVEEDOR)
+    assert len(productos) == n, f"{len(productos)} productos de {n}"
+    if enriquecer:
+        medir('enriquecimiento', enriquecer_datos, productos)
+    tablas = medir('plantillas', lambda df: next(plantillas_odoo([df], PROVEEDOR)), productos)
+    medir('escritura', _escribir, tablas, directorio)
+    del hojas, productos, tablas
+    resultado = medir('conversion', convertir_archivo, ruta, directorio)
+    assert resultado['estado'] == 'ok', resultado['error']
+    for salida in resultado['salidas']:
+        os.remove(salida)
+    return medidas
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, base, umbral):
+    """Imprime la relación actual/base de cada etapa y devuelve las regresiones de tiempo"""
+    regresiones = []
+    print(f"\nComparación con la línea base ({base.get('commit')}, {base.get('fecha')}):")
+    print(f"{'filas':>9} {'etapa':<16} {'base (s)':>10} {'actual (s)':>11} {'relación':>9}")
+    for n, medidas in actual['resultados'].items():
+        anteriores = base['resultados'].get(n)
+        if anteriores is None:
+            continue
+        for etapa, segundos in medidas['segundos'].items():
+            previo = anteriores['segundos'].get(etapa)
+            if not previo:
+                continue
+            relacion = segundos / previo
+            # Por debajo de 10 ms el ruido domina
+            peor = relacion > 1 + umbral and segundos - previo > 0.01
+            if peor:
+                regresiones.append((n, etapa, relacion))
+            print(f"{n:>9} {etapa:<16} {previo:>10.4f} {segundos:>11.4f} {relacion:>8.2f}x{' !' if peor else ''}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del motor de conversión de tarifas')
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help='Número de productos de cada tarifa sintética')
+    parser.add_argument('--max-enriquecimiento', type=int, default=100000,
+                        help='Tamaño máximo para medir el enriquecimiento de ia_mapeo (fila a fila)')
+    parser.add_argument('--sin-memoria', action='store_true', help='Medir solo tiempos (sin la pasada con tracemalloc)')
+    parser.add_argument('--guardar', metavar='RUTA', help='Guardar los resultados en este JSON (línea base)')
+    parser.add_argument('--comparar', metavar='RUTA', help='Comparar con una línea base guardada con --guardar')
+    parser.add_argument('--umbral', type=float, default=0.2,
+                        help='Aumento relativo de tiempo que cuenta como regresión al comparar')
+    args = parser.parse_args()
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        # Calentamiento (importaciones perezosas de pandas y pyarrow)
+        medir_etapas(generar_tarifa(os.path.join(directorio, f"PVP {PROVEEDOR}_calentamiento.csv"), 200), directorio, 200)
+
+        print(f"{'filas':>9} " + ' '.join(f"{etapa:>15}" for etapa in ETAPAS))
+        for n in args.tamanos:
+            ruta = generar_tarifa(os.path.join(directorio, f"PVP {PROVEEDOR}_sintetico_{n}.csv"), n)
+            enriquecer = n <= args.max_enriquecimiento
+            segundos = medir_etapas(ruta, directorio, n, enriquecer)
+            resultados[str(n)] = {'bytes': os.path.getsize(ruta), 'segundos': segundos}
+            print(f"{n:>9} " + ' '.join(f"{segundos[e]:>14.3f}s" if e in segundos else f"{'-':>15}" for e in ETAPAS))
+            if not args.sin_memoria:
+                memoria = medir_etapas(ruta, directorio, n, enriquecer, memoria=True)
+                resultados[str(n)]['memoria_mb'] = memoria
+                print(f"{'':>9} " + ' '.join(f"{memoria[e]:>13.1f}MB" if e in memoria else f"{'-':>15}" for e in ETAPAS))
+            os.remove(ruta)
+
+    actual = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'resultados': resultados,
+    }
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump(actual, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados guardados en {args.guardar}")
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(actual, base, args.umbral)
+        if regresiones:
+            print(f"\n{len(regresiones)} etapas más de un {args.umbral:.0%} más lentas que la línea base")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Caché de hojas de Excel ya leídas
+
+Leer un .xlsx con openpyxl es lo más lento de convertir o analizar un archivo
+de proveedor. Las hojas leídas de un libro se guardan en formato Arrow IPC bajo
+una clave que combina el hash del contenido del archivo y las opciones de
+lectura (hojas, fila de cabecera); mientras el archivo no cambie, las lecturas
+siguientes abren las hojas con memoria mapeada y no vuelven a parsear el Excel.
+
+Las columnas de tipo object de pandas (mezcla de textos, números y fechas,
+como los códigos de CECOTEC) se guardan como texto más una columna con el tipo
+original de cada celda, para que el DataFrame recuperado sea idéntico al leído.
+
+El directorio se configura con CACHE_HOJAS_DIR; vacío desactiva la caché.
+Sin pyarrow instalado la caché tampoco se usa.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pyarrow es opcional; sin él siempre se lee el Excel
+    pa = None
+
+DIR_CACHE = os.getenv("CACHE_HOJAS_DIR", os.path.join(os.path.expanduser("~"), ".cache", "manusodoo", "hojas"))
+VERSION_FORMATO = 1
+
+# Tipo de cada celda de una columna object: etiqueta -> (tipo, texto -> valor)
+_TIPOS = {
+    0: (type(None), lambda texto: None),
+    1: (str, lambda texto: texto),
+    2: (bool, lambda texto: texto == 'True'),
+    3: (int, int),
+    4: (float, float),
+    5: (pd.Timestamp, pd.Timestamp),
+    6: (datetime.datetime, datetime.datetime.fromisoformat),
+    7: (datetime.date, datetime.date.fromisoformat),
+    8: (datetime.time, datetime.time.fromisoformat),
+}
+_ETIQUETAS = {tipo: etiqueta for etiqueta, (tipo, _) in _TIPOS.items()}
+_ETIQUETAS.update({np.bool_: 2, np.int64: 3, np.float64: 4})
+
+# Hashes ya calculados en este proceso: (ruta, tamaño, fecha de modificación) -> hash
+_hashes = {}
+
+
+class _NoSerializable(Exception):
+    """La hoja contiene valores que la caché no sabe guardar"""
+
+
+def _codificar_valor(valor):
+    etiqueta = _ETIQUETAS.get(type(valor))
+    if etiqueta is None:
+        raise _NoSerializable(type(valor).__name__)
+    if etiqueta == 0:
+        return 0, None
+    if etiqueta == 4:
+        return 4, repr(float(valor))
+    if etiqueta in (5, 6, 7, 8):
+        return etiqueta, valor.isoformat()
+    return etiqueta, str(valor)
+
+
+def _decodificar_valor(etiqueta, texto):
+    return _TIPOS[etiqueta][1](texto)
+
+
+def hash_archivo(ruta):
+    """SHA-256 del contenido del archivo (memorizado por ruta, tamaño y fecha)"""
+    estado = os.stat(ruta)
+    firma = (os.path.abspath(ruta), estado.st_size, estado.st_mtime_ns)
+    if firma not in _hashes:
+        h = hashlib.sha256()
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloque)
+        _hashes[firma] = h.hexdigest()
+    return _hashes[firma]
+
+
+def clave(ruta, opciones):
+    """Clave de la caché: contenido del archivo, opciones de lectura y versión de pandas"""
+    h = hashlib.sha256(hash_archivo(ruta).encode())
+    h.update(json.dumps([opciones, pd.__version__, VERSION_FORMATO], sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def _a_tabla(df):
+    """Convierte el DataFrame en una tabla Arrow con los metadatos para reconstruirlo"""
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        raise _NoSerializable('índice')
+    arrays, nombres, columnas = [], [], []
+    for i, nombre in enumerate(df.columns):
+        serie = df.iloc[:, i]
+        columnas.append({'nombre': list(_codificar_valor(nombre)), 'dtype': str(serie.dtype)})
+        if serie.dtype == object:
+            codificados = [_codificar_valor(v) for v in serie.to_numpy()]
+            arrays.append(pa.array([texto for _, texto in codificados], type=pa.string()))
+            arrays.append(pa.array([etiqueta for etiqueta, _ in codificados], type=pa.int8()))
+            nombres.extend([f"c{i}", f"c{i}_tipo"])
+        elif serie.dtype.kind in 'biufM':
+            arrays.append(pa.array(serie.to_numpy(), from_pandas=True))
+            nombres.append(f"c{i}")
+        else:
+            raise _NoSerializable(str(serie.dtype))
+    metadatos = {'columnas': columnas, 'filas': len(df)}
+    tabla = pa.Table.from_arrays(arrays, names=nombres) if arrays else pa.table({})
+    return tabla.replace_schema_metadata({'hoja': json.dumps(metadatos)})
+
+
+def _a_dataframe(tabla):
+    """Reconstruye el DataFrame original a partir de la tabla Arrow"""
+    metadatos = json.loads(tabla.schema.metadata[b'hoja'])
+    datos, nombres = {}, []
+    for i, columna in enumerate(metadatos['columnas']):
+        nombres.append(_decodificar_valor(*columna['nombre']))
+        if columna['dtype'] == 'object':
+            textos = tabla.column(f"c{i}").to_numpy(zero_copy_only=False)
+            etiquetas = tabla.column(f"c{i}_tipo").to_numpy()
+            valores = np.empty(len(etiquetas), dtype=object)
+            for etiqueta, (_, convertir) in _TIPOS.items():
+                filas = np.flatnonzero(etiquetas == etiqueta)
+                if len(filas) == 0:
+                    continue
+                if etiqueta == 1:
+                    valores[filas] = textos[filas]
+                else:
+                    valores[filas] = [convertir(t) for t in textos[filas]]
+            datos[i] = valores
+        else:
+            datos[i] = tabla.column(f"c{i}").to_pandas().astype(columna['dtype']).to_numpy()
+    df = pd.DataFrame(datos, index=pd.RangeIndex(metadatos['filas']))
+    df.columns = pd.Index(nombres) if nombres else df.columns
+    return df
+
+
+def _guardar_tabla(ruta_cache, df):
+    tabla = _a_tabla(df)
+    with pa.OSFile(ruta_cache, 'wb') as destino:
+        with pa.ipc.new_file(destino, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+
+
+def _abrir_tabla(ruta_cache):
+    # El archivo se mapea sin leerlo entero, pero _a_dataframe decodifica cada columna
+    # a un array de numpy propio: el DataFrame es una copia, no una vista del mapa
+    return _a_dataframe(pa.ipc.open_file(pa.memory_map(ruta_cache, 'r')).read_all())
+
+
+def cargar_libro(ruta, opciones, leer):
+    """Devuelve las hojas de un libro ({nombre: DataFrame}) desde la caché o las lee con `leer()`
+
+    `opciones` describe la lectura (hojas, fila de cabecera...) y forma parte
+    de la clave, igual que el contenido del archivo. Cada hoja se guarda en su
+    propio archivo Arrow dentro de un directorio por clave, junto a un índice
+    con los nombres de las hojas.
+    """
+    if pa is None or not DIR_CACHE:
+        return leer()
+
+    directorio = os.path.join(DIR_CACHE, clave(ruta, opciones))
+    indice = os.path.join(directorio, 'hojas.json')
+    if os.path.exists(indice):
+        try:
+            with open(indice, encoding='utf-8') as f:
+                nombres = json.load(f)
+            return {nombre: _abrir_tabla(os.path.join(directorio, f"{i}.arrow")) for i, nombre in enumerate(nombres)}
+        except Exception as e:
+            print(f"Caché de hojas ilegible, se vuelve a leer {os.path.basename(ruta)}: {str(e)}")
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    hojas = leer()
+    if hojas is None:
+        return hojas
+    temporal = f"{directorio}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(temporal, exist_ok=True)
+        for i, df in enumerate(hojas.values()):
+            _guardar_tabla(os.path.join(temporal, f"{i}.arrow"), df)
+        with open(os.path.join(temporal, 'hojas.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(hojas), f, ensure_ascii=False)
+        # Renombrado atómico: un lector nunca ve un libro a medio escribir
+        os.rename(temporal, directorio)
+    except _NoSerializable:
+        pass  # Hoja con tipos que no se guardan; se leerá del Excel cada vez
+    except OSError as e:
+        # Otro proceso pudo guardar el mismo libro a la vez; su copia es igual de válida
+        if not os.path.exists(indice):
+            print(f"No se pudo guardar el libro en la caché: {str(e)}")
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+    return hojas
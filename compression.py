@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compresión de respuestas HTTP (brotli/gzip) para el middleware FastAPI
+
+Negocia la codificación a partir de la cabecera Accept-Encoding y comprime
+solo las respuestas que superan un tamaño mínimo. Las respuestas que ya traen
+Content-Encoding (por ejemplo, variantes precomprimidas de la caché) se
+envían tal cual.
+"""
+
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from tracing import span
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se ofrece gzip
+    brotli = None
+
+# Orden de preferencia cuando el cliente acepta varias codificaciones
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Elige la mejor codificación soportada según Accept-Encoding o None"""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip()] = quality
+
+    wildcard = accepted.get("*")
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = accepted.get(encoding, wildcard)
+        if quality is not None and quality > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Comprime un cuerpo completo con la codificación indicada"""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+    raise ValueError(f"Codificación no soportada: {encoding}")
+
+
+class _StreamCompressor:
+    """Compresor incremental para respuestas enviadas en varios fragmentos"""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._process = self._compressor.process
+            self._finish = self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._process = self._compressor.compress
+            self._finish = self._compressor.flush
+
+    def feed(self, data: bytes, last: bool) -> bytes:
+        chunk = self._process(data)
+        if last:
+            chunk += self._finish()
+        return chunk
+
+
+class CompressionMiddleware:
+    """Middleware ASGI que comprime con brotli o gzip por encima de un umbral"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "passthrough": False, "compressor": None}
+
+        async def send_compressed(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Retener la cabecera hasta conocer el tamaño del primer fragmento
+                state["start"] = message
+                state["passthrough"] = "content-encoding" in Headers(raw=message["headers"])
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if state["passthrough"]:
+                if state["start"] is not None:
+                    await send(state["start"])
+                    state["start"] = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if state["start"] is not None:
+                start, state["start"] = state["start"], None
+                headers = MutableHeaders(raw=start["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                    state["compressor"] = _StreamCompressor(encoding)
+                    message["body"] = state["compressor"].feed(body, last=False)
+                else:
+                    with span("response.compress", encoding=encoding, size=len(body)):
+                        message["body"] = compress(body, encoding)
+                    headers["Content-Length"] = str(len(message["body"]))
+                await send(start)
+                await send(message)
+                return
+
+            message["body"] = state["compressor"].feed(body, last=not more_body)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
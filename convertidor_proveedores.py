@@ -10,50 +10,46 @@ y convierte los datos al formato requerido por las plantillas de Odoo.
 
 import os
 import re
+import json
+import time
+import logging
+import cProfile
+import pstats
+import multiprocessing
+import multiprocessing.connection
 import pandas as pd
 import numpy as np
 import argparse
-import uuid
+import hashlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-# Configuración de mapeos para diferentes proveedores
-PROVEEDORES_CONFIG = {
-    'ALMCE': {
-        'detector': r'PVP\s+ALMCE',
-        'columnas_producto': {
-            'codigo': 'CÓDIGO',
-            'nombre': '__EMPTY_1',  # Puede variar, se ajusta dinámicamente
-            'categoria': None,  # Se infiere de la estructura
-        },
-        'tiene_categorias': True,
-        'categoria_actual': None
-    },
-    'BSH': {
-        'detector': r'PVP[\s_]*BSH',
-        'columnas_producto': {
-            'codigo': 'CÓDIGO',
-            'nombre': 'DESCRIPCIÓN',
-            'precio': 'TOTAL',
-            'precio_venta': 'P.V.P FINAL CLIENTE',
-            'categoria': None,  # Se infiere de la estructura
-        },
-        'tiene_categorias': True,
-        'categoria_actual': None
-    },
-    'CECOTEC': {
-        'detector': r'PVP[\s_]*CECOTEC',
-        'columnas_producto': {
-            'codigo': 'CÓDIGO',
-            'nombre': 'DESCRIPCIÓN',
-            'precio': 'TOTAL',
-            'precio_venta': 'P.V.P FINAL CLIENTE',
-            'categoria': None,  # Se infiere de la estructura
-        },
-        'tiene_categorias': True,
-        'categoria_actual': None
-    },
-    # Añadir más proveedores según sea necesario
-}
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pyarrow es opcional; sin él los códigos se normalizan con cadenas de Python
+    pa = None
+
+try:
+    import resource
+except ImportError:  # resource solo existe en Unix; sin él no se mide la memoria máxima
+    resource = None
+
+import cache_hojas
+import tablas_odoo
+import tuberia
+
+# Perfiles de proveedores (detector, lectura, columnas y valores de Odoo)
+from perfiles_proveedores import PERFILES, detectar_proveedor, valores_odoo, version_perfil
+# Proveedor por el contenido cuando el nombre del archivo no lo dice
+from huellas_proveedores import identificar_archivo, normalizar_etiqueta
+from precios import parsear_precios
+
+logger = logging.getLogger('convertidor_proveedores')
+# Un registro JSON por archivo convertido (ver emitir_metricas)
+logger_metricas = logging.getLogger('convertidor_proveedores.metricas')
+logger_metricas.propagate = False
 
 # Estructura de columnas para las plantillas de Odoo
 ODOO_TEMPLATE_COLUMNS = {
@@ -105,203 +101,322 @@ ODOO_TEMPLATE_COLUMNS = {
     ]
 }
 
-def detectar_proveedor(nombre_archivo):
-    """Detecta el proveedor basado en el nombre del archivo"""
-    nombre_archivo = nombre_archivo.upper()
-    
-    for proveedor, config in PROVEEDORES_CONFIG.items():
-        if re.search(config['detector'], nombre_archivo):
-            return proveedor
-    
-    return None
-
-def procesar_almce(df):
-    """Procesa los datos específicos de ALMCE"""
-    # Limpiar y normalizar columnas
-    df['codigo'] = df['CÓDIGO'].astype(str).str.strip()
-    df['nombre'] = df['__EMPTY_1'].astype(str).str.strip()
-    df['precio'] = pd.to_numeric(df['TOTAL'].str.replace(',', '.'), errors='coerce')
-    df['precio_venta'] = pd.to_numeric(df['P.V.P FINAL CLIENTE'].str.replace(',', '.'), errors='coerce')
-    
-    return df
-
-def procesar_bsh(df):
-    """Procesa el formato específico de BSH"""
-    # Normalizar nombres de columnas a mayúsculas y sin espacios
-    df.columns = [col.upper().strip() if isinstance(col, str) else col for col in df.columns]
-    
-    # Mapeo flexible de nombres de columnas
-    columnas_esperadas = {
-        'CODIGO': ['CÓDIGO', 'CODIGO', 'COD', 'REFERENCE', 'REF'],
-        'DESCRIPCION': ['DESCRIPCIÓN', 'DESCRIPCION', 'NOMBRE', 'PRODUCT', 'DESIGNATION'],
-        'TOTAL': ['TOTAL', 'PRECIO', 'COSTE', 'PRICE'],
-        'PVP': ['P.V.P FINAL CLIENTE', 'PVP', 'PRECIO VENTA', 'SALES PRICE']
+# Versión de la lógica de conversión; subirla invalida las conversiones registradas
+VERSION_CONVERSION = 4
+REGISTRO_CONVERSIONES = 'registro_conversiones.json'
+METRICAS_CONVERSION = 'metricas_conversion.jsonl'
+
+# Lectura de archivos de proveedores no detectados
+LECTURA_POR_DEFECTO = {'hoja': 0, 'fila_cabecera': 0}
+
+# Filas por bloque en la lectura en streaming de CSV grandes
+FILAS_POR_BLOQUE = 50000
+
+# Bloques que la lectura puede adelantar a la escritura en streaming (contrapresión)
+BLOQUES_EN_VUELO = 2
+
+def _columna(df, nombre):
+    """Columna del DataFrame o una serie vacía si no existe"""
+    if nombre in df.columns:
+        return df[nombre]
+    return pd.Series(np.nan, index=df.index, dtype=object)
+
+def _texto(columna):
+    """Texto sin espacios en los extremos; NaN en las celdas que no son texto"""
+    try:
+        return columna.str.strip()
+    except AttributeError:
+        # Columna sin ningún texto (numérica o vacía)
+        return pd.Series(np.nan, index=columna.index, dtype=object)
+
+def _es_entero(columna):
+    """Celdas con un entero de Python (los códigos numéricos de Excel)"""
+    if pd.api.types.is_integer_dtype(columna) or pd.api.types.is_bool_dtype(columna):
+        return pd.Series(True, index=columna.index)
+    if columna.dtype == object:
+        return columna.map(type).isin((int, bool))
+    return pd.Series(False, index=columna.index)
+
+def _sin_texto(columna):
+    """Celdas vacías o que solo contienen espacios"""
+    return columna.isna() | (columna.astype(str).str.strip() == '')
+
+def _categorias(valores, es_categoria, estado=None):
+    """Categoría vigente en cada fila: la última fila de categoría por encima
+    
+    Con lectura por bloques, `estado` guarda la categoría vigente al final del
+    bloque anterior, que se aplica a las primeras filas del siguiente.
+    """
+    anterior = estado.get('categoria') if estado is not None else None
+    if not es_categoria.any():
+        return pd.Series(anterior, index=valores.index, dtype=object)
+    categorias = valores.where(es_categoria).ffill()
+    if anterior is not None:
+        categorias = categorias.fillna(anterior)
+    if estado is not None and len(categorias):
+        estado['categoria'] = categorias.iloc[-1] if pd.notna(categorias.iloc[-1]) else anterior
+    return categorias.astype(object).where(categorias.notna(), None)
+
+def _a_objeto(columna, filas):
+    valores = columna.to_numpy(dtype=object)[filas]
+    valores[pd.isna(valores)] = None
+    return valores
+
+def _productos(es_producto, columnas):
+    """DataFrame de productos con las filas seleccionadas por la máscara"""
+    filas = es_producto.to_numpy(dtype=bool)
+    if not filas.any():
+        return pd.DataFrame()
+    datos = {nombre: _a_objeto(valores, filas) for nombre, valores in columnas.items()}
+    # Mismos tipos que al construir el DataFrame fila a fila (precios numéricos -> float64)
+    return pd.DataFrame(datos).infer_objects()
+
+def _descartes(es_categoria, con_codigo, con_nombre):
+    """Filas que no son productos, por motivo"""
+    sin_categoria = ~es_categoria
+    return {
+        'categoria': int(es_categoria.sum()),
+        'sin_codigo': int((sin_categoria & ~con_codigo).sum()),
+        'sin_nombre': int((sin_categoria & con_codigo & ~con_nombre).sum()),
     }
+
+def procesar_posicional(df, perfil, estado=None):
+    """Procesa hojas sin cabecera útil (formato de ALMCE)"""
+    # Las categorías son filas con solo la primera columna y los productos
+    # están debajo sin una estructura clara de columnas
+    codigo = _texto(df.iloc[:, 0])
+    nombre = df.iloc[:, 1] if df.shape[1] > 1 else pd.Series(np.nan, index=df.index, dtype=object)
+    con_codigo = codigo.notna() & (codigo != '')
     
-    # Encontrar las columnas reales en el DataFrame
-    columnas_reales = {}
-    columnas_disponibles = set(df.columns)
-    
-    # Imprimir columnas disponibles para diagnóstico
-    print("Columnas disponibles en el archivo:")
-    for col in df.columns:
-        print(f"- {col}")
-    
-    for col_base, alternativas in columnas_esperadas.items():
-        encontrada = False
-        for alt in alternativas:
-            if alt in columnas_disponibles:
-                columnas_reales[col_base] = alt
-                encontrada = True
-                print(f"Columna {col_base} encontrada como: {alt}")
-                break
-        if not encontrada:
-            print(f"ADVERTENCIA: No se encontró la columna {col_base} o sus alternativas")
-            return None
+    # Si la primera columna tiene un valor y las demás están vacías, es una categoría
+    es_categoria = con_codigo & df.iloc[:, 1:].isna().all(axis=1)
+    # Si hay un código en la primera columna y un nombre en la segunda, es un producto
+    es_producto = ~es_categoria & con_codigo & nombre.notna()
     
-    # Crear DataFrame normalizado con manejo de errores detallado
-    try:
-        productos = pd.DataFrame()
-        
-        # Procesar código
-        productos['codigo'] = df[columnas_reales['CODIGO']].astype(str).str.strip()
-        print(f"Procesados {len(productos)} códigos")
-        
-        # Procesar nombre
-        productos['nombre'] = df[columnas_reales['DESCRIPCION']].astype(str).str.strip()
-        
-        # Procesar precio con manejo de diferentes formatos
-        precio_str = df[columnas_reales['TOTAL']].astype(str)
-        precio_str = precio_str.str.replace(',', '.')
-        precio_str = precio_str.str.replace('€', '')
-        precio_str = precio_str.str.strip()
-        productos['precio'] = pd.to_numeric(precio_str, errors='coerce')
-        
-        # Procesar precio de venta
-        pvp_str = df[columnas_reales['PVP']].astype(str)
-        pvp_str = pvp_str.str.replace(',', '.')
-        pvp_str = pvp_str.str.replace('€', '')
-        pvp_str = pvp_str.str.strip()
-        productos['precio_venta'] = pd.to_numeric(pvp_str, errors='coerce')
-        
-        # Validar datos
-        productos = productos.replace([np.inf, -np.inf], np.nan)
-        if productos.isnull().any().any():
-            print("ADVERTENCIA: Se encontraron valores nulos o inválidos:")
-            print(productos.isnull().sum())
-        
-        return productos
-        
-    except Exception as e:
-        print(f"Error al procesar datos de BSH: {str(e)}")
-        print("Detalles del error:")
-        print(f"Tipo de error: {type(e).__name__}")
-        print(f"Columnas disponibles: {df.columns.tolist()}")
-        print(f"Columnas reales encontradas: {columnas_reales}")
-        return None
+    nulos = pd.Series(None, index=df.index, dtype=object)  # Precios no disponibles en este formato
+    df_productos = _productos(es_producto, {
+        'codigo': codigo,
+        'nombre': nombre.astype(str).str.strip(),
+        'categoria': _categorias(codigo, es_categoria, estado),
+        'precio': nulos,
+        'precio_venta': nulos
+    })
+    df_productos.attrs['filas_descartadas'] = _descartes(es_categoria, con_codigo, nombre.notna())
+    return df_productos
 
-def procesar_cecotec(df):
-    """Procesa el formato específico de CECOTEC"""
-    productos = []
-    categoria_actual = None
+def procesar_por_categorias(df, perfil, estado=None):
+    """Procesa hojas con cabecera donde cada categoría es una fila con solo el código"""
+    columnas = perfil['columnas']
+    codigo_original = _columna(df, columnas['codigo'])
+    descripcion = _columna(df, columnas['nombre'])
+    codigo_texto = _texto(codigo_original)
+    con_texto = codigo_texto.notna() & (codigo_texto != '')
     
-    # Imprimir columnas disponibles para diagnóstico
-    print("Columnas disponibles en el archivo:")
-    for col in df.columns:
-        print(f"- {col}")
+    # Fila de categoría: solo tiene la columna de código con valor y sin descripción
+    es_categoria = con_texto & _sin_texto(descripcion)
+    if perfil['codigos_numericos']:
+        # El código puede ser texto o numérico
+        codigo = codigo_original.astype(str).str.strip()
+        con_codigo = (con_texto | _es_entero(codigo_original)) & codigo_original.notna() & (codigo != '')
+    else:
+        codigo, con_codigo = codigo_texto, con_texto
+    # Si tiene código y descripción, es un producto
+    es_producto = ~es_categoria & con_codigo & descripcion.notna()
     
-    # Recorrer filas para extraer categorías y productos
-    for _, row in df.iterrows():
-        try:
-            codigo = row.get('CÓDIGO')
-            descripcion = row.get('DESCRIPCIÓN')
-            
-            # Verificar si es una fila de categoría
-            if pd.notna(codigo) and isinstance(codigo, str) and codigo.strip() and \
-               (pd.isna(descripcion) or not str(descripcion).strip()):
-                categoria_actual = codigo.strip()
-                print(f"Categoría detectada: {categoria_actual}")
-                continue
-            
-            # Si tiene código y descripción, es un producto
-            if pd.notna(codigo) and pd.notna(descripcion) and \
-               str(codigo).strip() and str(descripcion).strip():
-                
-                # Procesar precios con manejo de errores
-                try:
-                    precio = pd.to_numeric(str(row.get('TOTAL')).replace(',', '.').replace('€', '').strip(), errors='coerce')
-                except:
-                    precio = None
-                    print(f"Error al procesar precio para código {codigo}")
-                
-                try:
-                    precio_venta = pd.to_numeric(str(row.get('P.V.P FINAL CLIENTE')).replace(',', '.').replace('€', '').strip(), errors='coerce')
-                except:
-                    precio_venta = None
-                    print(f"Error al procesar precio de venta para código {codigo}")
-                
-                # Crear producto con campos de Odoo 18
-                producto = {
-                    'codigo': str(codigo).strip(),
-                    'nombre': str(descripcion).strip(),
-                    'categoria': categoria_actual,
-                    'precio': precio,
-                    'precio_venta': precio_venta,
-                    'tipo': 'product',  # Producto almacenable
-                    'puede_venderse': True,
-                    'puede_comprarse': True,
-                    'activo': True,
-                    'disponible_pos': True,
-                    'publicado_web': True,
-                    'secuencia_web': 10,
-                    'impuesto_venta': 'account_tax_sale_21',
-                    'impuesto_compra': 'account_tax_purchase_21',
-                    'unidad_medida': 'product.product_uom_unit',  # Unidad por defecto
-                    'proveedor': 'res_partner_cecotec'
-                }
-                
-                # Agregar información adicional si está disponible
-                if pd.notna(row.get('UNID.')):
-                    producto['unidades'] = row.get('UNID.')
-                if pd.notna(row.get('MARGEN')):
-                    producto['margen'] = row.get('MARGEN')
-                if pd.notna(row.get('BENEFICIO UNITARIO')):
-                    producto['beneficio_unitario'] = row.get('BENEFICIO UNITARIO')
-                
-                productos.append(producto)
-                print(f"Producto procesado: {codigo} - {descripcion[:30]}...")
-        
-        except Exception as e:
-            print(f"Error al procesar fila: {str(e)}")
-            continue
+    # Precios a float64 con los separadores del perfil o, si no los declara, los detectados
+    # (en lectura por bloques se mantienen los del primer bloque)
+    separadores = estado.setdefault('separadores', {}) if estado is not None else {}
+    declarados = tuple(perfil['separadores']) if perfil.get('separadores') else None
+    precios, no_reconocidos = {}, []
+    for campo in ('precio', 'precio_venta'):
+        precios[campo], fallos, separadores[campo] = parsear_precios(
+            _columna(df, columnas[campo]), separadores.get(campo) or declarados)
+        fallos = fallos[es_producto.reindex(fallos.index, fill_value=False)]
+        no_reconocidos.extend({'columna': columnas[campo], 'fila': int(fila), 'valor': str(valor)}
+                              for fila, valor in fallos.items())
     
-    # Crear DataFrame y validar datos
-    df_productos = pd.DataFrame(productos)
+    df_productos = _productos(es_producto, {
+        'codigo': codigo,
+        'nombre': descripcion.astype(str).str.strip(),
+        'categoria': _categorias(codigo_texto, es_categoria, estado),
+        'precio': precios['precio'],
+        'precio_venta': precios['precio_venta']
+    })
+    if no_reconocidos and not df_productos.empty:
+        df_productos.attrs['precios_no_reconocidos'] = no_reconocidos
+    df_productos.attrs['filas_descartadas'] = _descartes(es_categoria, con_codigo, descripcion.notna())
+    return df_productos
+
+# Procesador de cada formato de hoja declarado en los perfiles
+FORMATOS = {
+    'posicional': procesar_posicional,
+    'categorias': procesar_por_categorias,
+}
+
+def procesar_hojas(hojas, proveedor, jobs=1, estados=None):
+    """Extrae los productos de todas las hojas leídas de un archivo
+    
+    Cada hoja se procesa con el formato del perfil; con `jobs` > 1 las hojas
+    se procesan a la vez en un pool de hilos (las operaciones vectorizadas de
+    pandas liberan el GIL). En perfiles con varias hojas, los productos sin
+    categoría toman el nombre de su hoja. `estados` ({hoja: estado}) conserva
+    la categoría en curso de cada hoja cuando esta llega en varios bloques.
+    Las filas que no son productos se cuentan por motivo en
+    attrs['filas_descartadas'], también cuando no queda ningún producto.
+    """
+    perfil = PERFILES[proveedor]
+    varias_hojas = bool(perfil['lectura'].get('hojas'))
     
-    # Verificar datos procesados
-    print(f"\nTotal de productos procesados: {len(df_productos)}")
-    print("Columnas en el DataFrame resultante:")
-    print(df_productos.columns.tolist())
-    print("\nResumen de valores nulos:")
-    print(df_productos.isnull().sum())
+    def procesar(hoja):
+        nombre, df = hoja
+        estado = estados.setdefault(nombre, {}) if estados is not None else None
+        df_productos = FORMATOS[perfil['formato']](df, perfil, estado)
+        if varias_hojas and not df_productos.empty:
+            df_productos['categoria'] = df_productos['categoria'].where(df_productos['categoria'].notna(), nombre)
+        for fallo in df_productos.attrs.get('precios_no_reconocidos', []):
+            fallo['hoja'] = nombre
+        descartadas = df_productos.attrs.get('filas_descartadas', {})
+        if any(descartadas.values()):
+            logger.debug(f"{nombre}: {len(df_productos)} productos, filas descartadas {descartadas}")
+        return df_productos
     
+    if jobs > 1 and len(hojas) > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            partes = list(pool.map(procesar, hojas.items()))
+    else:
+        partes = [procesar(hoja) for hoja in hojas.items()]
+    descartadas = {}
+    for parte in partes:
+        for motivo, filas in parte.attrs.get('filas_descartadas', {}).items():
+            descartadas[motivo] = descartadas.get(motivo, 0) + filas
+    partes = [parte for parte in partes if not parte.empty]
+    if not partes:
+        df_productos = pd.DataFrame()
+    elif len(partes) == 1:
+        df_productos = partes[0]
+    else:
+        df_productos = pd.concat(partes, ignore_index=True)
+        # concat solo conserva attrs idénticos; el informe de precios se une a mano
+        no_reconocidos = [fallo for parte in partes for fallo in parte.attrs.get('precios_no_reconocidos', [])]
+        if no_reconocidos:
+            df_productos.attrs['precios_no_reconocidos'] = no_reconocidos
+    df_productos.attrs['filas_descartadas'] = descartadas
     return df_productos
 
-def leer_archivo(ruta_archivo):
-    """Lee un archivo CSV o Excel y devuelve un DataFrame"""
+def _perfil_archivo(ruta_archivo):
+    """Perfil con el que se lee el archivo
+    
+    Si el proveedor se reconoció por el contenido, 'fila_cabecera' pasa a ser
+    la fila de cabecera de cada hoja de la huella ({hoja: fila}) y
+    'renombrar' lleva las columnas reales de la huella a los nombres del perfil.
+    """
+    proveedor, huella = identificar_archivo(ruta_archivo)
+    if not proveedor:
+        return None
+    perfil = PERFILES[proveedor]
+    if huella is None:
+        return perfil
+    lectura = dict(perfil['lectura'], fila_cabecera=dict(huella['hojas']))
+    if not lectura.get('hojas'):
+        lectura['hoja'] = huella['hoja']
+    renombrar = {real: perfil['columnas'][campo] for campo, real in huella['columnas'].items()
+                 if real != perfil['columnas'][campo]}
+    return dict(perfil, lectura=lectura, renombrar=renombrar)
+
+def _renombrar(df, perfil):
+    """Columnas reales de un archivo reconocido por su contenido con los nombres del perfil"""
+    return df.rename(columns=perfil['renombrar']) if perfil and perfil.get('renombrar') else df
+
+def _detectar_cabecera(crudo, perfil, max_filas=20):
+    """Fila del encabezado: la primera que contiene el nombre de la columna de código
+    
+    La comparación no distingue tildes, mayúsculas ni espacios ("Codigo " es "CÓDIGO").
+    """
+    etiqueta = normalizar_etiqueta(perfil['columnas']['codigo']) if perfil else None
+    primeras = crudo.head(max_filas).apply(lambda columna: columna.map(normalizar_etiqueta))
+    filas = np.flatnonzero((primeras == etiqueta).to_numpy().any(axis=1))
+    return int(filas[0]) if len(filas) else 0
+
+def _promover_cabecera(crudo, fila):
+    """Convierte una hoja leída sin cabecera en una con la fila indicada como encabezado"""
+    nombres, vistos = [], {}
+    for i, nombre in enumerate(crudo.iloc[fila] if len(crudo) > fila else []):
+        # Mismos nombres que pone pandas: 'Unnamed: i' y sufijos .1, .2 en repetidos
+        nombre = f"Unnamed: {i}" if pd.isna(nombre) else nombre
+        if nombre in vistos:
+            vistos[nombre] += 1
+            nombre = f"{nombre}.{vistos[nombre]}"
+        vistos.setdefault(nombre, 0)
+        nombres.append(nombre)
+    df = crudo.iloc[fila + 1:].reset_index(drop=True)
+    df.columns = nombres or df.columns
+    return df.infer_objects()
+
+def _hojas_a_leer(lectura, disponibles):
+    """Hojas del libro que declara el perfil ('todas' excluye las de ventas, roturas...)"""
+    if lectura.get('hojas') == 'todas':
+        excluidas = re.compile(lectura['excluir_hojas'], re.IGNORECASE)
+        nombres = [nombre for nombre in disponibles if not excluidas.search(nombre)]
+    elif lectura.get('hojas'):
+        nombres = [nombre for nombre in lectura['hojas'] if nombre in disponibles]
+    else:
+        nombres = [lectura['hoja']] if lectura['hoja'] in disponibles else []
+    # Si el libro no tiene las hojas del perfil, se usa la primera
+    return nombres or disponibles[:1]
+
+def _leer_libro(ruta_archivo, perfil):
+    """Lee en una sola pasada todas las hojas del perfil de un libro Excel"""
+    lectura = perfil['lectura'] if perfil else LECTURA_POR_DEFECTO
+    with pd.ExcelFile(ruta_archivo) as libro:
+        nombres = _hojas_a_leer(lectura, libro.sheet_names)
+        filas = lectura['fila_cabecera']
+        if filas != 'auto' and not isinstance(filas, dict):
+            return libro.parse(nombres, header=filas)
+        # Cabecera de la huella y, en las hojas que no tiene, la detectada
+        filas = filas if isinstance(filas, dict) else {}
+        crudas = libro.parse(nombres, header=None)
+        return {nombre: _promover_cabecera(crudas[nombre], filas[nombre] if nombre in filas
+                                           else _detectar_cabecera(crudas[nombre], perfil))
+                for nombre in nombres}
+
+def _opciones_csv(ruta_archivo):
+    """Opciones de read_csv según el perfil: fila del encabezado y columnas leídas como texto
+    
+    Código y descripción se leen siempre como texto para que el tipo no
+    dependa de qué filas se lean juntas (archivo completo o por bloques).
+    """
+    perfil = _perfil_archivo(ruta_archivo)
+    if perfil is None:
+        return {'header': 0}
+    fila_cabecera = perfil['lectura']['fila_cabecera']
+    if isinstance(fila_cabecera, dict):
+        # Un CSV tiene una única hoja, de nombre '' en la huella
+        fila_cabecera = fila_cabecera.get('', 'auto')
+    if fila_cabecera == 'auto':
+        fila_cabecera = _detectar_cabecera(
+            pd.read_csv(ruta_archivo, encoding='utf-8', header=None, nrows=20, dtype=str), perfil)
+    if perfil['formato'] == 'posicional':
+        tipos = str
+    else:
+        reales = {etiqueta: real for real, etiqueta in perfil.get('renombrar', {}).items()}
+        tipos = {reales.get(perfil['columnas'][campo], perfil['columnas'][campo]): str
+                 for campo in ('codigo', 'nombre')}
+    return {'header': fila_cabecera, 'dtype': tipos}
+
+def leer_hojas(ruta_archivo):
+    """Lee un archivo CSV o Excel y devuelve sus hojas a procesar ({nombre: DataFrame})"""
     extension = os.path.splitext(ruta_archivo)[1].lower()
-    nombre_archivo = os.path.basename(ruta_archivo)
-    proveedor = detectar_proveedor(nombre_archivo)
+    perfil = _perfil_archivo(ruta_archivo)
     
     try:
         if extension == '.csv':
-            return pd.read_csv(ruta_archivo, encoding='utf-8')
+            nombre = os.path.splitext(os.path.basename(ruta_archivo))[0]
+            return {nombre: _renombrar(pd.read_csv(ruta_archivo, encoding='utf-8', **_opciones_csv(ruta_archivo)), perfil)}
         elif extension in ['.xlsx', '.xls']:
-            # Para CECOTEC, sabemos que el encabezado está en la fila 1
-            if proveedor == 'CECOTEC':
-                return pd.read_excel(ruta_archivo, header=1)
-            else:
-                return pd.read_excel(ruta_archivo)
+            # Mientras el archivo no cambie, las hojas se recuperan de la caché sin abrir el Excel
+            opciones = {'lectura': perfil['lectura'], 'codigo': perfil['columnas']['codigo']} if perfil else {}
+            hojas = cache_hojas.cargar_libro(ruta_archivo, opciones, lambda: _leer_libro(ruta_archivo, perfil))
+            return {nombre: _renombrar(df, perfil) for nombre, df in hojas.items()} if hojas is not None else None
         else:
             print(f"Formato de archivo no soportado: {extension}")
             return None
@@ -309,289 +424,656 @@ def leer_archivo(ruta_archivo):
         print(f"Error al leer el archivo {ruta_archivo}: {str(e)}")
         return None
 
+def leer_archivo(ruta_archivo):
+    """Lee un archivo CSV o Excel y devuelve un DataFrame (la primera hoja del perfil)"""
+    hojas = leer_hojas(ruta_archivo)
+    if not hojas:
+        return None
+    return next(iter(hojas.values()))
+
+def leer_csv_por_bloques(ruta_archivo, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Lee un CSV en bloques de filas (generador); la memoria no depende del tamaño del archivo"""
+    perfil = _perfil_archivo(ruta_archivo)
+    with pd.read_csv(ruta_archivo, encoding='utf-8', chunksize=filas_por_bloque,
+                     **_opciones_csv(ruta_archivo)) as lector:
+        for bloque in lector:
+            yield _renombrar(bloque, perfil)
+
+# Etapas de la tubería de conversión (ver tuberia.py): lectura -> normalización -> plantillas
+
+class ErrorLectura(Exception):
+    """El archivo de proveedor no se pudo leer (el detalle ya se ha mostrado)"""
+
+def bloques_archivo(ruta_archivo, filas_por_bloque=None):
+    """Etapa de lectura: hojas del archivo ({nombre: DataFrame}) como un único bloque
+    
+    Con `filas_por_bloque`, los CSV se leen por bloques de filas y cada uno
+    llega como {nombre: bloque}, para que la memoria no crezca con el archivo.
+    """
+    if filas_por_bloque and ruta_archivo.lower().endswith('.csv'):
+        nombre = os.path.splitext(os.path.basename(ruta_archivo))[0]
+        for bloque in leer_csv_por_bloques(ruta_archivo, filas_por_bloque):
+            yield {nombre: bloque}
+        return
+    hojas = leer_hojas(ruta_archivo)
+    if hojas is None:
+        raise ErrorLectura('No se pudo leer el archivo')
+    yield hojas
+
+def normalizar_bloques(bloques, proveedor, jobs=1, descartadas=None):
+    """Etapa de normalización: productos (código, nombre, categoría y precios) de cada bloque leído
+    
+    Con `descartadas` ({motivo: filas}) se acumulan las filas que no son
+    productos, incluidas las de los bloques que no tienen ninguno.
+    """
+    estados = {}
+    for hojas in bloques:
+        df_productos = procesar_hojas(hojas, proveedor, jobs, estados)
+        if descartadas is not None:
+            for motivo, filas in df_productos.attrs.get('filas_descartadas', {}).items():
+                descartadas[motivo] = descartadas.get(motivo, 0) + filas
+        if not df_productos.empty:
+            yield df_productos
+
+def plantillas_odoo(bloques, proveedor):
+    """Etapa de emisión: tablas product_template y product_product de cada bloque de productos"""
+    vistos = {}
+    for df_productos in bloques:
+        # IDs externos una vez por bloque, comprobando colisiones con los bloques anteriores
+        df_productos = df_productos.assign(id_externo=ids_externos(df_productos['codigo'], proveedor, vistos))
+        yield {
+            'product_template': generar_product_template(df_productos, proveedor),
+            'product_product': generar_product_product(df_productos, proveedor)
+        }
+
+# Marcas diacríticas combinadas (las tildes tras la descomposición NFKD)
+_DIACRITICOS = '[\u0300-\u036f]'
+
+def normalizar_codigo(codigos):
+    """Código de producto normalizado para los IDs externos ("PAE-12 B/N" -> "pae_12_b_n")
+    
+    Sin tildes, en minúsculas y con '_' como único separador; los códigos
+    numéricos leídos como float (1951.0) quedan como enteros ("1951").
+    """
+    if pd.api.types.infer_dtype(codigos, skipna=False) == 'string':
+        texto = codigos
+    else:
+        texto = codigos.map(lambda c: str(int(c)) if isinstance(c, float) and c.is_integer() else str(c))
+    if pa is not None:
+        # Mismas operaciones con las funciones de cadenas de Arrow (en C++, no celda a celda)
+        arr = pc.utf8_normalize(pa.array(texto.to_numpy(dtype=object), type=pa.string()), 'NFKD')
+        arr = pc.utf8_lower(pc.replace_substring_regex(arr, _DIACRITICOS, ''))
+        arr = pc.utf8_trim(pc.replace_substring_regex(arr, '[^a-z0-9]+', '_'), '_')
+        return pd.Series(arr.to_numpy(zero_copy_only=False), index=codigos.index, dtype=object)
+    return (texto.str.normalize('NFKD').str.replace(_DIACRITICOS, '', regex=True)
+            .str.lower().str.replace(r'[^a-z0-9]+', '_', regex=True).str.strip('_'))
+
+def ids_externos(codigos, proveedor=None, vistos=None):
+    """Nombre del ID externo de cada producto: proveedor y código normalizados ("bsh_3ts993bp")
+    
+    El mismo producto recibe siempre el mismo ID, de modo que volver a
+    importar un archivo en Odoo actualiza sus productos en lugar de
+    duplicarlos. Si dos códigos distintos se normalizan igual ("AB-1" y
+    "AB 1"), el primero conserva el ID y los siguientes llevan como sufijo el
+    hash de su código original. `vistos` ({id: código original}) mantiene esa
+    comprobación entre los bloques de un mismo archivo.
+    """
+    prefijo = normalizar_codigo(pd.Series([proveedor])).iloc[0] + '_' if proveedor else ''
+    ids = prefijo + normalizar_codigo(codigos).replace('', 'sin_codigo')
+    originales = codigos.astype(str).str.strip()
+    
+    # Caso habitual: tantos ids como códigos distintos y ninguno usado antes por otro código
+    # (búsquedas sueltas en `vistos`: Series.map convertiría el diccionario entero en cada bloque)
+    if ids.nunique() == originales.nunique() and (
+            not vistos or all(vistos.get(id_, codigo) == codigo for id_, codigo in zip(ids, originales))):
+        if vistos is not None:
+            vistos.update(zip(ids, originales))
+        return ids
+    
+    # Cada id pertenece al código que lo usó primero (en bloques anteriores o en este);
+    # colisionan los demás códigos con ese mismo id
+    unicos = pd.DataFrame({'id': ids, 'codigo': originales}).drop_duplicates()
+    anterior = pd.Series([(vistos or {}).get(id_) for id_ in unicos['id']], index=unicos.index, dtype=object)
+    primero = unicos.drop_duplicates('id').set_index('id')['codigo']
+    choca = anterior.fillna(unicos['id'].map(primero)) != unicos['codigo']
+    if vistos is not None:
+        nuevos = unicos[anterior.isna() & ~choca]
+        vistos.update(zip(nuevos['id'], nuevos['codigo']))
+    
+    colisiones = unicos[choca]
+    sufijos = {
+        (id_, codigo): f"{id_}_{hashlib.sha1(codigo.encode('utf-8')).hexdigest()[:8]}"
+        for id_, codigo in zip(colisiones['id'], colisiones['codigo'])
+    }
+    ejemplos = ', '.join(f"{codigo!r}" for codigo in colisiones['codigo'][:3])
+    logger.warning(f"{len(colisiones)} códigos coinciden con otro al normalizarlos; su ID externo lleva un sufijo ({ejemplos})")
+    return pd.Series([sufijos.get(par, par[0]) for par in zip(ids, originales)], index=ids.index)
+
+def _ids_productos(df, proveedor):
+    # plantillas_odoo los calcula una vez por bloque; si no, se calculan aquí
+    return df['id_externo'] if 'id_externo' in df.columns else ids_externos(df['codigo'], proveedor)
+
+def _constante(valor, n):
+    """Columna con el mismo valor en las n filas, sin un objeto de Python por celda
+    
+    Los indicadores van como bool de numpy, los enteros con el tipo más
+    pequeño que los admite y los textos como categórica de una sola categoría
+    (un byte por fila).
+    """
+    if isinstance(valor, (bool, np.bool_)):
+        return np.full(n, valor, dtype=bool)
+    if isinstance(valor, int):
+        return np.full(n, valor, dtype=np.min_scalar_type(valor))
+    return pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=[valor])
+
+def _componer(prefijo, textos, sufijo=''):
+    """prefijo + texto + sufijo de cada fila, en una columna de texto de Arrow si está disponible"""
+    if pd.api.types.infer_dtype(textos, skipna=False) != 'string':
+        textos = textos.astype(str)
+    if pa is None:
+        return prefijo + textos + sufijo
+    arr = pc.binary_join_element_wise(prefijo, pa.array(textos, type=pa.string()), sufijo, '')
+    return pd.Series(pd.arrays.ArrowStringArray(arr), index=textos.index)
+
 def generar_product_template(df, proveedor):
-    """Genera un DataFrame con la estructura de product.template de Odoo."""
+    """Genera un DataFrame con la estructura de product.template de Odoo.
+    
+    Las columnas fijas son categóricas o bool y los textos compuestos van en
+    columnas de Arrow: ninguna columna generada tiene un objeto por celda.
+    """
+    n = len(df)
     # Obtener las columnas necesarias del DataFrame
     df_template = pd.DataFrame()
-    df_template['id'] = df['codigo'].apply(lambda x: f'product_template_{x}')
+    df_template['id'] = _componer('product_template_', _ids_productos(df, proveedor))
     df_template['name'] = df['nombre']
     df_template['default_code'] = df['codigo']
     df_template['list_price'] = df['precio_venta']
     df_template['standard_price'] = df['precio']
     
     # Configurar valores por defecto
-    df_template['type'] = 'product'  # Producto almacenable
-    df_template['sale_ok'] = True
-    df_template['purchase_ok'] = True
-    df_template['active'] = True
-    df_template['available_in_pos'] = True
-    df_template['to_weight'] = False
-    df_template['is_published'] = True
-    df_template['website_sequence'] = 10
-    
-    # Configurar categorías y etiquetas según el proveedor
-    if proveedor == 'ALMCE':
-        df_template['categ_id'] = 'All/Saleable/Electrodomésticos'
-        df_template['supplier_id'] = 'res_partner_almce'
-        df_template['product_tag_ids'] = 'tag_almce'
-        df_template['public_categ_ids'] = 'Electrodomésticos/ALMCE'
-        df_template['pos_categ_ids'] = 'Electrodomésticos'
-    elif proveedor == 'BSH':
-        df_template['categ_id'] = 'All/Saleable/Electrodomésticos'
-        df_template['supplier_id'] = 'res_partner_bsh'
-        df_template['product_tag_ids'] = 'tag_bsh'
-        df_template['public_categ_ids'] = 'Electrodomésticos/BSH'
-        df_template['pos_categ_ids'] = 'Electrodomésticos'
-    elif proveedor == 'CECOTEC':
-        df_template['categ_id'] = 'All/Saleable/Electrodomésticos'
-        df_template['supplier_id'] = 'res_partner_cecotec'
-        df_template['product_tag_ids'] = 'tag_cecotec'
-        df_template['public_categ_ids'] = 'Electrodomésticos/CECOTEC'
-        df_template['pos_categ_ids'] = 'Electrodomésticos'
-    
-    # Configurar impuestos por defecto
-    df_template['taxes_id'] = 'account_tax_sale_21'
-    df_template['supplier_taxes_id'] = 'account_tax_purchase_21'
+    df_template['type'] = _constante('product', n)  # Producto almacenable
+    df_template['sale_ok'] = _constante(True, n)
+    df_template['purchase_ok'] = _constante(True, n)
+    df_template['active'] = _constante(True, n)
+    df_template['available_in_pos'] = _constante(True, n)
+    df_template['to_weight'] = _constante(False, n)
+    df_template['is_published'] = _constante(True, n)
+    df_template['website_sequence'] = _constante(10, n)
+    
+    # Categorías, etiquetas e impuestos según el perfil del proveedor
+    for campo, valor in valores_odoo(proveedor, 'product_template').items():
+        df_template[campo] = _constante(valor, n)
     
     # Configurar descripciones
-    df_template['description_sale'] = df['nombre'].apply(lambda x: f'Producto {x} para venta')
-    df_template['description_purchase'] = df['nombre'].apply(lambda x: f'Producto {x} para compra')
+    df_template['description_sale'] = _componer('Producto ', df['nombre'], ' para venta')
+    df_template['description_purchase'] = _componer('Producto ', df['nombre'], ' para compra')
     
     return df_template
 
-def procesar_almce(df):
-    """Procesa el formato específico de ALMCE"""
-    # ALMCE tiene un formato especial donde las categorías son filas
-    # y los productos están debajo sin una estructura clara de columnas
-    productos = []
-    categoria_actual = None
-    
-    # Recorrer filas para extraer categorías y productos
-    for _, row in df.iterrows():
-        # Si la primera columna tiene un valor y las demás están vacías, es una categoría
-        if pd.notna(row.iloc[0]) and row.iloc[0].strip() and pd.isna(row.iloc[1:]).all():
-            categoria_actual = row.iloc[0].strip()
-        # Si hay un código en la primera columna y un nombre en la segunda, es un producto
-        elif pd.notna(row.iloc[0]) and pd.notna(row.iloc[1]) and row.iloc[0].strip():
-            productos.append({
-                'codigo': row.iloc[0].strip(),
-                'nombre': row.iloc[1].strip(),
-                'categoria': categoria_actual,
-                'precio': None,  # No disponible en este formato
-                'precio_venta': None  # No disponible en este formato
-            })
-    
-    return pd.DataFrame(productos)
-
-def procesar_bsh(df):
-    """Procesa el formato específico de BSH"""
-    productos = []
-    categoria_actual = None
-    
-    # Recorrer filas para extraer categorías y productos
-    for _, row in df.iterrows():
-        # Verificar si es una fila de categoría (solo tiene la primera columna con valor)
-        if pd.notna(row['CÓDIGO']) and isinstance(row['CÓDIGO'], str) and row['CÓDIGO'].strip() and \
-           (pd.isna(row['DESCRIPCIÓN']) or not str(row['DESCRIPCIÓN']).strip()):
-            categoria_actual = row['CÓDIGO'].strip()
-        # Si tiene código y descripción, es un producto
-        elif pd.notna(row['CÓDIGO']) and pd.notna(row['DESCRIPCIÓN']) and \
-             isinstance(row['CÓDIGO'], str) and row['CÓDIGO'].strip():
-            productos.append({
-                'codigo': row['CÓDIGO'].strip(),
-                'nombre': row['DESCRIPCIÓN'].strip(),
-                'categoria': categoria_actual,
-                'precio': row['TOTAL'] if pd.notna(row['TOTAL']) else None,
-                'precio_venta': row['P.V.P FINAL CLIENTE'] if pd.notna(row['P.V.P FINAL CLIENTE']) else None
-            })
-    
-    return pd.DataFrame(productos)
-
-def procesar_cecotec(df):
-    """Procesa el formato específico de CECOTEC"""
-    productos = []
-    categoria_actual = None
-    
-    # Recorrer filas para extraer categorías y productos
-    for _, row in df.iterrows():
-        # Verificar si es una fila de categoría (solo tiene la columna CÓDIGO con valor y sin DESCRIPCIÓN)
-        if pd.notna(row.get('CÓDIGO')) and isinstance(row.get('CÓDIGO'), str) and \
-           (pd.isna(row.get('DESCRIPCIÓN')) or not str(row.get('DESCRIPCIÓN')).strip()):
-            categoria_actual = row.get('CÓDIGO').strip()
-        
-        # Si tiene código y descripción, es un producto
-        elif pd.notna(row.get('CÓDIGO')) and pd.notna(row.get('DESCRIPCIÓN')) and \
-             (isinstance(row.get('CÓDIGO'), (int, str))) and str(row.get('CÓDIGO')).strip():
-            
-            # Extraer código (puede ser numérico o string)
-            codigo = str(row.get('CÓDIGO')).strip()
-            
-            productos.append({
-                'codigo': codigo,
-                'nombre': str(row.get('DESCRIPCIÓN')).strip(),
-                'categoria': categoria_actual,
-                'precio': row.get('TOTAL') if pd.notna(row.get('TOTAL')) else None,
-                'precio_venta': row.get('P.V.P FINAL CLIENTE') if pd.notna(row.get('P.V.P FINAL CLIENTE')) else None
-            })
-    
-    return pd.DataFrame(productos)
-
-def generar_id_externo():
-    """Genera un ID externo único para Odoo"""
-    return f"__export__.product_template_{uuid.uuid4().hex[:8]}"
-
-def convertir_a_odoo_template(df_productos):
-    """Convierte el DataFrame de productos al formato de plantilla de producto de Odoo"""
-    # Crear DataFrame con las columnas requeridas por Odoo
-    odoo_df = pd.DataFrame(columns=ODOO_TEMPLATE_COLUMNS['product_template'])
-    
-    # Llenar con datos
-    for _, producto in df_productos.iterrows():
-        nueva_fila = {
-            'id': generar_id_externo(),
-            'public_categ_ids': producto['categoria'] if 'categoria' in producto and pd.notna(producto['categoria']) else '',
-            'is_published': 'True',
-            'is_favorite': '',
-            'name': producto['nombre'],
-            'list_price': producto['precio_venta'] if 'precio_venta' in producto and pd.notna(producto['precio_venta']) else '0.0',
-            'website_sequence': str(10000 + _ * 10)  # Secuencia arbitraria
-        }
-        odoo_df = pd.concat([odoo_df, pd.DataFrame([nueva_fila])], ignore_index=True)
-    
-    return odoo_df
-
 def generar_product_product(df, proveedor):
-    """Genera un DataFrame con la estructura de product.product de Odoo."""
+    """Genera un DataFrame con la estructura de product.product de Odoo (columnas fijas como en generar_product_template)."""
+    n = len(df)
     # Obtener las columnas necesarias del DataFrame
     df_product = pd.DataFrame()
     
-    # Generar IDs y referencias
-    df_product['id'] = df['codigo'].apply(lambda x: f'product_product_{x}')
-    df_product['product_tmpl_id'] = df['codigo'].apply(lambda x: f'product_template_{x}')
+    # Generar IDs y referencias (deterministas: reimportar actualiza en lugar de duplicar)
+    ids = _ids_productos(df, proveedor)
+    df_product['id'] = _componer('product_product_', ids)
+    df_product['product_tmpl_id'] = _componer('product_template_', ids)
     df_product['default_code'] = df['codigo']
     df_product['name'] = df['nombre']
     df_product['lst_price'] = df['precio_venta']
     df_product['standard_price'] = df['precio']
     
     # Configurar valores por defecto
-    df_product['type'] = 'product'  # Producto almacenable
-    df_product['active'] = True
-    df_product['available_in_pos'] = True
-    df_product['to_weight'] = False
-    df_product['is_published'] = True
-    
-    # Configurar categorías y etiquetas según el proveedor
-    if proveedor == 'ALMCE':
-        df_product['categ_id'] = 'All / Saleable'
-        df_product['pos_categ_ids'] = 'All / Saleable / PoS'
-        df_product['product_tag_ids'] = 'tag_almce'
-    elif proveedor == 'BSH':
-        df_product['categ_id'] = 'All / Saleable'
-        df_product['pos_categ_ids'] = 'All / Saleable / PoS'
-        df_product['product_tag_ids'] = 'tag_bsh'
-    elif proveedor == 'CECOTEC':
-        df_product['categ_id'] = 'All / Saleable'
-        df_product['pos_categ_ids'] = 'All / Saleable / PoS'
-        df_product['product_tag_ids'] = 'tag_cecotec'
-        
-    # Configurar impuestos de venta y compra
-    df_product['taxes_id'] = 'IVA 21% (Ventas)'
-    df_product['supplier_taxes_id'] = 'IVA 21% (Compras)'
+    df_product['type'] = _constante('product', n)  # Producto almacenable
+    df_product['active'] = _constante(True, n)
+    df_product['available_in_pos'] = _constante(True, n)
+    df_product['to_weight'] = _constante(False, n)
+    df_product['is_published'] = _constante(True, n)
+    
+    # Categorías, etiquetas e impuestos según el perfil del proveedor
+    for campo, valor in valores_odoo(proveedor, 'product_product').items():
+        df_product[campo] = _constante(valor, n)
     
     # Inicializar campos de variantes vacíos
-    df_product['product_template_attribute_value_ids'] = ''
-    df_product['product_template_variant_value_ids'] = ''
+    df_product['product_template_attribute_value_ids'] = _constante('', n)
+    df_product['product_template_variant_value_ids'] = _constante('', n)
     
     return df_product
 
-def procesar_archivo(ruta_archivo, directorio_salida):
-    """Procesa un archivo de proveedor y genera archivos CSV para Odoo"""
+def rutas_salida(directorio_salida, proveedor):
+    """Rutas de los CSV de salida de una conversión
+    
+    El nombre lleva la fecha hasta el segundo; el CSV de plantillas se crea
+    vacío para reservarlo, de modo que dos archivos del mismo proveedor
+    convertidos en el mismo segundo (aunque sea en procesos distintos) no se
+    sobrescriban: el segundo recibe un sufijo _2, _3...
+    """
+    os.makedirs(directorio_salida, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for n in itertools.count(1):
+        sufijo = timestamp if n == 1 else f"{timestamp}_{n}"
+        ruta_template = os.path.join(directorio_salida, f"{proveedor}_product_template_{sufijo}.csv")
+        try:
+            os.close(os.open(ruta_template, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        return ruta_template, os.path.join(directorio_salida, f"{proveedor}_product_product_{sufijo}.csv")
+
+def _eliminar_salidas(rutas_csv):
+    """Borra las salidas a medio escribir de una conversión fallida"""
+    for ruta in tablas_odoo.salidas_con_tablas(rutas_csv):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+def convertir_archivo(ruta_archivo, directorio_salida, filas_por_bloque=None, jobs=1, salidas=None):
+    """Convierte un archivo de proveedor y devuelve un resultado estructurado para el manifiesto
+    
+    Con `filas_por_bloque`, los CSV se leen, procesan y escriben por bloques
+    para que la memoria no crezca con el tamaño del archivo. `jobs` es el
+    número de hojas de un libro que se procesan a la vez. `salidas` son las
+    rutas (plantillas, variantes) ya reservadas con rutas_salida; si no se
+    pasan, se reservan aquí. Los segundos del
+    resultado son los de cada etapa y sumidero de la tubería; 'metricas' es
+    el registro de instrumentación del archivo (ver metricas_conversion).
+    """
+    inicio = time.perf_counter()
+    inicio_cpu = time.process_time()
     nombre_archivo = os.path.basename(ruta_archivo)
-    proveedor = detectar_proveedor(nombre_archivo)
+    proveedor, huella = identificar_archivo(ruta_archivo)
+    resultado = {
+        'archivo': ruta_archivo,
+        'proveedor': proveedor,
+        'estado': 'error',
+        'hojas': [],
+        'filas': 0,
+        'precios_no_reconocidos': [],
+        'salidas': [],
+        'segundos': {},
+        'filas_descartadas': {},
+        'error': None
+    }
+    metricas = {}
+    
+    def terminar(estado, error=None):
+        if resultado['precios_no_reconocidos']:
+            fallos = resultado['precios_no_reconocidos']
+            ejemplos = ', '.join(f"{f['columna']}={f['valor']!r}" for f in fallos[:3])
+            print(f"Aviso: {len(fallos)} precios no reconocidos ({ejemplos}{', ...' if len(fallos) > 3 else ''})")
+        resultado['estado'] = estado
+        resultado['error'] = error
+        resultado['segundos']['total'] = round(time.perf_counter() - inicio, 3)
+        metricas.setdefault('cpu', {})['total'] = round(time.process_time() - inicio_cpu, 3)
+        resultado['metricas'] = metricas_conversion(resultado, metricas)
+        return resultado
     
     if not proveedor:
         print(f"No se pudo detectar el proveedor para el archivo: {nombre_archivo}")
-        return False
+        if salidas:
+            _eliminar_salidas(salidas)
+        return terminar('omitido', 'Proveedor no detectado')
     
+    if huella is not None:
+        print(f"Proveedor {proveedor} reconocido por el contenido del archivo {nombre_archivo}")
     print(f"Procesando archivo de {proveedor}: {nombre_archivo}")
     
-    # Leer el archivo
-    df = leer_archivo(ruta_archivo)
-    if df is None:
-        return False
-    
-    # Procesar según el proveedor
-    if proveedor == 'ALMCE':
-        df_productos = procesar_almce(df)
-    elif proveedor == 'BSH':
-        df_productos = procesar_bsh(df)
-    elif proveedor == 'CECOTEC':
-        df_productos = procesar_cecotec(df)
-    else:
-        print(f"No hay un procesador específico para {proveedor}, usando procesamiento genérico")
-        # Implementar procesamiento genérico si es necesario
-        return False
+    def leidas(bloques):
+        for hojas in bloques:
+            resultado['hojas'].extend(nombre for nombre in hojas if nombre not in resultado['hojas'])
+            yield hojas
     
-    # Generar archivos de salida
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    def con_informe(bloques):
+        for df_productos in bloques:
+            resultado['filas'] += len(df_productos)
+            resultado['precios_no_reconocidos'].extend(df_productos.attrs.get('precios_no_reconocidos', []))
+            logger.debug(f"Bloque de {len(df_productos)} productos ({resultado['filas']} en total)")
+            yield df_productos
     
+    ruta_template, ruta_product = salidas or rutas_salida(directorio_salida, proveedor)
+    rutas = {'product_template': ruta_template, 'product_product': ruta_product}
     try:
-        # Generar DataFrame de plantillas de producto
-        df_template = generar_product_template(df_productos, proveedor)
-        
-        # Generar DataFrame de variantes de producto
-        df_product = generar_product_product(df_productos, proveedor)
-        
-        # Guardar archivos CSV
-        ruta_template = os.path.join(directorio_salida, f"{proveedor}_product_template_{timestamp}.csv")
-        ruta_product = os.path.join(directorio_salida, f"{proveedor}_product_product_{timestamp}.csv")
-        
-        # Asegurar que el directorio de salida existe
-        os.makedirs(directorio_salida, exist_ok=True)
-        
-        # Guardar los archivos
-        df_template.to_csv(ruta_template, index=False)
-        df_product.to_csv(ruta_product, index=False)
+        # Lectura, proceso y escritura encadenados como generadores; por bloques, la
+        # lectura adelanta como mucho BLOQUES_EN_VUELO bloques a la escritura
+        resultado['segundos'] = tuberia.ejecutar(
+            leidas(bloques_archivo(ruta_archivo, filas_por_bloque)),
+            [('proceso', lambda bloques: con_informe(
+                normalizar_bloques(bloques, proveedor, jobs, resultado['filas_descartadas']))),
+             ('plantillas', lambda bloques: plantillas_odoo(bloques, proveedor))],
+            # CSV para Odoo y su tabla Arrow tipada, que prefieren las relecturas
+            [tuberia.SumideroCSV(rutas), tuberia.SumideroArrow(rutas)],
+            max_bloques=BLOQUES_EN_VUELO if filas_por_bloque else 0,
+            metricas=metricas
+        )
+    except Exception as e:
+        print(f"Error al convertir el archivo {ruta_archivo}: {str(e)}")
+        _eliminar_salidas([ruta_template, ruta_product])
+        return terminar('error', str(e))
+    if resultado['filas'] == 0:
+        print(f"No se encontraron productos en el archivo: {nombre_archivo}")
+        _eliminar_salidas([ruta_template, ruta_product])
+        return terminar('error', 'No se encontraron productos')
+    resultado['salidas'] = tablas_odoo.salidas_con_tablas([ruta_template, ruta_product])
+    print(f"Archivos generados exitosamente ({resultado['filas']} productos):")
+    print(f"- Plantillas de producto: {ruta_template}")
+    print(f"- Variantes de producto: {ruta_product}")
+    return terminar('ok')
+
+def memoria_pico_mb():
+    """Memoria residente máxima del proceso hasta ahora, en MB (None si no se puede medir)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux da kilobytes; macOS, bytes
+    return round(pico / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024), 1)
+
+def metricas_conversion(resultado, metricas):
+    """Registro de instrumentación de una conversión (un objeto JSON por archivo)
+    
+    Por etapa: segundos de reloj y de CPU y filas de entrada y salida (las
+    filas de una etapa son las que produjo la anterior; las de lectura son
+    las filas leídas de cada hoja). También las filas descartadas por motivo
+    y la memoria máxima del proceso, que con conversiones en serie incluye la
+    de los archivos anteriores.
+    """
+    segundos, cpu, filas = resultado['segundos'], metricas.get('cpu', {}), metricas.get('filas', {})
+    etapas, anterior = {}, None
+    # Las etapas en el orden de la tubería (el de sus primeras filas), después los sumideros
+    for nombre in list(filas) + [nombre for nombre in segundos if nombre not in filas]:
+        etapa = {'segundos': segundos.get(nombre), 'cpu': cpu.get(nombre)}
+        if nombre in filas:
+            etapa['filas_entrada'] = filas[anterior] if anterior else None
+            etapa['filas_salida'] = filas[nombre]
+            anterior = nombre
+        etapas[nombre] = etapa
+    leidas = filas.get('lectura', {})
+    return {
+        'archivo': resultado['archivo'],
+        'proveedor': resultado['proveedor'],
+        'estado': resultado['estado'],
+        'error': resultado['error'],
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'etapas': etapas,
+        'filas_leidas': sum(leidas.values()) if isinstance(leidas, dict) else leidas,
+        'productos': resultado['filas'],
+        'filas_descartadas': resultado.get('filas_descartadas', {}),
+        'precios_no_reconocidos': len(resultado.get('precios_no_reconocidos', [])),
+        'memoria_pico_mb': memoria_pico_mb(),
+    }
+
+def emitir_metricas(resultados):
+    """Emite por logger_metricas una línea JSON por archivo convertido"""
+    for resultado in resultados:
+        if resultado.get('metricas'):
+            logger_metricas.info(json.dumps(resultado['metricas'], ensure_ascii=False))
+
+def procesar_archivo(ruta_archivo, directorio_salida, filas_por_bloque=None, jobs=1):
+    """Procesa un archivo de proveedor y genera archivos CSV para Odoo"""
+    resultado = convertir_archivo(ruta_archivo, directorio_salida, filas_por_bloque, jobs)
+    emitir_metricas([resultado])
+    return resultado['estado'] == 'ok'
+
+def ruta_registro(directorio_salida):
+    """Registro de conversiones del directorio de salida"""
+    return os.path.join(directorio_salida, REGISTRO_CONVERSIONES)
+
+def cargar_registro(directorio_salida):
+    """Conversiones anteriores: ruta de entrada -> hash, versión de reglas y salidas"""
+    try:
+        with open(ruta_registro(directorio_salida), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def guardar_registro(directorio_salida, registro):
+    """Escribe el registro de conversiones (renombrado atómico)"""
+    os.makedirs(directorio_salida, exist_ok=True)
+    temporal = ruta_registro(directorio_salida) + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(registro, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta_registro(directorio_salida))
+
+def firma_conversion(ruta_archivo):
+    """Hash del contenido y versión de las reglas que producirían la conversión"""
+    proveedor, _ = identificar_archivo(ruta_archivo)
+    return {
+        'hash': cache_hojas.hash_archivo(ruta_archivo),
+        'reglas': f"{VERSION_CONVERSION}:{version_perfil(proveedor)}" if proveedor else None
+    }
+
+def conversion_vigente(registro, ruta_archivo, firma):
+    """Resultado de la conversión anterior si el archivo y las reglas no han cambiado"""
+    anterior = registro.get(os.path.abspath(ruta_archivo))
+    if (anterior is None or firma['reglas'] is None
+            or anterior['hash'] != firma['hash'] or anterior['reglas'] != firma['reglas']
+            or not all(os.path.exists(salida) for salida in anterior['salidas'])):
+        return None
+    return {
+        'archivo': ruta_archivo,
+        'proveedor': anterior['proveedor'],
+        'estado': 'sin_cambios',
+        'filas': anterior['filas'],
+        'salidas': anterior['salidas'],
+        'segundos': {},
+        'error': None
+    }
+
+def registrar_conversion(registro, firma, resultado):
+    """Anota en el registro una conversión correcta"""
+    if resultado['estado'] == 'ok':
+        registro[os.path.abspath(resultado['archivo'])] = {
+            **firma,
+            'proveedor': resultado['proveedor'],
+            'filas': resultado['filas'],
+            'salidas': resultado['salidas'],
+            'fecha': datetime.now().isoformat(timespec='seconds')
+        }
+
+def convertir_si_cambia(ruta_archivo, directorio_salida, registro, filas_por_bloque=None, forzar=False):
+    """Convierte el archivo solo si su contenido o sus reglas cambiaron desde la última vez"""
+    firma = firma_conversion(ruta_archivo)
+    previa = None if forzar else conversion_vigente(registro, ruta_archivo, firma)
+    if previa is not None:
+        print(f"Sin cambios, se reutilizan las salidas anteriores: {os.path.basename(ruta_archivo)}")
+        return previa
+    resultado = convertir_archivo(ruta_archivo, directorio_salida, filas_por_bloque)
+    registrar_conversion(registro, firma, resultado)
+    return resultado
+
+def _trabajador(ruta_archivo, directorio_salida, filas_por_bloque, salidas, conexion):
+    """Convierte un archivo en un proceso hijo y envía el resultado por la tubería"""
+    try:
+        resultado = convertir_archivo(ruta_archivo, directorio_salida, filas_por_bloque, salidas=salidas)
+    except Exception as e:
+        resultado = {'archivo': ruta_archivo, 'proveedor': None, 'estado': 'error', 'filas': 0,
+                     'salidas': [], 'segundos': {}, 'error': str(e)}
+    conexion.send(resultado)
+    conexion.close()
+
+def convertir_en_paralelo(rutas, directorio_salida, jobs, timeout=None, filas_por_bloque=None):
+    """Convierte los archivos con hasta `jobs` procesos a la vez y un tiempo máximo por archivo
+    
+    Cada archivo se convierte en su propio proceso para poder terminarlo si
+    supera el tiempo máximo sin afectar al resto. Las rutas de salida se
+    reservan aquí y no en el hijo: si se termina o muere sin resultado, sus
+    salidas a medio escribir (o el CSV vacío reservado) se borran como en
+    convertir_archivo ante un error. Los resultados se devuelven en el mismo
+    orden que las rutas.
+    """
+    resultados = {}
+    pendientes = list(enumerate(rutas))
+    activos = {}  # sentinel del proceso -> (índice, ruta, proceso, conexión, inicio)
+    salidas = {}  # índice -> rutas de salida reservadas
+    
+    while pendientes or activos:
+        # Lanzar procesos hasta ocupar todos los huecos
+        while pendientes and len(activos) < jobs:
+            indice, ruta = pendientes.pop(0)
+            proveedor, _ = identificar_archivo(ruta)
+            salidas[indice] = rutas_salida(directorio_salida, proveedor) if proveedor else None
+            receptor, emisor = multiprocessing.Pipe(duplex=False)
+            proceso = multiprocessing.Process(
+                target=_trabajador, args=(ruta, directorio_salida, filas_por_bloque, salidas[indice], emisor), daemon=True)
+            proceso.start()
+            emisor.close()
+            activos[proceso.sentinel] = (indice, ruta, proceso, receptor, time.perf_counter())
         
-        print(f"Archivos generados exitosamente:")
-        print(f"- Plantillas de producto: {ruta_template}")
-        print(f"- Variantes de producto: {ruta_product}")
-        return True
+        # Esperar a que termine alguno o venza el plazo más próximo
+        espera = None
+        if timeout is not None:
+            ahora = time.perf_counter()
+            espera = max(0, min(inicio + timeout - ahora for _, _, _, _, inicio in activos.values()))
+        listos = set(multiprocessing.connection.wait(list(activos), timeout=espera))
         
-    except Exception as e:
-        print(f"Error al generar los archivos: {str(e)}")
-        return False
+        for sentinel, (indice, ruta, proceso, receptor, inicio) in list(activos.items()):
+            transcurrido = time.perf_counter() - inicio
+            if sentinel in listos:
+                # El resultado se envía justo antes de salir, así que ya está en la tubería
+                if receptor.poll():
+                    resultados[indice] = receptor.recv()
+                else:
+                    if salidas[indice]:
+                        _eliminar_salidas(salidas[indice])
+                    resultados[indice] = {'archivo': ruta, 'proveedor': detectar_proveedor(os.path.basename(ruta)),
+                                          'estado': 'error', 'filas': 0, 'salidas': [],
+                                          'segundos': {'total': round(transcurrido, 3)},
+                                          'error': f"El proceso terminó sin resultado (código {proceso.exitcode})"}
+            elif timeout is not None and transcurrido >= timeout:
+                proceso.terminate()
+                proceso.join()
+                if salidas[indice]:
+                    _eliminar_salidas(salidas[indice])
+                print(f"Tiempo máximo superado ({timeout} s): {os.path.basename(ruta)}")
+                resultados[indice] = {'archivo': ruta, 'proveedor': detectar_proveedor(os.path.basename(ruta)),
+                                      'estado': 'timeout', 'filas': 0, 'salidas': [],
+                                      'segundos': {'total': round(transcurrido, 3)},
+                                      'error': f"Tiempo máximo superado ({timeout} s)"}
+            else:
+                continue
+            proceso.join()
+            receptor.close()
+            del activos[sentinel]
+    
+    return [resultados[i] for i in range(len(rutas))]
 
-def procesar_directorio(directorio_entrada, directorio_salida):
-    """Procesa todos los archivos CSV y Excel en un directorio"""
+def procesar_directorio(directorio_entrada, directorio_salida, jobs=1, timeout=None, ruta_manifiesto=None,
+                        filas_por_bloque=None, incremental=True):
+    """Procesa todos los archivos CSV y Excel en un directorio y escribe un manifiesto JSON
+    
+    En modo incremental, los archivos cuyo contenido y reglas de conversión no
+    han cambiado desde la última ejecución no se convierten de nuevo: se
+    reutilizan las salidas anotadas en el registro de conversiones.
+    """
     if not os.path.exists(directorio_salida):
         os.makedirs(directorio_salida)
     
-    archivos_procesados = 0
-    for archivo in os.listdir(directorio_entrada):
-        if archivo.lower().endswith(('.csv', '.xlsx', '.xls')):
-            ruta_completa = os.path.join(directorio_entrada, archivo)
-            if procesar_archivo(ruta_completa, directorio_salida):
-                archivos_procesados += 1
+    rutas = [
+        os.path.join(directorio_entrada, archivo)
+        for archivo in sorted(os.listdir(directorio_entrada))
+        if archivo.lower().endswith(('.csv', '.xlsx', '.xls'))
+    ]
     
-    print(f"Procesamiento completado. {archivos_procesados} archivos convertidos.")
+    inicio = datetime.now()
+    antes = time.perf_counter()
+    registro = cargar_registro(directorio_salida)
+    firmas = {ruta: firma_conversion(ruta) for ruta in rutas}
+    resultados = {}
+    for ruta in rutas:
+        previa = conversion_vigente(registro, ruta, firmas[ruta]) if incremental else None
+        if previa is not None:
+            resultados[ruta] = previa
+    pendientes = [ruta for ruta in rutas if ruta not in resultados]
+    if resultados:
+        print(f"{len(resultados)} archivos sin cambios desde la última conversión")
+    
+    if jobs > 1 or timeout is not None:
+        convertidos = convertir_en_paralelo(pendientes, directorio_salida, max(jobs, 1), timeout, filas_por_bloque)
+    else:
+        convertidos = [convertir_archivo(ruta, directorio_salida, filas_por_bloque) for ruta in pendientes]
+    for ruta, resultado in zip(pendientes, convertidos):
+        registrar_conversion(registro, firmas[ruta], resultado)
+        resultados[ruta] = resultado
+    # Los registros se emiten aquí y no en cada proceso hijo
+    emitir_metricas(convertidos)
+    resultados = [resultados[ruta] for ruta in rutas]
+    guardar_registro(directorio_salida, registro)
+    
+    estados = {}
+    for resultado in resultados:
+        estados[resultado['estado']] = estados.get(resultado['estado'], 0) + 1
+    manifiesto = {
+        'inicio': inicio.isoformat(timespec='seconds'),
+        'segundos': round(time.perf_counter() - antes, 3),
+        'jobs': jobs,
+        'timeout': timeout,
+        'directorio_entrada': directorio_entrada,
+        'directorio_salida': directorio_salida,
+        'archivos': len(resultados),
+        'filas': sum(resultado['filas'] for resultado in resultados if resultado['estado'] in ('ok', 'sin_cambios')),
+        'estados': estados,
+        'resultados': resultados
+    }
+    
+    if ruta_manifiesto is None:
+        ruta_manifiesto = os.path.join(directorio_salida, f"manifiesto_{inicio.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(ruta_manifiesto, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    
+    print(f"Procesamiento completado. {estados.get('ok', 0)} archivos convertidos, "
+          f"{estados.get('sin_cambios', 0)} sin cambios.")
+    print(f"Manifiesto: {ruta_manifiesto}")
+    return manifiesto
 
 def main():
     parser = argparse.ArgumentParser(description='Convertidor de archivos de proveedores a formato Odoo')
     parser.add_argument('--archivo', help='Ruta al archivo a procesar')
     parser.add_argument('--directorio', help='Directorio con archivos a procesar')
     parser.add_argument('--salida', default='odoo_import', help='Directorio de salida para los archivos convertidos')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Archivos a convertir en paralelo (con --directorio) u hojas del libro (con --archivo)')
+    parser.add_argument('--timeout', type=float, help='Tiempo máximo en segundos por archivo (con --directorio)')
+    parser.add_argument('--bloque', type=int, help='Leer los CSV por bloques de este número de filas (memoria acotada)')
+    parser.add_argument('--forzar', action='store_true', help='Convertir todos los archivos aunque no hayan cambiado')
+    parser.add_argument('--manifiesto', help='Ruta del manifiesto JSON (por defecto, en el directorio de salida)')
+    parser.add_argument('--metricas', help='Archivo JSON Lines al que se añade un registro de métricas por archivo '
+                                           f'(por defecto, {METRICAS_CONVERSION} en el directorio de salida)')
+    parser.add_argument('--profile', nargs='?', const='', metavar='RUTA',
+                        help='Perfilar la ejecución con cProfile y guardar las estadísticas (por defecto, en el '
+                             'directorio de salida); con --jobs > 1 o --timeout los procesos hijos no se perfilan')
+    parser.add_argument('--debug', action='store_true', help='Mostrar los mensajes de depuración (por bloque y hoja)')
     
     args = parser.parse_args()
     
-    if args.archivo:
-        if not os.path.exists(args.salida):
-            os.makedirs(args.salida)
-        procesar_archivo(args.archivo, args.salida)
-    elif args.directorio:
-        procesar_directorio(args.directorio, args.salida)
-    else:
+    if not args.archivo and not args.directorio:
         print("Debe especificar --archivo o --directorio")
+        return
+    
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format='%(message)s')
+    os.makedirs(args.salida, exist_ok=True)
+    manejador = logging.FileHandler(args.metricas or os.path.join(args.salida, METRICAS_CONVERSION), encoding='utf-8')
+    manejador.setFormatter(logging.Formatter('%(message)s'))
+    logger_metricas.addHandler(manejador)
+    logger_metricas.setLevel(logging.INFO)
+    
+    perfilador = cProfile.Profile() if args.profile is not None else None
+    if perfilador:
+        perfilador.enable()
+    try:
+        if args.archivo:
+            procesar_archivo(args.archivo, args.salida, args.bloque, args.jobs)
+        else:
+            procesar_directorio(args.directorio, args.salida, jobs=args.jobs, timeout=args.timeout,
+                                ruta_manifiesto=args.manifiesto, filas_por_bloque=args.bloque,
+                                incremental=not args.forzar)
+    finally:
+        manejador.close()
+        if perfilador:
+            perfilador.disable()
+            ruta_perfil = args.profile or os.path.join(
+                args.salida, f"perfil_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+            perfilador.dump_stats(ruta_perfil)
+            pstats.Stats(perfilador).sort_stats('cumulative').print_stats(15)
+            print(f"Perfil: {ruta_perfil} (python -m pstats {ruta_perfil})")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
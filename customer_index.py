@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+"""
+Servicio de búsqueda de clientes para el middleware FastAPI
+
+Mantiene en memoria índices normalizados de los contactos de Odoo
+(res.partner) para búsquedas tipo TPV sin una consulta `ilike` por pulsación:
+- Teléfono en formato E.164 ("+34 612 345 678" -> "+34612345678")
+- Email en minúsculas
+- Nombre sin acentos y en minúsculas, por palabra y completo
+
+Cada índice es una lista ordenada de (clave, id), de modo que las búsquedas
+exactas y por prefijo son una búsqueda binaria. Los datos se cargan con una
+sincronización paginada de res.partner y después se actualizan solo con los
+contactos modificados (write_date) desde la última sincronización.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# execute(modelo, método, args, kwargs) -> resultado de execute_kw
+OdooExecute = Callable[..., Any]
+
+DEFAULT_COUNTRY_CODE = "34"
+PARTNER_FIELDS = ['id', 'name', 'email', 'phone', 'mobile', 'city', 'country_id', 'active']
+ODOO_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def normalize_phone(raw: Optional[str], country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """Normaliza un teléfono a E.164; los números nacionales usan el prefijo por defecto"""
+    if not raw:
+        return None
+    raw = str(raw).strip()
+    digits = re.sub(r"\D", "", raw)
+    if not digits:
+        return None
+    if raw.startswith("+"):
+        return f"+{digits}"
+    if digits.startswith("00"):
+        return f"+{digits[2:]}"
+    if len(digits) == 9:
+        return f"+{country_code}{digits}"
+    return f"+{digits}"
+
+
+def normalize_email(raw: Optional[str]) -> Optional[str]:
+    if not raw:
+        return None
+    return str(raw).strip().lower() or None
+
+
+def fold_text(raw: Optional[str]) -> str:
+    """Minúsculas, sin acentos y con espacios simples ("José  Pérez" -> "jose perez")"""
+    if not raw:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(raw))
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", stripped).strip().lower()
+
+
+def customer_from_odoo(p: Dict[str, Any]) -> Dict[str, Any]:
+    """Transforma un res.partner de Odoo al formato del frontend"""
+    return {
+        "id": p['id'],
+        "name": p.get('name') or "",
+        "email": p.get('email') or "",
+        "phone": p.get('phone') or p.get('mobile') or "",
+        "city": p.get('city') or "",
+        "country": p['country_id'][1] if p.get('country_id') else "",
+        "status": "Activo" if p.get('active', True) else "Inactivo"
+    }
+
+
+class _SortedKeyIndex:
+    """Lista ordenada de (clave, id) con búsqueda exacta y por prefijo"""
+
+    def __init__(self):
+        self._entries: List[Tuple[str, int]] = []
+
+    def add(self, key: str, record_id: int):
+        insort(self._entries, (key, record_id))
+
+    def discard(self, key: str, record_id: int):
+        pos = bisect_left(self._entries, (key, record_id))
+        if pos < len(self._entries) and self._entries[pos] == (key, record_id):
+            del self._entries[pos]
+
+    def exact(self, key: str) -> List[int]:
+        pos = bisect_left(self._entries, (key, -1))
+        ids = []
+        while pos < len(self._entries) and self._entries[pos][0] == key:
+            ids.append(self._entries[pos][1])
+            pos += 1
+        return ids
+
+    def prefix(self, prefix: str, limit: int) -> List[int]:
+        pos = bisect_left(self._entries, (prefix, -1))
+        ids: Dict[int, None] = {}  # ordenado y sin duplicados (un nombre aporta varias claves)
+        while pos < len(self._entries) and len(ids) < limit and self._entries[pos][0].startswith(prefix):
+            ids[self._entries[pos][1]] = None
+            pos += 1
+        return list(ids)
+
+    def count_prefix(self, prefix: str) -> int:
+        start = bisect_left(self._entries, (prefix, -1))
+        return bisect_left(self._entries, (prefix + "\U0010ffff", -1), start) - start
+
+    def rebuild(self, entries: List[Tuple[str, int]]):
+        # Carga masiva: una sola ordenación en lugar de una inserción por clave
+        self._entries = sorted(entries)
+
+
+class CustomerIndex:
+    """Índices de clientes por teléfono, email y nombre con sincronización incremental"""
+
+    def __init__(self, refresh_seconds: float = 60, page_size: int = 500,
+                 country_code: str = DEFAULT_COUNTRY_CODE):
+        self.refresh_seconds = refresh_seconds
+        self.page_size = page_size
+        self.country_code = country_code
+        self._lock = threading.Lock()
+        self._customers: Dict[int, Dict[str, Any]] = {}
+        self._keys: Dict[int, List[Tuple[_SortedKeyIndex, str]]] = {}
+        self._name_tokens: Dict[int, List[str]] = {}
+        self._phones = _SortedKeyIndex()
+        self._emails = _SortedKeyIndex()
+        self._names = _SortedKeyIndex()
+        self._watermark: Optional[str] = None
+        self._last_attempt = float("-inf")
+
+    def __len__(self):
+        return len(self._customers)
+
+    @property
+    def loaded(self) -> bool:
+        """True si el índice contiene datos sincronizados desde Odoo"""
+        return self._watermark is not None
+
+    # Mantenimiento del índice
+    def _index_keys(self, customer: Dict[str, Any]) -> List[Tuple[_SortedKeyIndex, str]]:
+        keys = []
+        phone = normalize_phone(customer.get("phone"), self.country_code)
+        if phone:
+            keys.append((self._phones, phone))
+        email = normalize_email(customer.get("email"))
+        if email:
+            keys.append((self._emails, email))
+        name = fold_text(customer.get("name"))
+        if name:
+            keys.append((self._names, name))
+            keys.extend((self._names, token) for token in set(name.split()) if token != name)
+        return keys
+
+    def upsert(self, customer: Dict[str, Any]):
+        with self._lock:
+            self._remove_locked(customer["id"])
+            keys = self._index_keys(customer)
+            for index, key in keys:
+                index.add(key, customer["id"])
+            self._keys[customer["id"]] = keys
+            self._name_tokens[customer["id"]] = fold_text(customer.get("name")).split()
+            self._customers[customer["id"]] = customer
+
+    def remove(self, customer_id: int):
+        with self._lock:
+            self._remove_locked(customer_id)
+
+    def _remove_locked(self, customer_id: int):
+        for index, key in self._keys.pop(customer_id, []):
+            index.discard(key, customer_id)
+        self._name_tokens.pop(customer_id, None)
+        self._customers.pop(customer_id, None)
+
+    def load(self, customers: Iterable[Dict[str, Any]]):
+        """Sustituye todo el contenido (sincronización completa o datos simulados de arranque)"""
+        entries: Dict[int, List[Tuple[str, int]]] = {}
+        with self._lock:
+            self._customers.clear()
+            self._keys.clear()
+            self._name_tokens.clear()
+            for customer in customers:
+                keys = self._index_keys(customer)
+                for index, key in keys:
+                    entries.setdefault(id(index), []).append((key, customer["id"]))
+                self._keys[customer["id"]] = keys
+                self._name_tokens[customer["id"]] = fold_text(customer.get("name")).split()
+                self._customers[customer["id"]] = customer
+            for index in (self._phones, self._emails, self._names):
+                index.rebuild(entries.get(id(index), []))
+
+    # Consultas
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._customers.values())
+
+    def by_phone(self, phone: str) -> List[Dict[str, Any]]:
+        key = normalize_phone(phone, self.country_code)
+        return self._resolve(self._phones.exact(key)) if key else []
+
+    def by_email(self, email: str) -> List[Dict[str, Any]]:
+        key = normalize_email(email)
+        return self._resolve(self._emails.exact(key)) if key else []
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Búsqueda exacta y por prefijo según el tipo de consulta (email, teléfono o nombre)"""
+        query = (query or "").strip()
+        if not query:
+            return []
+
+        with self._lock:
+            if "@" in query:
+                key = normalize_email(query)
+                ids = self._emails.exact(key) or self._emails.prefix(key, limit)
+            elif re.fullmatch(r"[\d\s+().\-]+", query):
+                digits = re.sub(r"\D", "", query)
+                # Un número completo se normaliza a E.164; uno parcial se busca tal cual
+                key = normalize_phone(query, self.country_code) if len(digits) >= 9 or query.startswith("+") else None
+                ids = self._phones.exact(key) if key else []
+                if not ids:
+                    ids = self._phones.prefix(key or f"+{self.country_code}{digits}", limit)
+            else:
+                ids = self._search_name(fold_text(query), limit) or self._emails.prefix(query.lower(), limit)
+            return [self._customers[i] for i in ids[:limit] if i in self._customers]
+
+    def _search_name(self, folded: str, limit: int) -> List[int]:
+        # Nombre completo por prefijo; si no, todas las palabras deben casar por prefijo
+        ids = self._names.prefix(folded, limit)
+        tokens = folded.split()
+        if ids or len(tokens) < 2:
+            return ids
+        # Partir de la palabra más selectiva y comprobar el resto sobre sus candidatos
+        rarest = min(tokens, key=self._names.count_prefix)
+        others = [t for t in tokens if t != rarest]
+        matches = []
+        for candidate in self._names.prefix(rarest, len(self._customers)):
+            name_tokens = self._name_tokens.get(candidate, [])
+            if all(any(n.startswith(t) for n in name_tokens) for t in others):
+                matches.append(candidate)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def _resolve(self, ids: List[int]) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._customers[i] for i in ids if i in self._customers]
+
+    # Sincronización con Odoo
+    def refresh_if_stale(self, connect: Callable[[], Optional[OdooExecute]]):
+        """Sincroniza si ha pasado el tiempo de refresco desde el último intento
+
+        `connect` solo se invoca entonces: autenticar contra Odoo cuesta un RPC
+        y la búsqueda se llama en cada pulsación.
+        """
+        now = time.monotonic()
+        if now - self._last_attempt < self.refresh_seconds:
+            return
+        self._last_attempt = now
+        execute = connect()
+        if execute is not None:
+            self.sync(execute)
+
+    def sync(self, execute: OdooExecute):
+        """Carga paginada de res.partner: completa la primera vez, incremental después"""
+        # Margen de unos segundos para no perder escrituras concurrentes con la consulta
+        started = (datetime.utcnow() - timedelta(seconds=5)).strftime(ODOO_DATETIME_FORMAT)
+        full = not self.loaded
+
+        domain = [['customer_rank', '>', 0]]
+        if not full:
+            # Incluir archivados para poder retirarlos del índice
+            domain = domain + [['write_date', '>', self._watermark], ['active', 'in', [True, False]]]
+
+        partners = []
+        offset = 0
+        while True:
+            page = execute('res.partner', 'search_read', [domain], {
+                'fields': PARTNER_FIELDS, 'offset': offset, 'limit': self.page_size, 'order': 'id'
+            })
+            partners.extend(page)
+            if len(page) < self.page_size:
+                break
+            offset += self.page_size
+
+        if full:
+            self.load(customer_from_odoo(p) for p in partners)
+        else:
+            for partner in partners:
+                if partner.get('active') is False:
+                    self.remove(partner['id'])
+                else:
+                    self.upsert(customer_from_odoo(partner))
+
+        self._watermark = started
@@ -9,8 +9,8 @@ archivos de ejemplo y visualizar los resultados.
 """
 
 import os
-import pandas as pd
-from convertidor_proveedores import procesar_archivo, detectar_proveedor, leer_archivo
+from convertidor_proveedores import convertir_archivo, detectar_proveedor, leer_archivo
+from tablas_odoo import leer_salida, contar_filas
 
 # Directorio de trabajo
 DIR_EJEMPLOS = "/home/espasiko/manusodoo/last/ejemplos"
@@ -60,25 +60,20 @@ def demo_conversion(ruta_archivo):
         os.makedirs(DIR_SALIDA)
     
     # Procesar el archivo
-    resultado = procesar_archivo(ruta_archivo, DIR_SALIDA)
+    resultado = convertir_archivo(ruta_archivo, DIR_SALIDA)
     
-    if resultado:
-        # Buscar los archivos generados más recientes para este proveedor
-        archivos_generados = [f for f in os.listdir(DIR_SALIDA) 
-                             if f.startswith(proveedor) and f.endswith('.csv')]
+    if resultado['estado'] == 'ok':
+        # Archivos CSV generados por esta conversión (plantillas y variantes)
+        archivos_generados = [ruta for ruta in resultado['salidas'] if ruta.endswith('.csv')]
         
         if archivos_generados:
-            # Ordenar por fecha de modificación (más reciente primero)
-            archivos_generados.sort(key=lambda x: os.path.getmtime(os.path.join(DIR_SALIDA, x)), 
-                                   reverse=True)
-            
             # Mostrar contenido de los archivos generados
-            for archivo in archivos_generados[:2]:  # Mostrar solo los 2 más recientes
-                ruta_completa = os.path.join(DIR_SALIDA, archivo)
-                df = pd.read_csv(ruta_completa)
+            for ruta_completa in archivos_generados:
+                # Se lee la tabla Arrow que acompaña al CSV si existe (sin parsear texto)
+                df = leer_salida(ruta_completa)
                 
-                print(f"\nArchivo generado: {archivo}")
-                print(f"Dimensiones: {df.shape[0]} filas x {df.shape[1]} columnas")
+                print(f"\nArchivo generado: {os.path.basename(ruta_completa)}")
+                print(f"Dimensiones: {contar_filas(ruta_completa)} filas x {df.shape[1]} columnas")
                 print("\nPrimeras 5 filas:")
                 print(df.head(5).to_string())
                 print("\n" + "-" * 50)
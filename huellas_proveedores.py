@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Detección del proveedor y de la cabecera por el contenido del archivo
+
+detectar_proveedor() solo mira el nombre del archivo, que se pierde cuando un
+cliente de correo lo renombra ("adjunto (3).xlsx"). En ese caso se leen las
+primeras filas de cada hoja y se puntúa cada perfil del registro:
+
+- vocabulario: las columnas del perfil (código, descripción y precios) deben
+  aparecer en la fila de cabecera de alguna hoja;
+- hojas: el libro tiene las hojas que declara el perfil (o varias hojas con
+  cabecera, si el perfil lee todas);
+- nombre: el nombre del proveedor aparece en los nombres de hoja o en los
+  títulos que hay encima de la cabecera.
+
+El resultado es la huella del archivo: proveedor, fila de cabecera de cada
+hoja y columna real que corresponde a cada columna del perfil. Las huellas se
+guardan bajo un hash de la disposición de la cabecera (nombres de hoja y filas
+de texto hasta la cabecera, sin los datos), de modo que los archivos
+siguientes con la misma disposición se clasifican con una sola consulta sin
+volver a puntuar los perfiles.
+
+La ruta del archivo de huellas se configura con HUELLAS_PROVEEDORES; vacía,
+las huellas solo se recuerdan dentro del proceso.
+"""
+
+import csv
+import functools
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+import pandas as pd
+
+from perfiles_proveedores import PERFILES, detectar_proveedor, version_perfil
+
+RUTA_HUELLAS = os.getenv(
+    "HUELLAS_PROVEEDORES",
+    os.path.join(os.path.expanduser("~"), ".cache", "manusodoo", "huellas_proveedores.json"))
+
+# Filas leídas de cada hoja para buscar la cabecera
+MAX_FILAS = 20
+
+# Columnas del perfil que tienen que estar en la cabecera
+CAMPOS = ('codigo', 'nombre', 'precio', 'precio_venta')
+
+_NUMERO = re.compile(r'^[-+]?[\d.,\s€%]+$')
+
+# Huellas conocidas: hash de la disposición -> huella (se carga del disco al primer uso)
+_huellas = None
+
+
+def normalizar_etiqueta(valor):
+    """Texto de una celda comparable entre archivos ("  Código " -> "CODIGO")"""
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ''
+    texto = unicodedata.normalize('NFKD', str(valor))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.upper().split())
+
+
+def _etiquetas(perfil):
+    return {campo: normalizar_etiqueta(perfil['columnas'][campo]) for campo in CAMPOS}
+
+
+# Vocabulario de cabecera de cualquier perfil, para encontrar la fila sin saber el proveedor
+_VOCABULARIO = {etiqueta for perfil in PERFILES.values() for etiqueta in _etiquetas(perfil).values()}
+
+
+def _filas_csv(ruta):
+    # csv y no read_csv: las primeras filas (títulos) suelen tener menos campos que la cabecera.
+    # Sin las líneas vacías, como read_csv, para que la fila de cabecera sirva para leerlo
+    with open(ruta, encoding='utf-8', errors='replace', newline='') as f:
+        return [fila for _, fila in zip(range(MAX_FILAS), filter(None, csv.reader(f)))]
+
+
+def leer_muestra(ruta):
+    """Primeras filas de cada hoja del archivo ({hoja: [[celda, ...], ...]}) o None si no se puede leer
+
+    Un CSV tiene una única hoja de nombre ''.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    try:
+        if extension == '.csv':
+            # Sin nombre de hoja: el del archivo no forma parte de la disposición
+            return {'': _filas_csv(ruta)}
+        if extension in ('.xlsx', '.xls'):
+            hojas = pd.read_excel(ruta, sheet_name=None, header=None, nrows=MAX_FILAS, dtype=object)
+            return {str(nombre): df.to_numpy().tolist() for nombre, df in hojas.items()}
+    except Exception as e:
+        print(f"No se pudo leer la muestra de {os.path.basename(ruta)}: {str(e)}")
+    return None
+
+
+def fila_cabecera(filas):
+    """Índice de la fila con más columnas conocidas (al menos dos) o None"""
+    mejor, aciertos = None, 1
+    for i, fila in enumerate(filas):
+        n = sum(normalizar_etiqueta(celda) in _VOCABULARIO for celda in fila)
+        if n > aciertos:
+            mejor, aciertos = i, n
+    return mejor
+
+
+def _textos(fila):
+    """Celdas no vacías de una fila de títulos o cabecera, tal cual (None si tiene algún número)
+
+    Sin normalizar: dos cabeceras que solo difieren en tildes o mayúsculas
+    tienen huellas distintas, cada una con sus columnas reales.
+    """
+    textos = [str(celda).strip() for celda in fila if normalizar_etiqueta(celda)]
+    if any(_NUMERO.match(texto) for texto in textos):
+        return None
+    return textos
+
+
+def _disposicion(muestra):
+    """Por hoja: fila de cabecera y filas de texto hasta ella (títulos y cabecera, sin datos)"""
+    disposicion = {}
+    for hoja, filas in muestra.items():
+        cabecera = fila_cabecera(filas)
+        titulos = [] if cabecera is None else [t for t in map(_textos, filas[:cabecera + 1]) if t]
+        disposicion[hoja] = {'cabecera': cabecera, 'titulos': titulos}
+    return disposicion
+
+
+def clave_disposicion(disposicion):
+    """Hash de la disposición de la cabecera y de las reglas de los perfiles"""
+    reglas = {nombre: version_perfil(nombre) for nombre in PERFILES}
+    contenido = json.dumps([disposicion, reglas], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _hojas_del_perfil(perfil, nombres):
+    """Hojas que el perfil leería de las que tienen cabecera"""
+    lectura = perfil['lectura']
+    if lectura.get('hojas') == 'todas':
+        excluidas = re.compile(lectura['excluir_hojas'], re.IGNORECASE)
+        return [nombre for nombre in nombres if not excluidas.search(nombre)]
+    declaradas = lectura.get('hojas') or [lectura['hoja']]
+    return [nombre for nombre in nombres if nombre in declaradas]
+
+
+def puntuar(perfil, muestra, disposicion):
+    """Puntuación del perfil para el archivo (None si faltan columnas del perfil en la cabecera)
+
+    Devuelve (puntos, hoja con la cabecera del perfil, {campo: columna real}).
+    """
+    etiquetas = _etiquetas(perfil)
+    con_cabecera = [hoja for hoja, datos in disposicion.items() if datos['cabecera'] is not None]
+    hoja_perfil, columnas = None, None
+    for hoja in con_cabecera:
+        reales = {normalizar_etiqueta(celda): celda for celda in muestra[hoja][disposicion[hoja]['cabecera']]
+                  if normalizar_etiqueta(celda)}
+        if all(etiqueta in reales for etiqueta in etiquetas.values()):
+            hoja_perfil = hoja
+            columnas = {campo: str(reales[etiqueta]) for campo, etiqueta in etiquetas.items()}
+            break
+    if hoja_perfil is None:
+        return None
+
+    # Hojas: las declaradas existen, o hay varias con cabecera si el perfil lee todas
+    hojas = _hojas_del_perfil(perfil, con_cabecera)
+    varias = perfil['lectura'].get('hojas') == 'todas'
+    puntos = 1.0 if (len(hojas) > 1 if varias else hojas) else 0.0
+
+    # Nombre: palabras del proveedor en los nombres de hoja o en los títulos
+    palabras = set()
+    for hoja, datos in disposicion.items():
+        for texto in map(normalizar_etiqueta, [hoja] + [t for titulo in datos['titulos'] for t in titulo]):
+            palabras.update(re.findall(r'[A-Z0-9]+', texto))
+    del_nombre = [p for p in re.findall(r'[A-Z0-9]+', normalizar_etiqueta(perfil['nombre'])) if len(p) > 1]
+    if del_nombre:
+        puntos += sum(p in palabras for p in del_nombre) / len(del_nombre)
+    return puntos, hoja_perfil, columnas
+
+
+def clasificar(muestra, disposicion):
+    """Huella del archivo: proveedor con la mejor puntuación, sin empates (proveedor None si no lo hay)"""
+    puntuaciones = {}
+    for nombre, perfil in PERFILES.items():
+        resultado = puntuar(perfil, muestra, disposicion)
+        if resultado is not None:
+            puntuaciones[nombre] = resultado
+    ordenados = sorted(puntuaciones.items(), key=lambda par: -par[1][0])
+    # Sin ninguna señal propia (hojas o nombre) solo vale si un único perfil tiene sus columnas
+    if not ordenados or (len(ordenados) > 1 and (ordenados[0][1][0] == 0
+                                                 or ordenados[0][1][0] == ordenados[1][1][0])):
+        return {'proveedor': None}
+    nombre, (puntos, hoja, columnas) = ordenados[0]
+    con_cabecera = [h for h, datos in disposicion.items() if datos['cabecera'] is not None]
+    return {
+        'proveedor': nombre,
+        'puntos': round(puntos, 3),
+        'hojas': {h: disposicion[h]['cabecera'] for h in _hojas_del_perfil(PERFILES[nombre], con_cabecera) or [hoja]},
+        'hoja': hoja,
+        'columnas': columnas
+    }
+
+
+def _cargar_huellas():
+    global _huellas
+    if _huellas is None:
+        _huellas = {}
+        if RUTA_HUELLAS:
+            try:
+                with open(RUTA_HUELLAS, encoding='utf-8') as f:
+                    _huellas = json.load(f)
+            except (OSError, ValueError):
+                pass
+    return _huellas
+
+
+def _guardar_huellas(huellas):
+    """Escribe las huellas conocidas (renombrado atómico)"""
+    if not RUTA_HUELLAS:
+        return
+    try:
+        os.makedirs(os.path.dirname(RUTA_HUELLAS) or '.', exist_ok=True)
+        temporal = f"{RUTA_HUELLAS}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(huellas, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, RUTA_HUELLAS)
+    except OSError as e:
+        print(f"No se pudieron guardar las huellas de proveedores: {str(e)}")
+
+
+def huella_contenido(ruta):
+    """Huella del archivo por su contenido (ver clasificar), o None si no se puede leer
+
+    Si ya se clasificó un archivo con la misma disposición de cabecera, la
+    huella se recupera por su hash sin puntuar los perfiles.
+    """
+    muestra = leer_muestra(ruta)
+    if muestra is None:
+        return None
+    disposicion = _disposicion(muestra)
+    clave = clave_disposicion(disposicion)
+    huellas = _cargar_huellas()
+    if clave not in huellas:
+        huellas[clave] = clasificar(muestra, disposicion)
+        _guardar_huellas(huellas)
+    return huellas[clave]
+
+
+@functools.lru_cache(maxsize=256)
+def _identificar(ruta, tamano, modificado):
+    proveedor = detectar_proveedor(os.path.basename(ruta))
+    if proveedor:
+        return proveedor, None
+    huella = huella_contenido(ruta)
+    if huella is None or huella['proveedor'] is None:
+        return None, None
+    return huella['proveedor'], huella
+
+
+def identificar_archivo(ruta):
+    """Proveedor de un archivo y su huella: por el nombre y, si no basta, por el contenido
+
+    La huella es None cuando el proveedor sale del nombre del archivo.
+    """
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return detectar_proveedor(os.path.basename(ruta)), None
+    return _identificar(os.path.abspath(ruta), estado.st_size, estado.st_mtime_ns)
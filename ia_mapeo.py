@@ -15,7 +15,7 @@ import pandas as pd
 import numpy as np
 from collections import Counter
 from difflib import SequenceMatcher
-from convertidor_proveedores import leer_archivo, detectar_proveedor
+from convertidor_proveedores import bloques_archivo, identificar_archivo, normalizar_bloques, ErrorLectura
 
 # Configuración
 DIR_EJEMPLOS = "/home/espasiko/manusodoo/last/ejemplos"
@@ -205,10 +205,16 @@ def enriquecer_datos(df):
     
     return df_enriquecido
 
+def enriquecer_bloques(bloques):
+    """Etapa de enriquecimiento de la tubería: atributos, categorías y nombres de cada bloque de productos"""
+    for df_productos in bloques:
+        yield enriquecer_datos(df_productos)
+
 def analizar_archivo(ruta_archivo):
     """Analiza un archivo de proveedor y muestra información enriquecida"""
     nombre_archivo = os.path.basename(ruta_archivo)
-    proveedor = detectar_proveedor(nombre_archivo)
+    # Por el nombre o, si el archivo llegó renombrado, por su contenido
+    proveedor, _ = identificar_archivo(ruta_archivo)
     
     if not proveedor:
         print(f"No se pudo detectar el proveedor para: {nombre_archivo}")
@@ -218,72 +224,17 @@ def analizar_archivo(ruta_archivo):
     print(f"ANÁLISIS IA: {nombre_archivo} (Proveedor: {proveedor})")
     print(f"{'=' * 50}")
     
-    # Leer archivo
-    df = leer_archivo(ruta_archivo)
-    if df is None:
+    # Leer (todas las hojas del perfil), extraer los productos según el formato
+    # del perfil y enriquecerlos: las mismas etapas que la tubería de conversión
+    try:
+        bloques = list(enriquecer_bloques(normalizar_bloques(bloques_archivo(ruta_archivo), proveedor)))
+    except ErrorLectura:
         print("No se pudo leer el archivo")
         return None
     
-    # Procesar según el proveedor (simplificado para este ejemplo)
-    productos = []
-    
-    # Extraer productos según el formato del proveedor
-    if proveedor == 'BSH':
-        # Buscar columnas relevantes
-        if 'CÓDIGO' in df.columns and 'DESCRIPCIÓN' in df.columns:
-            categoria_actual = None
-            
-            for _, row in df.iterrows():
-                # Verificar si es una fila de categoría
-                if pd.notna(row['CÓDIGO']) and isinstance(row['CÓDIGO'], str) and \
-                   (pd.isna(row['DESCRIPCIÓN']) or not str(row['DESCRIPCIÓN']).strip()):
-                    categoria_actual = row['CÓDIGO'].strip()
-                
-                # Si tiene código y descripción, es un producto
-                elif pd.notna(row['CÓDIGO']) and pd.notna(row['DESCRIPCIÓN']) and \
-                     isinstance(row['CÓDIGO'], str) and row['CÓDIGO'].strip():
-                    productos.append({
-                        'codigo': row['CÓDIGO'].strip(),
-                        'nombre': row['DESCRIPCIÓN'].strip(),
-                        'categoria': categoria_actual,
-                        'precio': row.get('TOTAL') if pd.notna(row.get('TOTAL')) else None,
-                        'precio_venta': row.get('P.V.P FINAL CLIENTE') if pd.notna(row.get('P.V.P FINAL CLIENTE')) else None
-                    })
-    elif proveedor == 'CECOTEC':
-        # Procesar formato CECOTEC con columnas __EMPTY_*
-        categoria_actual = None
-        
-        for _, row in df.iterrows():
-            # Verificar si es una fila de categoría (solo tiene la columna CECOTEC con valor y sin __EMPTY_1)
-            if pd.notna(row.get('CECOTEC')) and isinstance(row.get('CECOTEC'), str) and \
-               (pd.isna(row.get('__EMPTY_1')) or not str(row.get('__EMPTY_1')).strip()):
-                categoria_actual = row.get('CECOTEC').strip()
-            
-            # Si tiene código y descripción, es un producto
-            elif pd.notna(row.get('CECOTEC')) and pd.notna(row.get('__EMPTY_1')) and \
-                 (isinstance(row.get('CECOTEC'), (int, str))) and str(row.get('CECOTEC')).strip():
-                
-                # Extraer código (puede ser numérico o string)
-                codigo = str(row.get('CECOTEC')).strip()
-                
-                productos.append({
-                    'codigo': codigo,
-                    'nombre': str(row.get('__EMPTY_1')).strip(),
-                    'categoria': categoria_actual,
-                    'precio': row.get('__EMPTY_5') if pd.notna(row.get('__EMPTY_5')) else None,
-                    'precio_venta': row.get('__EMPTY_9') if pd.notna(row.get('__EMPTY_9')) else None
-                })
-    
-    elif proveedor == 'ALMCE':
-        # Implementar extracción para ALMCE
-        pass
-    
-    # Convertir a DataFrame
-    if productos:
-        df_productos = pd.DataFrame(productos)
-        
-        # Enriquecer datos
-        df_enriquecido = enriquecer_datos(df_productos)
+    if bloques:
+        # El análisis (duplicados, distribución de categorías) necesita todos los productos
+        df_enriquecido = pd.concat(bloques, ignore_index=True) if len(bloques) > 1 else bloques[0]
         
         # Mostrar estadísticas
         print(f"\nProductos encontrados: {len(df_enriquecido)}")
@@ -5,10 +5,15 @@ Importador de Productos a Odoo desde archivos Excel de Proveedores
 
 Este script procesa todos los archivos Excel de proveedores en el directorio 'ejemplos',
 extrae los productos, evita duplicados y los importa a Odoo organizados por categorías.
+
+Con --migrar-ids, antes de importar se pasan a los IDs externos deterministas
+los productos que ya estaban en Odoo con los IDs de versiones anteriores (ver
+migrar_ids_productos); basta hacerlo una vez.
 """
 
 import os
 import sys
+import argparse
 import pandas as pd
 import xmlrpc.client
 import logging
@@ -16,6 +21,11 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import re
 
+from perfiles_proveedores import PERFILES
+from precios import parsear_precios
+from convertidor_proveedores import bloques_archivo, ids_externos
+import tuberia
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -35,104 +45,23 @@ ODOO_CONFIG = {
     'password': 'admin'
 }
 
-# Configuración de proveedores y sus estructuras de datos
+# Configuración de proveedores y sus estructuras de datos, derivada de los
+# perfiles de perfiles_proveedores.json que declaran un archivo de ejemplo
 PROVEEDORES_CONFIG = {
-    'MIELECTRO': {
-        'archivo': 'ejemplos/PVP MIELECTRO.xlsx',
-        'hoja': 'MIELECTRO',
+    proveedor: {
+        'archivo': perfil['archivo'],
+        'hoja': perfil['lectura']['hoja'],
+        'fila_cabecera': perfil['lectura']['fila_cabecera'],
         'columnas': {
-            'codigo': 'CÓDIGO',
-            'descripcion': 'DESCRIPCIÓN',
-            'precio_compra': ' IMPORTE BRUTO ',
-            'precio_venta': 'P.V.P FINAL CLIENTE',
+            'codigo': perfil['columnas']['codigo'],
+            'descripcion': perfil['columnas']['nombre'],
+            'precio_compra': perfil['columnas']['precio_compra'],
+            'precio_venta': perfil['columnas']['precio_venta'],
             'categoria': None  # Se inferirá
         },
-        'margen_defecto': 0.30
-    },
-    'BECKEN': {
-        'archivo': 'ejemplos/PVP BECKEN - TEGALUXE.xlsx',
-        'hoja': 'BECKEN',
-        'columnas': {
-            'codigo': 'CÓDIGO',
-            'descripcion': 'DESCRIPCIÓN',
-            'precio_compra': ' IMPORTE BRUTO ',
-            'precio_venta': 'P.V.P FINAL CLIENTE',
-            'categoria': None
-        },
-        'margen_defecto': 0.30
-    },
-    'EAS-JOHNSON': {
-        'archivo': 'ejemplos/PVP EAS-JOHNSON.xlsx',
-        'hoja': 'EAS-JOHNSON',
-        'columnas': {
-            'codigo': 'CÓDIGO',
-            'descripcion': 'DESCRIPCIÓN',
-            'precio_compra': ' IMPORTE BRUTO ',
-            'precio_venta': 'P.V.P FINAL CLIENTE',
-            'categoria': None
-        },
-        'margen_defecto': 0.30
-    },
-    'ELECTRODIRECTO': {
-        'archivo': 'ejemplos/PVP ELECTRODIRECTO.xlsx',
-        'hoja': 'ELECTRODIRECTO',
-        'columnas': {
-            'codigo': 'CÓDIGO',
-            'descripcion': 'DESCRIPCIÓN',
-            'precio_compra': ' IMPORTE BRUTO ',
-            'precio_venta': 'P.V.P FINAL CLIENTE',
-            'categoria': None
-        },
-        'margen_defecto': 0.30
-    },
-    'ORBEGOZO': {
-        'archivo': 'ejemplos/PVP ORBEGOZO.xlsx',
-        'hoja': 'ORBEGOZO',
-        'columnas': {
-            'codigo': 'CÓDIGO',
-            'descripcion': 'DESCRIPCIÓN',
-            'precio_compra': ' IMPORTE BRUTO ',
-            'precio_venta': 'P.V.P FINAL CLIENTE',
-            'categoria': None
-        },
-        'margen_defecto': 0.30
-    },
-    'UFESA': {
-        'archivo': 'ejemplos/PVP UFESA.xlsx',
-        'hoja': 'UFESA',
-        'columnas': {
-            'codigo': 'CÓDIGO',
-            'descripcion': 'DESCRIPCIÓN',
-            'precio_compra': ' IMPORTE BRUTO ',
-            'precio_venta': 'P.V.P FINAL CLIENTE',
-            'categoria': None
-        },
-        'margen_defecto': 0.30
-    },
-    'VITROKITCHEN': {
-        'archivo': 'ejemplos/PVP VITROKITCHEN.xlsx',
-        'hoja': 'VITROKITCHEN',
-        'columnas': {
-            'codigo': 'CÓDIGO',
-            'descripcion': 'DESCRIPCIÓN',
-            'precio_compra': ' IMPORTE BRUTO ',
-            'precio_venta': 'P.V.P FINAL CLIENTE',
-            'categoria': None
-        },
-        'margen_defecto': 0.30
-    },
-    'CECOTEC': {
-        'archivo': 'ejemplos/PVP CECOTEC.xlsx',
-        'hoja': 'CECOTEC',
-        'columnas': {
-            'codigo': 'CÓDIGO',
-            'descripcion': 'DESCRIPCIÓN',
-            'precio_compra': ' IMPORTE BRUTO ',
-            'precio_venta': 'P.V.P FINAL CLIENTE',
-            'categoria': None
-        },
-        'margen_defecto': 0.30
+        'margen_defecto': perfil['margen_defecto']
     }
+    for proveedor, perfil in PERFILES.items() if 'archivo' in perfil
 }
 
 # Mapeo de categorías basado en palabras clave
@@ -168,7 +97,6 @@ class ImportadorProductosOdoo:
         self.odoo_password = ODOO_CONFIG['password']
         self.uid = None
         self.models = None
-        self.productos_procesados = set()
         self.categorias_cache = {}
         self.proveedores_cache = {}
         
@@ -258,7 +186,7 @@ class ImportadorProductosOdoo:
     
     def inferir_categoria(self, descripcion: str) -> str:
         """Infiere la categoría del producto basándose en su descripción"""
-        descripcion_lower = descripcion.lower()
+        descripcion_lower = descripcion.lower() if isinstance(descripcion, str) else ''
         
         for palabra_clave, categoria in CATEGORIAS_MAPEO.items():
             if palabra_clave in descripcion_lower:
@@ -266,123 +194,214 @@ class ImportadorProductosOdoo:
         
         return 'Electrodomésticos'  # Categoría por defecto
     
-    def leer_archivo_proveedor(self, proveedor: str, config: Dict) -> Optional[pd.DataFrame]:
-        """Lee y procesa el archivo Excel de un proveedor"""
-        try:
-            archivo_path = config['archivo']
-            if not os.path.exists(archivo_path):
-                logger.warning(f"Archivo no encontrado: {archivo_path}")
-                return None
-            
-            # Leer archivo Excel
-            df = pd.read_excel(archivo_path, sheet_name=config['hoja'])
-            
-            # Mapear columnas
-            columnas_mapeo = config['columnas']
-            df_procesado = pd.DataFrame()
-            
-            for campo, columna_excel in columnas_mapeo.items():
-                if columna_excel and columna_excel in df.columns:
-                    df_procesado[campo] = df[columna_excel]
-                elif campo == 'categoria':
-                    # Inferir categoría si no está especificada
-                    df_procesado[campo] = df_procesado.get('descripcion', '').apply(self.inferir_categoria)
+    def mapear_productos(self, bloques, proveedor: str, config: Dict):
+        """Etapa de la tubería: productos con las columnas del importador de cada bloque de hojas leído"""
+        columnas_mapeo = config['columnas']
+        for hojas in bloques:
+            for df in hojas.values():
+                # Mapear columnas
+                df_procesado = pd.DataFrame()
+                
+                for campo, columna_excel in columnas_mapeo.items():
+                    if columna_excel and columna_excel in df.columns:
+                        df_procesado[campo] = df[columna_excel]
+                    elif campo == 'categoria':
+                        # Inferir categoría si no está especificada
+                        df_procesado[campo] = df_procesado.get('descripcion', pd.Series(dtype=object)).apply(self.inferir_categoria)
+                
+                # Limpiar datos
+                if not {'codigo', 'descripcion'} <= set(df_procesado.columns):
+                    logger.warning(f"{proveedor}: hoja sin columnas de código o descripción")
+                    continue
+                df_procesado = df_procesado.dropna(subset=['codigo', 'descripcion'])
+                
+                # Precios con formato local ("1.234,56 €") a números
+                for campo in ('precio_compra', 'precio_venta'):
+                    if campo in df_procesado.columns:
+                        df_procesado[campo], no_reconocidos, _ = parsear_precios(df_procesado[campo])
+                        if len(no_reconocidos):
+                            logger.warning(f"{proveedor}: {len(no_reconocidos)} valores de {campo} no son precios "
+                                           f"(filas {list(no_reconocidos.index[:5])})")
+                df_procesado['proveedor'] = proveedor
+                
+                logger.info(f"Leídos {len(df_procesado)} productos de {proveedor}")
+                yield df_procesado
+    
+    def cargar_productos(self, df_productos: pd.DataFrame, proveedor: str, vistos: Dict) -> int:
+        """Crea o actualiza un bloque de productos en una sola llamada a Odoo
+        
+        Cada producto lleva el ID externo determinista de (proveedor, código),
+        el mismo que el de los CSV del convertidor, y product.template.load
+        actualiza los que ya existen: reimportar un archivo no duplica nada ni
+        necesita buscar cada código antes de crearlo.
+        """
+        if df_productos.empty:
+            return 0
+        self.obtener_o_crear_proveedor(proveedor)
+        categorias = df_productos['categoria'].fillna('Electrodomésticos')
+        ids_categoria = {nombre: self.obtener_o_crear_categoria(nombre) for nombre in categorias.unique()}
+        
+        def precio(campo):
+            if campo not in df_productos.columns:
+                return '0.0'
+            return pd.to_numeric(df_productos[campo], errors='coerce').fillna(0.0).astype(str)
+        
+        datos = pd.DataFrame({
+            'id': 'product_template_' + ids_externos(df_productos['codigo'], proveedor, vistos),
+            'name': df_productos['descripcion'].astype(str),
+            'default_code': df_productos['codigo'].astype(str),
+            'list_price': precio('precio_venta'),
+            'standard_price': precio('precio_compra'),
+            'type': 'product',
+            'sale_ok': 'True',
+            'purchase_ok': 'True',
+            'categ_id/.id': categorias.map(ids_categoria).map(lambda x: str(x) if x else ''),
+        })
+        respuesta = self.models.execute_kw(
+            self.odoo_db, self.uid, self.odoo_password,
+            'product.template', 'load',
+            [list(datos.columns), datos.to_numpy().tolist()]
+        )
+        for mensaje in respuesta.get('messages', []):
+            logger.error(f"{proveedor}: {mensaje.get('message')} (fila {mensaje.get('rows', {}).get('from')})")
+        cargados = len([i for i in respuesta.get('ids') or [] if i])
+        logger.info(f"{proveedor}: {cargados} productos creados o actualizados")
+        return cargados
+    
+    def _ejecutar(self, modelo: str, metodo: str, *args, **kwargs):
+        return self.models.execute_kw(self.odoo_db, self.uid, self.odoo_password, modelo, metodo, list(args), kwargs)
+    
+    def migrar_ids_productos(self, df_productos: pd.DataFrame, proveedor: str, vistos: Dict) -> int:
+        """Pasa a los IDs externos deterministas los productos de un bloque que ya están en Odoo
+        
+        Antes de los IDs por (proveedor, código), los CSV del convertidor
+        usaban product_template_{código} y product_product_{código}, y este
+        importador creaba los productos sin ID externo. product.template.load
+        no reconocería esos registros y los crearía otra vez, así que esta
+        migración (una vez, antes de la primera importación con los IDs nuevos)
+        renombra los ir.model.data antiguos y da el ID nuevo a los demás
+        productos con el mismo código interno.
+        
+        Solo se tocan productos del proveedor (con él entre sus proveedores o
+        con su etiqueta tag_{clave} de los CSV): el mismo código de otro
+        proveedor es otro producto. Los códigos con más de un producto del
+        proveedor se omiten y se informa de ellos. Devuelve los productos migrados.
+        """
+        if df_productos.empty:
+            return 0
+        # Código tal como lo escribían las versiones anteriores (1951.0 leído como float -> "1951")
+        codigos = df_productos['codigo'].map(
+            lambda c: str(int(c)) if isinstance(c, float) and c.is_integer() else str(c).strip())
+        nuevos = dict(zip(codigos, ids_externos(df_productos['codigo'], proveedor, vistos)))
+        proveedor_id = self.obtener_o_crear_proveedor(proveedor)
+        etiqueta = f"tag_{PERFILES[proveedor]['clave']}" if proveedor in PERFILES else None
+        migrados = 0
+        
+        for prefijo, modelo, plantilla in (('product_template_', 'product.template', ''),
+                                           ('product_product_', 'product.product', 'product_tmpl_id.')):
+            nombres = {codigo: prefijo + nuevo for codigo, nuevo in nuevos.items()}
             
-            # Limpiar datos
-            df_procesado = df_procesado.dropna(subset=['codigo', 'descripcion'])
-            df_procesado['proveedor'] = proveedor
+            # Productos del proveedor con esos códigos, uno por código
+            del_proveedor = ['|', [f'{plantilla}seller_ids.partner_id', '=', proveedor_id or False],
+                             [f'{plantilla}product_tag_ids.name', '=', etiqueta or False]]
+            productos = self._ejecutar(modelo, 'search_read',
+                                       [['default_code', 'in', list(nuevos)]] + del_proveedor,
+                                       fields=['id', 'default_code'])
+            por_codigo = {}
+            for producto in productos:
+                por_codigo.setdefault(producto['default_code'], []).append(producto['id'])
+            repetidos = sorted(codigo for codigo, ids in por_codigo.items() if len(ids) > 1)
+            if repetidos:
+                logger.warning(f"{proveedor}: {len(repetidos)} códigos con varios registros de {modelo}, "
+                               f"no se migran ({', '.join(repetidos[:5])})")
+            propios = {ids[0]: codigo for codigo, ids in por_codigo.items() if len(ids) == 1}
             
-            logger.info(f"Leídos {len(df_procesado)} productos de {proveedor}")
-            return df_procesado
+            # IDs antiguos de los CSV (el importador de Odoo los guarda en el módulo __import__)
+            antiguos = {prefijo + codigo: nombre for codigo, nombre in nombres.items()}
+            registros = self._ejecutar('ir.model.data', 'search_read',
+                                       [['module', '=', '__import__'], ['model', '=', modelo],
+                                        ['name', 'in', list(antiguos)]],
+                                       fields=['id', 'name', 'res_id'])
+            for registro in registros:
+                nombre = antiguos[registro['name']]
+                if nombre == registro['name'] or registro['res_id'] not in propios:
+                    continue
+                try:
+                    self._ejecutar('ir.model.data', 'write', [registro['id']], {'name': nombre})
+                    if modelo == 'product.template':
+                        migrados += 1
+                except Exception as e:
+                    logger.warning(f"{proveedor}: no se pudo renombrar {registro['name']} a {nombre}: {e}")
             
-        except Exception as e:
-            logger.error(f"Error al leer archivo de {proveedor}: {e}")
-            return None
+            # Productos que aún no tienen el ID nuevo (creados por el importador anterior o
+            # importados con otro ID): se les añade, sin quitar los que ya tengan
+            asignados = {registro['name'] for registro in self._ejecutar(
+                'ir.model.data', 'search_read',
+                [['module', '=', '__import__'], ['model', '=', modelo], ['name', 'in', list(nombres.values())]],
+                fields=['name'])}
+            for res_id, codigo in propios.items():
+                nombre = nombres[codigo]
+                if nombre in asignados:
+                    continue
+                self._ejecutar('ir.model.data', 'create', {
+                    'module': '__import__',
+                    'name': nombre,
+                    'model': modelo,
+                    'res_id': res_id,
+                })
+                asignados.add(nombre)
+                if modelo == 'product.template':
+                    migrados += 1
+        
+        logger.info(f"{proveedor}: {migrados} productos existentes pasan a los IDs externos nuevos")
+        return migrados
     
-    def crear_producto_odoo(self, producto_data: Dict) -> Optional[int]:
-        """Crea un producto en Odoo"""
+    def importar_proveedor(self, proveedor: str, config: Dict, migrar_ids: bool = False) -> int:
+        """Lee el archivo de un proveedor y carga sus productos en Odoo con la tubería por bloques
+        
+        Con `migrar_ids` no se carga nada: solo se migran los IDs externos de
+        los productos que ya existen (ver migrar_ids_productos).
+        """
+        archivo_path = config['archivo']
+        if not os.path.exists(archivo_path):
+            logger.warning(f"Archivo no encontrado: {archivo_path}")
+            return 0
+        
+        # Lectura de las hojas del perfil (con caché) -> columnas del importador -> Odoo
+        # (IDs externos comprobados entre todos los bloques del archivo)
+        vistos = {}
+        cargar = self.migrar_ids_productos if migrar_ids else self.cargar_productos
+        sumidero = tuberia.SumideroOdoo(cargar=lambda df: cargar(df, proveedor, vistos))
         try:
-            # Verificar si el producto ya existe
-            codigo = producto_data.get('codigo', '')
-            if codigo in self.productos_procesados:
-                logger.debug(f"Producto {codigo} ya procesado")
-                return None
-            
-            # Buscar producto existente por código
-            producto_existente = self.models.execute_kw(
-                self.odoo_db, self.uid, self.odoo_password,
-                'product.template', 'search',
-                [[['default_code', '=', codigo]]]
+            segundos = tuberia.ejecutar(
+                bloques_archivo(archivo_path),
+                [('proceso', lambda bloques: self.mapear_productos(bloques, proveedor, config))],
+                [sumidero]
             )
-            
-            if producto_existente:
-                logger.debug(f"Producto {codigo} ya existe en Odoo")
-                self.productos_procesados.add(codigo)
-                return producto_existente[0]
-            
-            # Obtener o crear categoría
-            categoria_nombre = producto_data.get('categoria', 'Electrodomésticos')
-            categoria_id = self.obtener_o_crear_categoria(categoria_nombre)
-            
-            # Obtener o crear proveedor
-            proveedor_nombre = producto_data.get('proveedor', '')
-            proveedor_id = self.obtener_o_crear_proveedor(proveedor_nombre)
-            
-            # Preparar datos del producto
-            datos_producto = {
-                'name': producto_data.get('descripcion', ''),
-                'default_code': codigo,
-                'list_price': float(producto_data.get('precio_venta', 0) or 0),
-                'standard_price': float(producto_data.get('precio_compra', 0) or 0),
-                'type': 'product',
-                'sale_ok': True,
-                'purchase_ok': True,
-                'categ_id': categoria_id,
-            }
-            
-            # Crear producto
-            producto_id = self.models.execute_kw(
-                self.odoo_db, self.uid, self.odoo_password,
-                'product.template', 'create',
-                [datos_producto]
-            )
-            
-            self.productos_procesados.add(codigo)
-            logger.info(f"Producto creado: {codigo} - {producto_data.get('descripcion', '')}")
-            return producto_id
-            
         except Exception as e:
-            logger.error(f"Error al crear producto {producto_data.get('codigo', '')}: {e}")
-            return None
+            logger.error(f"Error al importar el archivo de {proveedor}: {e}")
+            return sumidero.creados
+        logger.info(f"{proveedor}: tiempos por etapa {segundos}")
+        return sumidero.creados
     
-    def procesar_todos_proveedores(self) -> Dict[str, int]:
-        """Procesa todos los proveedores configurados"""
+    def procesar_todos_proveedores(self, migrar_ids: bool = False) -> Dict[str, int]:
+        """Procesa todos los proveedores configurados (migrando antes sus IDs externos si se pide)"""
         resultados = {}
         
         for proveedor, config in PROVEEDORES_CONFIG.items():
             logger.info(f"Procesando proveedor: {proveedor}")
+            if migrar_ids:
+                self.importar_proveedor(proveedor, config, migrar_ids=True)
             
-            # Leer archivo del proveedor
-            df_productos = self.leer_archivo_proveedor(proveedor, config)
-            
-            if df_productos is None or df_productos.empty:
-                logger.warning(f"No se pudieron leer productos de {proveedor}")
-                resultados[proveedor] = 0
-                continue
-            
-            # Procesar cada producto
-            productos_creados = 0
-            for _, producto in df_productos.iterrows():
-                producto_dict = producto.to_dict()
-                if self.crear_producto_odoo(producto_dict):
-                    productos_creados += 1
+            # Leer el archivo del proveedor y crear cada producto
+            productos_creados = self.importar_proveedor(proveedor, config)
             
             resultados[proveedor] = productos_creados
             logger.info(f"Proveedor {proveedor}: {productos_creados} productos procesados")
         
         return resultados
     
-    def ejecutar_importacion(self) -> bool:
+    def ejecutar_importacion(self, migrar_ids: bool = False) -> bool:
         """Ejecuta el proceso completo de importación"""
         logger.info("Iniciando importación de productos a Odoo")
         
@@ -392,7 +411,7 @@ class ImportadorProductosOdoo:
             return False
         
         # Procesar todos los proveedores
-        resultados = self.procesar_todos_proveedores()
+        resultados = self.procesar_todos_proveedores(migrar_ids)
         
         # Mostrar resumen
         total_productos = sum(resultados.values())
@@ -407,10 +426,14 @@ class ImportadorProductosOdoo:
 
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description='Importa a Odoo los productos de los archivos de proveedores')
+    parser.add_argument('--migrar-ids', action='store_true',
+                        help='Pasar antes a los IDs externos nuevos los productos ya importados (una sola vez)')
+    args = parser.parse_args()
     importador = ImportadorProductosOdoo()
     
     try:
-        exito = importador.ejecutar_importacion()
+        exito = importador.ejecutar_importacion(args.migrar_ids)
         if exito:
             print("\n✅ Importación completada exitosamente")
         else:
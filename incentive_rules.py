@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+Motor de reglas de incentivos de proveedores
+
+Convierte el texto libre de `incentive_rules` (por ejemplo "Descuento por
+volumen: 5% para pedidos > 10000€") en reglas tipadas y las compila en
+evaluadores vectorizados con NumPy, capaces de aplicar todas las reglas a
+miles de líneas de pedido en una sola pasada.
+
+Reglas soportadas, separadas por ';' o saltos de línea:
+- Descuento porcentual: "5% ...", "3% descuento en productos de temporada"
+- Descuento fijo por pedido: "Descuento fijo de 100€ por pedido > 5000€"
+- Umbral opcional sobre el total del pedido: "> 10000€", "más de 10.000 €"
+- Ámbito opcional por categoría/etiqueta o código de producto: "en productos
+  de temporada", "en productos ABC123"
+"""
+
+import re
+from functools import lru_cache
+from typing import Callable, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+_AMOUNT = r"(\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?)"
+_THRESHOLD_RE = re.compile(
+    r"(?:>=?|mayor(?:es)?\s+(?:de|a|que)|m[aá]s\s+de|superior(?:es)?\s+a)\s*" + _AMOUNT + r"\s*€?",
+    re.IGNORECASE,
+)
+_PERCENT_RE = re.compile(_AMOUNT + r"\s*%")
+_FIXED_RE = re.compile(_AMOUNT + r"\s*€")
+_SCOPE_RE = re.compile(r"\ben\s+(?:los\s+|las\s+)?(?:productos?\s+(?:de\s+)?)?([\w\s]+?)\s*$", re.IGNORECASE)
+_NO_RULES_RE = re.compile(r"^\s*(sin\s+incentivos|ninguno|n/?a)\b", re.IGNORECASE)
+
+
+class IncentiveRule(BaseModel):
+    kind: Literal["percentage", "fixed"]
+    value: float
+    threshold: Optional[float] = None  # total mínimo del pedido (estrictamente mayor)
+    scope: Optional[str] = None        # texto a buscar en la categoría/etiquetas o código de la línea
+    source: str
+
+
+def parse_amount(text: str) -> float:
+    """Convierte '10.000,50', '10000' o '5,5' a float"""
+    if "," in text:
+        return float(text.replace(".", "").replace(",", "."))
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+", text):
+        return float(text.replace(".", ""))
+    return float(text)
+
+
+def parse_rule(text: str) -> Optional[IncentiveRule]:
+    """Interpreta una regla en texto libre o devuelve None si no se reconoce"""
+    source = text.strip()
+    if not source or _NO_RULES_RE.match(source):
+        return None
+
+    rest = source
+    threshold = None
+    match = _THRESHOLD_RE.search(rest)
+    if match:
+        threshold = parse_amount(match.group(1))
+        rest = rest[:match.start()] + rest[match.end():]
+
+    match = _PERCENT_RE.search(rest)
+    if match:
+        kind, value = "percentage", parse_amount(match.group(1))
+    else:
+        match = _FIXED_RE.search(rest)
+        if not match:
+            return None
+        kind, value = "fixed", parse_amount(match.group(1))
+
+    scope = None
+    scope_match = _SCOPE_RE.search(rest[match.end():])
+    if scope_match:
+        scope = scope_match.group(1).strip().lower() or None
+        # "en pedidos de ..." describe el umbral, no un ámbito de productos
+        if scope and scope.startswith("pedido"):
+            scope = None
+
+    return IncentiveRule(kind=kind, value=value, threshold=threshold, scope=scope, source=source)
+
+
+@lru_cache(maxsize=256)
+def parse_rules(text: Optional[str]) -> Tuple[Tuple[IncentiveRule, ...], Tuple[str, ...]]:
+    """Devuelve (reglas reconocidas, fragmentos no reconocidos) de un texto"""
+    rules, unparsed = [], []
+    for fragment in re.split(r"[;\n]+", text or ""):
+        if not fragment.strip():
+            continue
+        rule = parse_rule(fragment)
+        if rule is not None:
+            rules.append(rule)
+        elif not _NO_RULES_RE.match(fragment):
+            unparsed.append(fragment.strip())
+    return tuple(rules), tuple(unparsed)
+
+
+class OrderLines:
+    """Líneas de pedido en formato columnar para la evaluación vectorizada"""
+
+    def __init__(self, order_ids: Sequence, quantities: Sequence[float],
+                 unit_prices: Sequence[float], categories: Sequence[Optional[str]],
+                 product_codes: Optional[Sequence[Optional[str]]] = None):
+        self.order_keys, self.order_index = np.unique(np.asarray(order_ids, dtype=str), return_inverse=True)
+        self.quantities = np.asarray(quantities, dtype=np.float64)
+        self.unit_prices = np.asarray(unit_prices, dtype=np.float64)
+        self.categories = np.char.lower(np.asarray([c or "" for c in categories], dtype=str))
+        codes = product_codes if product_codes is not None else [None] * len(self.quantities)
+        self.product_codes = np.char.lower(np.char.strip(np.asarray([c or "" for c in codes], dtype=str)))
+        self.line_totals = self.quantities * self.unit_prices
+        self.order_totals = self.order_sum(self.line_totals)
+
+    def __len__(self):
+        return len(self.line_totals)
+
+    def order_sum(self, values: np.ndarray) -> np.ndarray:
+        """Suma un valor por línea agrupándolo por pedido"""
+        return np.bincount(self.order_index, weights=values, minlength=len(self.order_keys))
+
+
+Evaluator = Callable[[OrderLines], np.ndarray]
+
+
+def _compile_rule(rule: IncentiveRule) -> Evaluator:
+    """Compila una regla en una función que devuelve el descuento por línea"""
+    scope = rule.scope
+    threshold = rule.threshold
+    value = rule.value
+
+    def eligible(lines: OrderLines) -> np.ndarray:
+        mask = np.ones(len(lines), dtype=bool)
+        if scope:
+            # Parte de la categoría/etiquetas o el código exacto del producto
+            mask &= (np.char.find(lines.categories, scope) >= 0) | (lines.product_codes == scope)
+        if threshold is not None:
+            mask &= lines.order_totals[lines.order_index] > threshold
+        return mask
+
+    if rule.kind == "percentage":
+        rate = value / 100.0
+
+        def evaluate(lines: OrderLines) -> np.ndarray:
+            return np.where(eligible(lines), lines.line_totals * rate, 0.0)
+    else:
+        def evaluate(lines: OrderLines) -> np.ndarray:
+            # Importe fijo por pedido, repartido en proporción al total de cada línea elegible
+            eligible_totals = np.where(eligible(lines), lines.line_totals, 0.0)
+            per_order = lines.order_sum(eligible_totals)[lines.order_index]
+            share = np.divide(eligible_totals, per_order, out=np.zeros_like(eligible_totals), where=per_order > 0)
+            return share * value
+
+    return evaluate
+
+
+@lru_cache(maxsize=256)
+def compile_rules(text: Optional[str]) -> Evaluator:
+    """Compila el texto de incentivos de un proveedor en un único evaluador"""
+    evaluators = [_compile_rule(rule) for rule in parse_rules(text)[0]]
+
+    def evaluate(lines: OrderLines) -> np.ndarray:
+        discounts = np.zeros(len(lines), dtype=np.float64)
+        for evaluator in evaluators:
+            discounts += evaluator(lines)
+        # Las reglas se acumulan, pero nunca por encima del importe de la línea
+        return np.minimum(discounts, np.maximum(lines.line_totals, 0.0))
+
+    return evaluate
+
+
+def simulate(text: Optional[str], lines: OrderLines) -> dict:
+    """Aplica las reglas a las líneas y resume el resultado por pedido"""
+    rules, unparsed = parse_rules(text)
+    discounts = compile_rules(text)(lines)
+    order_discounts = lines.order_sum(discounts)
+    return {
+        "rules": [rule.model_dump() for rule in rules],
+        "unparsed_rules": list(unparsed),
+        "line_count": len(lines),
+        "gross_total": round(float(lines.line_totals.sum()), 2),
+        "discount_total": round(float(discounts.sum()), 2),
+        "net_total": round(float(lines.line_totals.sum() - discounts.sum()), 2),
+        "orders": [
+            {
+                "order_id": str(key),
+                "gross": round(float(gross), 2),
+                "discount": round(float(discount), 2),
+                "net": round(float(gross - discount), 2),
+            }
+            for key, gross, discount in zip(lines.order_keys, lines.order_totals, order_discounts)
+        ],
+        "line_discounts": np.round(discounts, 2).tolist(),
+    }
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ajustes de inventario en lote para el middleware FastAPI
+
+Aplica en Odoo el resultado de un recuento físico: filas de (código de
+producto, ubicación, cantidad contada). En lugar de una llamada por producto,
+los códigos y las ubicaciones se resuelven con una lectura previa por lotes y
+las cantidades se escriben y se aplican sobre stock.quant en lotes, en modo
+inventario (el mismo flujo que "Ajustes físicos de inventario" en Odoo 18):
+una llamada create por lote con inventory_quantity_auto_apply escribe la
+cantidad contada en el quant existente (o crea uno nuevo) y aplica la
+diferencia como movimiento de inventario.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# execute(modelo, método, args, kwargs) -> resultado de execute_kw
+OdooExecute = Callable[..., Any]
+
+BATCH_SIZE = 500
+INVENTORY_CONTEXT = {'context': {'inventory_mode': True}}
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def prefetch_products(execute: OdooExecute, codes: Iterable[str], batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """Índice código interno -> id de product.product, leído en lotes"""
+    index: Dict[str, int] = {}
+    for chunk in _chunks(sorted(set(codes)), batch_size):
+        variants = execute('product.product', 'search_read', [[['default_code', 'in', chunk]]],
+                           {'fields': ['id', 'default_code']})
+        for v in variants:
+            # Si un código está repetido en Odoo se usa la primera variante
+            index.setdefault(v['default_code'], v['id'])
+    return index
+
+
+def prefetch_locations(execute: OdooExecute, names: Iterable[str]) -> Dict[str, int]:
+    """Índice nombre de ubicación interna ("WH/Stock" o "Stock") -> id"""
+    names = sorted(set(names))
+    if not names:
+        return {}
+    locations = execute('stock.location', 'search_read', [[
+        ['usage', '=', 'internal'], '|', ['complete_name', 'in', names], ['name', 'in', names]
+    ]], {'fields': ['id', 'name', 'complete_name']})
+    index: Dict[str, int] = {}
+    for loc in locations:
+        index.setdefault(loc['name'], loc['id'])
+    # El nombre completo tiene prioridad sobre el nombre corto, que puede repetirse
+    index.update({loc['complete_name']: loc['id'] for loc in locations})
+    return index
+
+
+def default_location(execute: OdooExecute) -> Optional[int]:
+    """Ubicación de existencias del primer almacén"""
+    warehouses = execute('stock.warehouse', 'search_read', [[]], {'fields': ['lot_stock_id'], 'limit': 1})
+    if warehouses and warehouses[0].get('lot_stock_id'):
+        return warehouses[0]['lot_stock_id'][0]
+    return None
+
+
+def apply_adjustments(execute: OdooExecute, rows: List[Dict[str, Any]],
+                      batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """Aplica las cantidades contadas y devuelve un resultado por fila
+
+    Cada fila es {"code", "location" (opcional), "quantity"}. Si el mismo
+    producto y ubicación aparece varias veces, gana la última fila.
+    """
+    results: List[Dict[str, Any]] = [
+        {"row": i, "code": row["code"], "location": row.get("location"),
+         "quantity": row["quantity"], "status": "pending"}
+        for i, row in enumerate(rows)
+    ]
+
+    products = prefetch_products(execute, (row["code"] for row in rows), batch_size)
+    locations = prefetch_locations(execute, (row["location"] for row in rows if row.get("location")))
+    fallback_location = None
+    if any(not row.get("location") for row in rows):
+        fallback_location = default_location(execute)
+
+    # (producto, ubicación) -> índice de la última fila que lo ajusta
+    targets: Dict[Tuple[int, int], int] = {}
+    for result in results:
+        product_id = products.get(result["code"])
+        location_id = locations.get(result["location"]) if result["location"] else fallback_location
+        if product_id is None:
+            result.update(status="error", message="Producto no encontrado")
+        elif location_id is None:
+            result.update(status="error", message="Ubicación no encontrada")
+        else:
+            previous = targets.get((product_id, location_id))
+            if previous is not None:
+                results[previous].update(status="skipped", message=f"Sustituida por la fila {result['row']}")
+            targets[(product_id, location_id)] = result["row"]
+            result.update(product_id=product_id, location_id=location_id)
+
+    for batch in _chunks(list(targets.items()), batch_size):
+        vals = [
+            {'product_id': product_id, 'location_id': location_id,
+             'inventory_quantity_auto_apply': results[row]["quantity"]}
+            for (product_id, location_id), row in batch
+        ]
+        try:
+            # Escritura y aplicación en la misma llamada; así no se pasa por
+            # action_apply_inventory, que devuelve None y XML-RPC no lo serializa
+            quant_ids = execute('stock.quant', 'create', [vals], INVENTORY_CONTEXT)
+        except Exception as e:
+            message = str(e)
+            for _, row in batch:
+                results[row].update(status="error", message=message)
+            continue
+        for quant_id, (_, row) in zip(quant_ids, batch):
+            results[row].update(status="applied", quant_id=quant_id)
+
+    return summarize(results)
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    counts = {"applied": 0, "skipped": 0, "error": 0}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return {"total": len(results), **counts, "results": results}
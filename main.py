@@ -1,18 +1,36 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from collections import Counter
 import json
 import os
 from datetime import datetime, timedelta
 import jwt
 from uuid import uuid4
 
+from compression import CompressionMiddleware
+from customer_index import CustomerIndex
+from incentive_rules import OrderLines, simulate
+from inventory_adjustments import apply_adjustments, summarize
+from profiling import PROFILE_ID_HEADER, ProfilingMiddleware, profile_path
+from provider_store import ProviderStore
+from response_cache import PayloadCache
+from stock_index import StockIndex
+from tracing import TRACE_HEADER, TracedServerProxy, TracingMiddleware, span
+
 # Configuración de la aplicación
 SECRET_KEY = "odoo_middleware_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+CATALOG_CACHE_TTL_SECONDS = 60
+COMPRESSION_MIN_SIZE = 1024  # bytes; las respuestas menores se envían sin comprimir
+PROFILER_SECRET = os.getenv("PROFILER_SECRET")  # sin secreto, el perfilador no se instala
+PROFILES_DIR = os.getenv("PROFILES_DIR", "profiles")
+LOW_STOCK_THRESHOLD = 10
+PROVIDERS_DB = os.getenv("PROVIDERS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "project.db"))
 
 app = FastAPI(
     title="Odoo Middleware API",
@@ -27,11 +45,72 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[TRACE_HEADER, PROFILE_ID_HEADER],
 )
 
+# Comprimir con brotli/gzip los cuerpos JSON grandes (catálogo, clientes...)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+# Perfilado por muestreo de peticiones concretas (cabecera X-Profile-Token)
+if PROFILER_SECRET:
+    app.add_middleware(ProfilingMiddleware, secret=PROFILER_SECRET, output_dir=PROFILES_DIR)
+
+# Traza por petición (spans de Odoo, caché y codificación); el último middleware
+# añadido es el más externo, así la traza cubre también la compresión
+app.add_middleware(TracingMiddleware)
+
 # Esquema de autenticación
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Caché de catálogos ya validados y codificados a JSON
+payload_cache = PayloadCache(ttl_seconds=CATALOG_CACHE_TTL_SECONDS)
+
+# Índice de productos ordenado por stock, actualizado con los cambios de Odoo
+stock_index = StockIndex()
+
+# Índices de clientes por teléfono, email y nombre para búsquedas por prefijo
+customer_index = CustomerIndex()
+
+# Configuración de conexión a Odoo
+ODOO_CONFIG = {
+    'url': 'http://localhost:8069',
+    'db': 'pelotazo',
+    'username': 'admin',
+    'password': 'admin'
+}
+
+def odoo_executor():
+    # Autenticar y devolver execute(modelo, método, args, kwargs), o None si falla
+    db, password = ODOO_CONFIG['db'], ODOO_CONFIG['password']
+    common = TracedServerProxy(f"{ODOO_CONFIG['url']}/xmlrpc/2/common")
+    uid = common.authenticate(db, ODOO_CONFIG['username'], password, {})
+    if not uid:
+        return None
+    models = TracedServerProxy(f"{ODOO_CONFIG['url']}/xmlrpc/2/object")
+    
+    def execute(model, method, args, kwargs=None):
+        return models.execute_kw(db, uid, password, model, method, args, kwargs or {})
+    return execute
+
+def low_stock_products(threshold: float):
+    # Productos bajo el umbral desde el índice; si Odoo no responde y el índice
+    # nunca se cargó, se filtran los datos simulados
+    try:
+        stock_index.refresh_if_stale(odoo_executor)
+    except Exception as e:
+        print(f"Error al conectar con Odoo para el índice de stock: {e}")
+    if stock_index.loaded:
+        return stock_index.below(threshold)
+    return sorted((p for p in products if p["stock"] < threshold), key=lambda p: p["stock"])
+
+def refreshed_customer_index():
+    # Hasta la primera sincronización con Odoo el índice contiene los clientes simulados
+    try:
+        customer_index.refresh_if_stale(odoo_executor)
+    except Exception as e:
+        print(f"Error al conectar con Odoo para el índice de clientes: {e}")
+    return customer_index
+
 # Modelos de datos
 class User(BaseModel):
     username: str
@@ -93,6 +172,24 @@ class Provider(BaseModel):
     incentive_rules: Optional[str] = None
     status: str = "active"
 
+class OrderLine(BaseModel):
+    order_id: str = "1"
+    product_code: Optional[str] = None
+    category: Optional[str] = None
+    quantity: float
+    unit_price: float
+
+class SimulationRequest(BaseModel):
+    lines: List[OrderLine]
+
+class StockAdjustment(BaseModel):
+    code: str
+    location: Optional[str] = None  # nombre de ubicación; por defecto, existencias del almacén
+    quantity: float
+
+class AdjustmentRequest(BaseModel):
+    rows: List[StockAdjustment]
+
 # Base de datos simulada (en memoria)
 fake_users_db = {
     "admin": {
@@ -300,6 +397,7 @@ customers = [
         "status": "Activo"
     }
 ]
+customer_index.load(customers)
 
 providers = [
     {
@@ -340,6 +438,13 @@ providers = [
     }
 ]
 
+# Proveedores persistidos en SQLite; la lista anterior solo siembra la primera ejecución
+provider_store = ProviderStore(PROVIDERS_DB, seed=providers)
+
+@app.on_event("shutdown")
+def close_provider_store():
+    provider_store.close()
+
 # Funciones de autenticación
 def verify_password(plain_password, hashed_password):
     # En un entorno real, usaríamos bcrypt o similar
@@ -375,18 +480,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    with span("auth.token"):
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+            token_data = TokenData(username=username)
+        except jwt.PyJWTError:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except jwt.PyJWTError:
-        raise credentials_exception
-    user = get_user(fake_users_db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+        user = get_user(fake_users_db, username=token_data.username)
+        if user is None:
+            raise credentials_exception
+        return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     if current_user.disabled:
@@ -420,36 +526,34 @@ async def get_session(current_user: User = Depends(get_current_active_user)):
     }
 
 @app.get("/api/v1/products", response_model=List[Product])
-async def get_products(current_user: User = Depends(get_current_active_user)):
+async def get_products(request: Request, stock_lt: Optional[int] = None, current_user: User = Depends(get_current_active_user)):
+    # Consulta de umbral (?stock_lt=N) resuelta con el índice de stock, sin recorrer el catálogo
+    if stock_lt is not None:
+        return low_stock_products(stock_lt)
+    
+    accept_encoding = request.headers.get("accept-encoding")
+    
+    # Servir el catálogo desde caché: bytes JSON ya validados, sin re-serializar
+    cached = payload_cache.get("products")
+    if cached is not None:
+        return cached.response(accept_encoding, COMPRESSION_MIN_SIZE)
+    
     try:
         # Conexión con Odoo usando XML-RPC
-        import xmlrpc.client
-        
-        # Configuración de conexión a Odoo
-        url = "http://localhost:8069"
-        db = "pelotazo"
-        username = "admin"
-        password = "admin"
+        execute = odoo_executor()
         
-        # Autenticación
-        common = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/common')
-        uid = common.authenticate(db, username, password, {})
-        
-        if not uid:
+        if execute is None:
             return products  # Fallback a datos simulados si falla la autenticación
         
-        # Conexión al modelo de productos
-        models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-        
         # Buscar productos en Odoo
-        product_ids = models.execute_kw(db, uid, password, 'product.template', 'search', [[]])
+        product_ids = execute('product.template', 'search', [[]])
         
         if not product_ids:
             return products  # Fallback a datos simulados si no hay productos
         
         # Obtener datos de productos
-        odoo_products = models.execute_kw(db, uid, password, 'product.template', 'read', [product_ids], 
-                                        {'fields': ['id', 'name', 'default_code', 'categ_id', 'list_price', 'qty_available']})
+        odoo_products = execute('product.template', 'read', [product_ids],
+                                {'fields': ['id', 'name', 'default_code', 'categ_id', 'list_price', 'qty_available']})
         
         # Transformar a formato esperado por el frontend
         transformed_products = []
@@ -457,7 +561,7 @@ async def get_products(current_user: User = Depends(get_current_active_user)):
             category_name = "Sin categoría"
             if p.get('categ_id'):
                 # Obtener nombre de categoría
-                category = models.execute_kw(db, uid, password, 'product.category', 'read', [p['categ_id'][0]], {'fields': ['name']})
+                category = execute('product.category', 'read', [p['categ_id'][0]], {'fields': ['name']})
                 if category:
                     category_name = category[0]['name']
             
@@ -471,7 +575,9 @@ async def get_products(current_user: User = Depends(get_current_active_user)):
                 "image_url": f"https://example.com/images/product_{p['id']}.jpg"
             })
         
-        return transformed_products
+        # Validar y codificar una sola vez por llenado de caché
+        entry = payload_cache.put("products", Product, transformed_products)
+        return entry.response(accept_encoding, COMPRESSION_MIN_SIZE)
     except Exception as e:
         print(f"Error al conectar con Odoo: {e}")
         return products  # Fallback a datos simulados si hay error
@@ -480,31 +586,18 @@ async def get_products(current_user: User = Depends(get_current_active_user)):
 async def get_product(product_id: int, current_user: User = Depends(get_current_active_user)):
     try:
         # Conexión con Odoo usando XML-RPC
-        import xmlrpc.client
-        
-        # Configuración de conexión a Odoo
-        url = "http://localhost:8069"
-        db = "pelotazo"
-        username = "admin"
-        password = "admin"
+        execute = odoo_executor()
         
-        # Autenticación
-        common = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/common')
-        uid = common.authenticate(db, username, password, {})
-        
-        if not uid:
+        if execute is None:
             # Fallback a datos simulados si falla la autenticación
             for product in products:
                 if product["id"] == product_id:
                     return product
             raise HTTPException(status_code=404, detail="Product not found")
         
-        # Conexión al modelo de productos
-        models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-        
         # Buscar producto específico en Odoo
-        odoo_product = models.execute_kw(db, uid, password, 'product.template', 'read', [[product_id]], 
-                                      {'fields': ['id', 'name', 'default_code', 'categ_id', 'list_price', 'qty_available']})
+        odoo_product = execute('product.template', 'read', [[product_id]],
+                               {'fields': ['id', 'name', 'default_code', 'categ_id', 'list_price', 'qty_available']})
         
         if not odoo_product:
             # Fallback a datos simulados si no se encuentra el producto
@@ -518,7 +611,7 @@ async def get_product(product_id: int, current_user: User = Depends(get_current_
         # Obtener categoría
         category_name = "Sin categoría"
         if p.get('categ_id'):
-            category = models.execute_kw(db, uid, password, 'product.category', 'read', [p['categ_id'][0]], {'fields': ['name']})
+            category = execute('product.category', 'read', [p['categ_id'][0]], {'fields': ['name']})
             if category:
                 category_name = category[0]['name']
         
@@ -546,67 +639,115 @@ async def get_product(product_id: int, current_user: User = Depends(get_current_
 async def get_inventory(current_user: User = Depends(get_current_active_user)):
     return inventory
 
+@app.post("/api/v1/inventory/adjustments", response_model=Dict[str, Any])
+async def create_inventory_adjustments(request: AdjustmentRequest, current_user: User = Depends(get_current_active_user)):
+    # Recuento físico: fijar la cantidad contada de cada producto/ubicación en Odoo
+    rows = [row.model_dump() for row in request.rows]
+    try:
+        execute = odoo_executor()
+        if execute is not None:
+            with span("inventory.adjustments", row_count=len(rows)):
+                summary = apply_adjustments(execute, rows)
+                if stock_index.loaded:
+                    stock_index.sync(execute)
+            payload_cache.invalidate("products")
+            return summary
+    except Exception as e:
+        print(f"Error al conectar con Odoo para ajustes de inventario: {e}")
+    
+    # Fallback a datos simulados: la ubicación se ignora
+    by_code = {p["code"]: p for p in products}
+    results = []
+    for i, row in enumerate(rows):
+        result = {"row": i, "code": row["code"], "location": row["location"], "quantity": row["quantity"]}
+        product = by_code.get(row["code"])
+        if product is None:
+            result.update(status="error", message="Producto no encontrado")
+        else:
+            product["stock"] = int(row["quantity"])
+            result.update(status="applied", product_id=product["id"])
+        results.append(result)
+    return summarize(results)
+
+@app.get("/api/v1/inventory/low-stock", response_model=Dict[str, Any])
+async def get_low_stock_breakdown(threshold: int = LOW_STOCK_THRESHOLD, current_user: User = Depends(get_current_active_user)):
+    low_stock = low_stock_products(threshold)
+    category_counts = Counter(p["category"] for p in low_stock)
+    return {
+        "threshold": threshold,
+        "total": len(low_stock),
+        "categories": [{"name": name, "count": count} for name, count in category_counts.most_common()]
+    }
+
 @app.get("/api/v1/sales", response_model=List[Sale])
 async def get_sales(current_user: User = Depends(get_current_active_user)):
     return sales
 
 @app.get("/api/v1/customers", response_model=List[Customer])
 async def get_customers(current_user: User = Depends(get_current_active_user)):
-    return customers
+    return refreshed_customer_index().all()
+
+@app.get("/api/v1/customers/lookup", response_model=List[Customer])
+async def lookup_customers(q: str, limit: int = 20, current_user: User = Depends(get_current_active_user)):
+    # Búsqueda exacta o por prefijo de teléfono, email o nombre (sin acentos)
+    with span("customers.lookup", limit=limit) as s:
+        results = refreshed_customer_index().search(q, limit=max(1, min(limit, 100)))
+        s.set(result_count=len(results))
+    return results
 
 # Rutas para Proveedores
 @app.get("/api/v1/providers", response_model=List[Provider])
 async def get_providers(current_user: User = Depends(get_current_active_user)):
-    return providers
+    return provider_store.list()
 
 @app.get("/api/v1/providers/{provider_id}", response_model=Provider)
 async def get_provider(provider_id: int, current_user: User = Depends(get_current_active_user)):
-    for provider in providers:
-        if provider["id"] == provider_id:
-            return provider
-    raise HTTPException(status_code=404, detail="Provider not found")
+    provider = provider_store.get(provider_id)
+    if provider is None:
+        raise HTTPException(status_code=404, detail="Provider not found")
+    return provider
 
 @app.post("/api/v1/providers", response_model=Provider)
 async def create_provider(provider_data: dict, current_user: User = Depends(get_current_active_user)):
-    # Generar nuevo ID
-    new_id = max([p["id"] for p in providers], default=0) + 1
-    
-    new_provider = {
-        "id": new_id,
+    return provider_store.create({
         "name": provider_data.get("name", ""),
         "tax_calculation_method": provider_data.get("tax_calculation_method", "excluded"),
         "discount_type": provider_data.get("discount_type", "none"),
         "payment_term": provider_data.get("payment_term", "30_days"),
         "incentive_rules": provider_data.get("incentive_rules", ""),
         "status": provider_data.get("status", "active")
-    }
-    
-    providers.append(new_provider)
-    return new_provider
+    })
 
 @app.put("/api/v1/providers/{provider_id}", response_model=Provider)
 async def update_provider(provider_id: int, provider_data: dict, current_user: User = Depends(get_current_active_user)):
-    for i, provider in enumerate(providers):
-        if provider["id"] == provider_id:
-            # Actualizar campos
-            providers[i].update({
-                "name": provider_data.get("name", provider["name"]),
-                "tax_calculation_method": provider_data.get("tax_calculation_method", provider["tax_calculation_method"]),
-                "discount_type": provider_data.get("discount_type", provider["discount_type"]),
-                "payment_term": provider_data.get("payment_term", provider["payment_term"]),
-                "incentive_rules": provider_data.get("incentive_rules", provider["incentive_rules"]),
-                "status": provider_data.get("status", provider["status"])
-            })
-            return providers[i]
-    raise HTTPException(status_code=404, detail="Provider not found")
+    provider = provider_store.update(provider_id, provider_data)
+    if provider is None:
+        raise HTTPException(status_code=404, detail="Provider not found")
+    return provider
 
 @app.delete("/api/v1/providers/{provider_id}")
 async def delete_provider(provider_id: int, current_user: User = Depends(get_current_active_user)):
-    for i, provider in enumerate(providers):
-        if provider["id"] == provider_id:
-            providers.pop(i)
-            return {"message": "Provider deleted successfully"}
-    raise HTTPException(status_code=404, detail="Provider not found")
+    if not provider_store.delete(provider_id):
+        raise HTTPException(status_code=404, detail="Provider not found")
+    return {"message": "Provider deleted successfully"}
+
+@app.post("/api/v1/providers/{provider_id}/simulate", response_model=Dict[str, Any])
+async def simulate_provider_incentives(provider_id: int, request: SimulationRequest, current_user: User = Depends(get_current_active_user)):
+    provider = provider_store.get(provider_id)
+    if provider is None:
+        raise HTTPException(status_code=404, detail="Provider not found")
+    
+    # Pasar las líneas a columnas y evaluar todas las reglas en bloque
+    lines = OrderLines(
+        order_ids=[line.order_id for line in request.lines],
+        quantities=[line.quantity for line in request.lines],
+        unit_prices=[line.unit_price for line in request.lines],
+        categories=[line.category for line in request.lines],
+        product_codes=[line.product_code for line in request.lines],
+    )
+    result = simulate(provider.get("incentive_rules"), lines)
+    result["provider_id"] = provider_id
+    return result
 
 # Rutas CRUD para Productos
 @app.post("/api/v1/products", response_model=Product)
@@ -625,6 +766,7 @@ async def create_product(product_data: dict, current_user: User = Depends(get_cu
     }
     
     products.append(new_product)
+    payload_cache.invalidate("products")
     return new_product
 
 @app.put("/api/v1/products/{product_id}", response_model=Product)
@@ -640,6 +782,7 @@ async def update_product(product_id: int, product_data: dict, current_user: User
                 "stock": product_data.get("stock", product["stock"]),
                 "image_url": product_data.get("image_url", product["image_url"])
             })
+            payload_cache.invalidate("products")
             return products[i]
     raise HTTPException(status_code=404, detail="Product not found")
 
@@ -648,93 +791,26 @@ async def delete_product(product_id: int, current_user: User = Depends(get_curre
     for i, product in enumerate(products):
         if product["id"] == product_id:
             products.pop(i)
+            payload_cache.invalidate("products")
             return {"message": "Product deleted successfully"}
     raise HTTPException(status_code=404, detail="Product not found")
 
 @app.get("/api/v1/dashboard/stats", response_model=Dict[str, Any])
 async def get_dashboard_stats(current_user: User = Depends(get_current_active_user)):
+    # Estadísticas de productos desde el índice de stock (carga completa la
+    # primera vez, después solo los cambios), sin lecturas por producto; la
+    # autenticación con Odoo solo se hace cuando toca refrescarlo. Si Odoo deja
+    # de responder se sigue sirviendo el último índice cargado
     try:
-        # Conexión con Odoo usando XML-RPC
-        import xmlrpc.client
-        from collections import Counter
-        
-        # Configuración de conexión a Odoo
-        url = "http://localhost:8069"
-        db = "pelotazo"
-        username = "admin"
-        password = "admin"
-        
-        # Autenticación
-        common = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/common')
-        uid = common.authenticate(db, username, password, {})
-        
-        if not uid:
-            # Fallback a datos simulados si falla la autenticación
-            return {
-                "totalProducts": len(products),
-                "lowStock": sum(1 for p in products if p["stock"] < 10),
-                "salesThisMonth": sum(s["total"] for s in sales),
-                "activeCustomers": sum(1 for c in customers if c["status"] == "Activo"),
-                "topCategories": [
-                    {"name": "Refrigeradores", "percentage": 28},
-                    {"name": "Lavadoras", "percentage": 22},
-                    {"name": "Televisores", "percentage": 18},
-                    {"name": "Hornos", "percentage": 12},
-                ]
-            }
-        
-        # Conexión al modelo de productos
-        models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-        
-        # Obtener productos de Odoo
-        product_ids = models.execute_kw(db, uid, password, 'product.template', 'search', [[]])
-        odoo_products = models.execute_kw(db, uid, password, 'product.template', 'read', [product_ids], 
-                                        {'fields': ['id', 'name', 'categ_id', 'qty_available']})
-        
-        # Calcular estadísticas
-        total_products = len(odoo_products)
-        low_stock = sum(1 for p in odoo_products if p.get('qty_available', 0) < 10)
-        
-        # Obtener categorías y calcular porcentajes
-        categories = []
-        category_counts = Counter()
-        
-        for p in odoo_products:
-            if p.get('categ_id'):
-                category = models.execute_kw(db, uid, password, 'product.category', 'read', [p['categ_id'][0]], {'fields': ['name']})
-                if category:
-                    category_counts[category[0]['name']] += 1
-                else:
-                    category_counts['Sin categoría'] += 1
-            else:
-                category_counts['Sin categoría'] += 1
-        
-        # Calcular porcentajes de las top categorías
-        top_categories = []
-        if total_products > 0:
-            for category, count in category_counts.most_common(4):
-                percentage = round((count / total_products) * 100)
-                top_categories.append({"name": category, "percentage": percentage})
-        
-        # Obtener ventas (usando datos simulados por ahora)
-        sales_this_month = sum(s["total"] for s in sales)
-        
-        # Obtener clientes activos (usando datos simulados por ahora)
-        active_customers = sum(1 for c in customers if c["status"] == "Activo")
-        
-        return {
-            "totalProducts": total_products,
-            "lowStock": low_stock,
-            "salesThisMonth": sales_this_month,
-            "activeCustomers": active_customers,
-            "topCategories": top_categories
-        }
+        stock_index.refresh_if_stale(odoo_executor)
     except Exception as e:
         print(f"Error al conectar con Odoo para estadísticas: {e}")
-        # Fallback a datos simulados si hay error
+    
+    if not stock_index.loaded:
+        # Fallback a datos simulados si Odoo no ha respondido nunca
         return {
             "totalProducts": len(products),
-            "lowStock": sum(1 for p in products if p["stock"] < 10),
+            "lowStock": sum(1 for p in products if p["stock"] < LOW_STOCK_THRESHOLD),
             "salesThisMonth": sum(s["total"] for s in sales),
             "activeCustomers": sum(1 for c in customers if c["status"] == "Activo"),
             "topCategories": [
@@ -745,6 +821,40 @@ async def get_dashboard_stats(current_user: User = Depends(get_current_active_us
             ]
         }
 
+    total_products = len(stock_index)
+    low_stock = stock_index.count_below(LOW_STOCK_THRESHOLD)
+    category_counts = stock_index.category_counts()
+
+    # Calcular porcentajes de las top categorías
+    top_categories = []
+    if total_products > 0:
+        for category, count in category_counts.most_common(4):
+            percentage = round((count / total_products) * 100)
+            top_categories.append({"name": category, "percentage": percentage})
+
+    # Obtener ventas (usando datos simulados por ahora)
+    sales_this_month = sum(s["total"] for s in sales)
+
+    # Obtener clientes activos (usando datos simulados por ahora)
+    active_customers = sum(1 for c in customers if c["status"] == "Activo")
+
+    return {
+        "totalProducts": total_products,
+        "lowStock": low_stock,
+        "salesThisMonth": sales_this_month,
+        "activeCustomers": active_customers,
+        "topCategories": top_categories
+    }
+
+@app.get("/api/v1/debug/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, current_user: User = Depends(get_current_active_user)):
+    # Perfil en formato folded, listo para flamegraph.pl o speedscope
+    path = profile_path(PROFILES_DIR, profile_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
 @app.get("/")
 async def root():
     return {
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Registro de perfiles de proveedores
+
+Carga perfiles_proveedores.json, que describe de forma declarativa cada
+proveedor: patrón del nombre de archivo, hojas del libro y fila de cabecera
+(fija o "auto"), formato de la hoja, mapeo de columnas, separadores decimal y
+de miles de los precios (opcional, "separadores": [",", "."]; si no, se
+detectan) y valores fijos de Odoo (etiquetas, impuestos, categorías). Añadir
+un proveedor es añadir una entrada al JSON.
+
+Los patrones de todos los proveedores se compilan en una única expresión
+regular con un grupo por proveedor, de modo que detectar el proveedor de un
+archivo cuesta una sola búsqueda.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import re
+
+RUTA_PERFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perfiles_proveedores.json')
+
+
+def _fusionar(base, cambios):
+    """Combina dos diccionarios de forma recursiva (cambios tiene prioridad)"""
+    resultado = copy.deepcopy(base)
+    for clave, valor in cambios.items():
+        if isinstance(valor, dict) and isinstance(resultado.get(clave), dict):
+            resultado[clave] = _fusionar(resultado[clave], valor)
+        else:
+            resultado[clave] = valor
+    return resultado
+
+
+def clave_proveedor(nombre):
+    """Identificador en minúsculas para IDs externos ('EAS-JOHNSON' -> 'eas_johnson')"""
+    return re.sub(r'[^a-z0-9]+', '_', nombre.lower()).strip('_')
+
+
+def cargar_perfiles(ruta=RUTA_PERFILES):
+    """Lee el registro y aplica los valores por defecto a cada proveedor"""
+    with open(ruta, encoding='utf-8') as f:
+        registro = json.load(f)
+
+    por_defecto = registro.get('por_defecto', {})
+    perfiles = {}
+    for nombre, perfil in registro['proveedores'].items():
+        perfil = _fusionar(por_defecto, perfil)
+        perfil['nombre'] = nombre
+        perfil['clave'] = clave_proveedor(nombre)
+        perfiles[nombre] = perfil
+    return perfiles
+
+
+def compilar_detector(perfiles):
+    """Compila los patrones de todos los perfiles en una única expresión regular"""
+    grupos = []
+    nombres = {}
+    for i, (nombre, perfil) in enumerate(perfiles.items()):
+        grupos.append(f"(?P<p{i}>{perfil['detector']})")
+        nombres[f"p{i}"] = nombre
+    return re.compile('|'.join(grupos)), nombres
+
+
+PERFILES = cargar_perfiles()
+_DETECTOR, _GRUPOS = compilar_detector(PERFILES)
+
+
+def detectar_proveedor(nombre_archivo):
+    """Detecta el proveedor basado en el nombre del archivo"""
+    # Gana la coincidencia más a la izquierda; a igualdad, el primer perfil del registro
+    coincidencia = _DETECTOR.search(nombre_archivo.upper())
+    return _GRUPOS[coincidencia.lastgroup] if coincidencia else None
+
+
+def valores_odoo(proveedor, modelo):
+    """Valores fijos de un modelo de Odoo ('product_template' o 'product_product') para el proveedor"""
+    perfil = PERFILES.get(proveedor)
+    if perfil is None:
+        return {}
+    return {
+        campo: valor.format(nombre=perfil['nombre'], clave=perfil['clave']) if isinstance(valor, str) else valor
+        for campo, valor in perfil.get(modelo, {}).items()
+    }
+
+
+def version_perfil(proveedor):
+    """Huella de las reglas del perfil: cambia cuando se edita su entrada en el registro"""
+    perfil = PERFILES.get(proveedor)
+    if perfil is None:
+        return None
+    contenido = json.dumps(perfil, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lectura vectorizada de precios de las tarifas de proveedores
+
+Las tarifas llegan con precios numéricos (celdas de Excel) o como texto con
+formato local ("  1.234,56 € ", "  -   € " para cero en formato contable,
+"248.91" en las exportaciones a CSV). Los separadores decimal y de miles se
+deciden por columna a partir de una muestra y toda la columna se convierte a
+float64 con sustituciones literales vectorizadas; solo las celdas con otros
+símbolos pasan por una expresión regular. El separador de miles solo se
+acepta formando grupos de tres cifras: las celdas que no siguen el formato de
+la columna ("12.5 €" entre precios "1.234,56 €") y las que tienen texto que
+no es un precio se devuelven aparte para informar de ellas en lugar de
+reinterpretarlas o convertirlas en silencio en NaN.
+"""
+
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow es opcional; sin él se usan cadenas de Python
+    pa = None
+
+# Símbolos de moneda y espacios (\s incluye el espacio no separable de Excel)
+_SIMBOLOS = r'[€$£\s]|EUR'
+_RE_SIMBOLOS = re.compile(_SIMBOLOS, re.IGNORECASE)
+_RE_MONEDA = re.compile(r'[€$£]|EUR', re.IGNORECASE)
+
+TAMANO_MUESTRA = 200
+
+logger = logging.getLogger(__name__)
+
+
+def _patron_precio(decimal, miles):
+    """Expresión de un precio sin símbolos con esos separadores ("1.234,56", "1234,5", "-" contable)"""
+    d, m = re.escape(decimal), re.escape(miles)
+    return rf'[-+]?(?:\d{{1,3}}(?:{m}\d{{3}})+(?:{d}\d*)?|\d+(?:{d}\d*)?|{d}\d+)|-'
+
+
+def detectar_separadores(muestra, con_formato=False):
+    """Separadores (decimal, miles) de una muestra de precios en texto sin símbolos
+
+    - Si hay valores con coma y punto, el que aparece último es el decimal.
+    - Con solo comas, la coma es decimal salvo que todos los valores tengan
+      grupos de tres cifras y alguno tenga varias comas ("1,234,567").
+    - Con solo puntos, el punto es decimal salvo que todos los valores tengan
+      grupos de tres cifras y, además, alguno tenga varios puntos o la columna
+      venga con formato de moneda ("1.500 €" en una tarifa española).
+      Sin ninguna de esas pistas ("1.500", "2.000") la columna es ambigua: se
+      lee con punto decimal y se avisa para que el perfil del proveedor
+      declare sus separadores.
+    """
+    muestra = muestra[muestra != '']
+    con_coma = muestra.str.contains(',', regex=False)
+    con_punto = muestra.str.contains('.', regex=False)
+
+    ambos = muestra[con_coma & con_punto]
+    if len(ambos):
+        coma_al_final = ambos.str.rfind(',') > ambos.str.rfind('.')
+        return (',', '.') if coma_al_final.mean() >= 0.5 else ('.', ',')
+
+    if con_coma.any():
+        comas = muestra[con_coma]
+        if comas.str.fullmatch(r'-?\d{1,3}(?:,\d{3})+').all() and (comas.str.count(',') > 1).any():
+            return '.', ','
+        return ',', '.'
+
+    if con_punto.any():
+        puntos = muestra[con_punto]
+        if puntos.str.fullmatch(r'-?\d{1,3}(?:\.\d{3})+').all():
+            if con_formato or (puntos.str.count(r'\.') > 1).any():
+                return ',', '.'
+            logger.warning(f"Precios ambiguos en {muestra.name!r} ({puntos.iloc[0]!r}): se leen con punto decimal; "
+                           f"si el punto es de miles, declare \"separadores\": [\",\", \".\"] en el perfil")
+    return '.', ','
+
+
+def _textos(columna):
+    """Celdas de texto de la columna, sin espacios en los extremos (nulo en las demás)
+
+    Si todas las celdas no vacías son texto y pyarrow está instalado, se usan
+    cadenas Arrow, cuyas operaciones (regex incluidas) se ejecutan en C++ y no
+    celda a celda en Python.
+    """
+    if pa is not None and pd.api.types.infer_dtype(columna, skipna=True) == 'string':
+        return columna.astype('string[pyarrow]').str.strip()
+    try:
+        return columna.str.strip()
+    except AttributeError:
+        # Columna sin ningún texto
+        return pd.Series(np.nan, index=columna.index, dtype=object)
+
+
+def _quitar(textos, patrones, regex=False):
+    """Quita los patrones (símbolos de moneda y espacios) del texto"""
+    for patron in patrones:
+        textos = textos.str.replace(patron, '', regex=regex)
+    return textos
+
+
+def _encaja(textos, patron):
+    return textos.str.fullmatch(patron).astype('boolean').fillna(False).to_numpy(dtype=bool)
+
+
+def _a_numero(textos, decimal, miles):
+    """Quita el separador de miles, pasa el decimal a punto y el guion contable a cero"""
+    textos = textos.str.replace(miles, '', regex=False)
+    if decimal != '.':
+        textos = textos.str.replace(decimal, '.', regex=False)
+    return textos.mask((textos == '-').fillna(False), '0')
+
+
+def parsear_precios(columna, separadores=None):
+    """Convierte una columna de precios a float64
+
+    Devuelve (precios, no_reconocidos, separadores): no_reconocidos contiene
+    el texto original de las celdas que no son un precio con los separadores
+    de la columna (NaN en precios), con su índice, y separadores es el par
+    (decimal, miles) usado, para reutilizarlo en los bloques siguientes de un
+    mismo archivo.
+    """
+    vacio = pd.Series(dtype=object)
+    if pd.api.types.is_numeric_dtype(columna) and not pd.api.types.is_bool_dtype(columna):
+        return columna.astype('float64'), vacio, separadores
+
+    # Celdas de texto (nulo en las numéricas y vacías) y celdas ya numéricas
+    textos = _textos(columna)
+    es_texto = textos.notna().to_numpy(dtype=bool)
+    if not es_texto.any():
+        return pd.to_numeric(columna, errors='coerce').astype('float64'), vacio, separadores
+
+    if separadores is None:
+        muestra = textos[es_texto].head(TAMANO_MUESTRA).astype(object)
+        con_formato = muestra.str.contains(_RE_MONEDA).any()
+        separadores = detectar_separadores(muestra.str.replace(_RE_SIMBOLOS, '', regex=True), con_formato)
+    decimal, miles = separadores
+
+    # Vía rápida: sustituciones literales de lo habitual (euro, espacios)
+    patron = _patron_precio(decimal, miles)
+    sin_simbolos = _quitar(textos, ['€', ' ', '\xa0'])
+    valido = _encaja(sin_simbolos, patron)
+    # Las celdas con otros símbolos ($, £, EUR, tabuladores...) pasan por la regex completa
+    dudosas = es_texto & ~valido
+    if dudosas.any():
+        sin_simbolos[dudosas] = _quitar(textos[dudosas], [f"(?i){_SIMBOLOS}"], regex=True)
+        valido = _encaja(sin_simbolos, patron)
+    # Solo las celdas con el formato de la columna se convierten; las demás se informan
+    limpio = _a_numero(sin_simbolos.where(valido), decimal, miles)
+    if isinstance(limpio.dtype, pd.StringDtype):
+        # Cast de Arrow: todas las celdas que quedan son números válidos
+        convertidos = limpio.astype('Float64').astype('float64')
+    else:
+        convertidos = pd.to_numeric(limpio, errors='coerce').astype('float64')
+
+    precios = convertidos
+    if not es_texto.all():
+        numeros = pd.to_numeric(columna.where(~es_texto), errors='coerce').astype('float64')
+        precios = numeros.where(~es_texto, convertidos)
+    no_reconocidos = columna[es_texto & ~valido & (sin_simbolos != '').fillna(False).to_numpy(dtype=bool)]
+    return precios, no_reconocidos, separadores
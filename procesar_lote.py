@@ -10,16 +10,20 @@ y genera archivos CSV compatibles con Odoo, junto con un informe del proceso.
 
 import os
 import sys
-import pandas as pd
 import time
 from datetime import datetime
-from convertidor_proveedores import procesar_archivo, detectar_proveedor
+from convertidor_proveedores import (
+    detectar_proveedor, cargar_registro, guardar_registro, convertir_si_cambia
+)
 
 # Configuración de directorios
 DIR_EJEMPLOS = "/home/espasiko/manusodoo/last/ejemplos"
 DIR_SALIDA = "/home/espasiko/manusodoo/last/odoo_import"
 DIR_INFORMES = "/home/espasiko/manusodoo/last/informes"
 
+# Reconvertir también los archivos que no han cambiado desde la última ejecución
+FORZAR = False
+
 def generar_informe(resultados):
     """Genera un informe detallado del procesamiento por lotes"""
     # Crear directorio de informes si no existe
@@ -33,6 +37,7 @@ def generar_informe(resultados):
     # Estadísticas
     total_archivos = len(resultados)
     archivos_exitosos = sum(1 for r in resultados if r['exito'])
+    archivos_sin_cambios = sum(1 for r in resultados if r.get('sin_cambios'))
     archivos_fallidos = total_archivos - archivos_exitosos
     
     # Escribir informe
@@ -47,6 +52,7 @@ def generar_informe(resultados):
         f.write("-" * 70 + "\n")
         f.write(f"Total de archivos procesados: {total_archivos}\n")
         f.write(f"Archivos convertidos exitosamente: {archivos_exitosos}\n")
+        f.write(f"  - Sin cambios (salidas anteriores reutilizadas): {archivos_sin_cambios}\n")
         f.write(f"Archivos con errores: {archivos_fallidos}\n\n")
         
         f.write("DETALLE POR ARCHIVO:\n")
@@ -55,7 +61,10 @@ def generar_informe(resultados):
         for resultado in resultados:
             f.write(f"Archivo: {resultado['archivo']}\n")
             f.write(f"Proveedor: {resultado['proveedor'] if resultado['proveedor'] else 'No detectado'}\n")
-            f.write(f"Estado: {'Éxito' if resultado['exito'] else 'Error'}\n")
+            if resultado.get('sin_cambios'):
+                f.write("Estado: Sin cambios\n")
+            else:
+                f.write(f"Estado: {'Éxito' if resultado['exito'] else 'Error'}\n")
             
             if resultado['exito']:
                 f.write(f"Archivos generados:\n")
@@ -70,14 +79,6 @@ def generar_informe(resultados):
     print(f"\nInforme generado: {ruta_informe}")
     return ruta_informe
 
-def contar_productos(ruta_archivo):
-    """Cuenta el número de productos en un archivo CSV generado"""
-    try:
-        df = pd.read_csv(ruta_archivo)
-        return len(df)
-    except Exception:
-        return 0
-
 def procesar_lote():
     """Procesa todos los archivos de proveedores en el directorio de ejemplos"""
     # Verificar que exista el directorio de ejemplos
@@ -99,6 +100,9 @@ def procesar_lote():
     
     print(f"Se encontraron {len(archivos)} archivos para procesar")
     
+    # Conversiones anteriores, para no repetir las de archivos sin cambios
+    registro = cargar_registro(DIR_SALIDA)
+    
     # Procesar cada archivo y registrar resultados
     resultados = []
     for i, archivo in enumerate(archivos, 1):
@@ -114,44 +118,37 @@ def procesar_lote():
             'exito': False,
             'error': None,
             'archivos_generados': [],
-            'productos_procesados': 0
+            'productos_procesados': 0,
+            'sin_cambios': False
         }
         
         # Intentar procesar el archivo
         try:
-            # Obtener lista de archivos en el directorio de salida antes de procesar
-            archivos_antes = set(os.listdir(DIR_SALIDA))
-            
-            # Procesar el archivo
-            exito = procesar_archivo(ruta_completa, DIR_SALIDA)
+            # Procesar el archivo (o reutilizar la conversión anterior si no ha cambiado)
+            conversion = convertir_si_cambia(ruta_completa, DIR_SALIDA, registro, forzar=FORZAR)
             
-            if exito:
-                # Obtener lista de archivos después de procesar
-                archivos_despues = set(os.listdir(DIR_SALIDA))
-                
-                # Identificar los archivos nuevos generados
-                archivos_nuevos = list(archivos_despues - archivos_antes)
-                archivos_nuevos_rutas = [os.path.join(DIR_SALIDA, f) for f in archivos_nuevos]
-                
+            if conversion['estado'] in ('ok', 'sin_cambios'):
                 resultado['exito'] = True
-                resultado['archivos_generados'] = archivos_nuevos
-                
-                # Contar productos procesados (del primer archivo generado)
-                if archivos_nuevos_rutas:
-                    resultado['productos_procesados'] = contar_productos(archivos_nuevos_rutas[0])
+                resultado['sin_cambios'] = conversion['estado'] == 'sin_cambios'
+                resultado['archivos_generados'] = [os.path.basename(salida) for salida in conversion['salidas']]
+                resultado['productos_procesados'] = conversion['filas']
             else:
-                resultado['error'] = "El procesamiento falló sin error específico"
+                resultado['error'] = conversion['error'] or "El procesamiento falló sin error específico"
         except Exception as e:
             resultado['error'] = str(e)
         
         resultados.append(resultado)
         
         # Mostrar resultado
-        if resultado['exito']:
+        if resultado['sin_cambios']:
+            print(f"  = Sin cambios: {resultado['productos_procesados']} productos (salidas anteriores)")
+        elif resultado['exito']:
             print(f"  ✓ Éxito: {resultado['productos_procesados']} productos procesados")
         else:
             print(f"  ✗ Error: {resultado['error']}")
     
+    guardar_registro(DIR_SALIDA, registro)
+    
     # Generar informe
     ruta_informe = generar_informe(resultados)
     
@@ -171,6 +168,7 @@ def main():
             print("\nOpciones:")
             print("  --dir-entrada=RUTA   Directorio de archivos de entrada (por defecto: ./ejemplos)")
             print("  --dir-salida=RUTA    Directorio para archivos de salida (por defecto: ./odoo_import)")
+            print("  --forzar             Convertir también los archivos que no han cambiado")
             print("  --help, -h           Mostrar esta ayuda")
             return
         
@@ -182,6 +180,9 @@ def main():
             elif arg.startswith('--dir-salida='):
                 global DIR_SALIDA
                 DIR_SALIDA = arg.split('=')[1]
+            elif arg == '--forzar':
+                global FORZAR
+                FORZAR = True
     
     # Confirmar directorios
     print(f"\nDirectorio de entrada: {DIR_EJEMPLOS}")
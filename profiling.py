@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+Perfilado por muestreo bajo demanda para peticiones individuales
+
+Una petición que envía la cabecera X-Profile-Token con el secreto configurado
+se ejecuta bajo un perfilador de muestreo: un hilo auxiliar toma la pila del
+hilo que atiende la petición a intervalos fijos y agrega las muestras en
+formato "folded" (compatible con flamegraph.pl y speedscope). El perfil se
+guarda en disco y su identificador se devuelve en la cabecera X-Profile-Id.
+
+Si no hay secreto configurado el middleware no se instala, de modo que
+desactivarlo no tiene coste alguno.
+"""
+
+import hmac
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from typing import Optional
+from uuid import uuid4
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from tracing import current_trace
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+_VALID_PROFILE_ID = re.compile(r"^[A-Za-z0-9\-]{8,64}$")
+
+
+def fold_stack(frame) -> str:
+    """Convierte una pila de frames en una línea folded (raíz primero)"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class SamplingProfiler:
+    """Muestrea periódicamente la pila de un hilo concreto"""
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[fold_stack(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+def write_folded(samples: Counter, path: str):
+    """Guarda las muestras en formato folded: 'pila;de;frames cuenta' por línea"""
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def profile_path(output_dir: str, profile_id: str) -> Optional[str]:
+    """Ruta del perfil guardado o None si el identificador no es válido"""
+    if not _VALID_PROFILE_ID.match(profile_id):
+        return None
+    return os.path.join(output_dir, f"{profile_id}.folded")
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI que perfila las peticiones que presentan el secreto"""
+
+    def __init__(self, app: ASGIApp, secret: str, output_dir: str = "profiles", interval: float = 0.001):
+        self.app = app
+        self.secret = secret.encode("utf-8")
+        self.output_dir = output_dir
+        self.interval = interval
+
+    def _authorized(self, scope: Scope) -> bool:
+        token = Headers(scope=scope).get(PROFILE_TOKEN_HEADER)
+        return token is not None and hmac.compare_digest(token.encode("utf-8"), self.secret)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._authorized(scope):
+            await self.app(scope, receive, send)
+            return
+
+        trace = current_trace()
+        profile_id = trace.trace_id if trace is not None else uuid4().hex
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, profile_id)
+            await send(message)
+
+        # Las peticiones async se ejecutan en el hilo del bucle de eventos;
+        # las muestras pueden incluir otras peticiones concurrentes en ese hilo
+        profiler = SamplingProfiler(threading.get_ident(), self.interval)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            samples = profiler.stop()
+            os.makedirs(self.output_dir, exist_ok=True)
+            write_folded(samples, profile_path(self.output_dir, profile_id))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Almacén persistente de proveedores para el middleware FastAPI
+
+Los proveedores se guardan en SQLite (project.db) en modo WAL. Las lecturas se
+sirven desde un índice en memoria y las escrituras se acumulan y se vuelcan en
+lote desde un hilo de fondo (write-behind), de modo que la latencia de la API
+no paga un fsync por cada actualización. Como contrapartida, un cierre abrupto
+puede perder como mucho el último intervalo de volcado.
+"""
+
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+PROVIDER_FIELDS = (
+    "name",
+    "tax_calculation_method",
+    "discount_type",
+    "payment_term",
+    "incentive_rules",
+    "status",
+)
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS providers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    tax_calculation_method TEXT,
+    discount_type TEXT,
+    payment_term TEXT,
+    incentive_rules TEXT,
+    status TEXT
+)
+"""
+
+_UPSERT = (
+    f"INSERT OR REPLACE INTO providers (id, {', '.join(PROVIDER_FIELDS)}) "
+    f"VALUES (?, {', '.join('?' for _ in PROVIDER_FIELDS)})"
+)
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(_CREATE_TABLE)
+    return conn
+
+
+def _row(provider: Dict[str, Any]) -> tuple:
+    return (provider["id"],) + tuple(provider.get(field) for field in PROVIDER_FIELDS)
+
+
+class ProviderStore:
+    """Índice de proveedores en memoria respaldado por SQLite con escritura diferida"""
+
+    def __init__(self, db_path: str, seed: Optional[Iterable[Dict[str, Any]]] = None,
+                 flush_interval: float = 0.5):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._index: Dict[int, Dict[str, Any]] = {}
+        # id -> registro a guardar, o None si hay que borrarlo
+        self._pending: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+
+        conn = _connect(db_path)
+        try:
+            cursor = conn.execute(
+                f"SELECT id, {', '.join(PROVIDER_FIELDS)} FROM providers ORDER BY id"
+            )
+            for row in cursor:
+                self._index[row[0]] = dict(zip(("id",) + PROVIDER_FIELDS, row))
+            if not self._index and seed:
+                # Primera ejecución: sembrar con los datos de ejemplo
+                with conn:
+                    for provider in seed:
+                        self._index[provider["id"]] = dict(provider)
+                        conn.execute(_UPSERT, _row(provider))
+        finally:
+            conn.close()
+
+        self._writer = threading.Thread(target=self._run, name="provider-store-writer", daemon=True)
+        self._writer.start()
+
+    # Lecturas (solo memoria)
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(p) for p in self._index.values()]
+
+    def get(self, provider_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            provider = self._index.get(provider_id)
+            return dict(provider) if provider is not None else None
+
+    # Escrituras (memoria inmediata, disco diferido)
+    def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            new_id = max(self._index, default=0) + 1
+            provider = {"id": new_id}
+            provider.update({field: data.get(field) for field in PROVIDER_FIELDS})
+            self._index[new_id] = provider
+            self._pending[new_id] = dict(provider)
+        self._wakeup.set()
+        return dict(provider)
+
+    def update(self, provider_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            provider = self._index.get(provider_id)
+            if provider is None:
+                return None
+            provider.update({field: data[field] for field in PROVIDER_FIELDS if field in data})
+            self._pending[provider_id] = dict(provider)
+        self._wakeup.set()
+        return dict(provider)
+
+    def delete(self, provider_id: int) -> bool:
+        with self._lock:
+            if self._index.pop(provider_id, None) is None:
+                return False
+            self._pending[provider_id] = None
+        self._wakeup.set()
+        return True
+
+    # Volcado a disco
+    def _run(self):
+        conn = _connect(self.db_path)
+        try:
+            while not self._closed.is_set():
+                self._wakeup.wait()
+                # Agrupar las escrituras que lleguen durante el intervalo
+                self._closed.wait(self.flush_interval)
+                self._wakeup.clear()
+                self._flush(conn)
+            self._flush(conn)
+        finally:
+            conn.close()
+
+    def _flush(self, conn: sqlite3.Connection):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        upserts = [_row(p) for p in pending.values() if p is not None]
+        deletes = [(provider_id,) for provider_id, p in pending.items() if p is None]
+        try:
+            with conn:
+                if upserts:
+                    conn.executemany(_UPSERT, upserts)
+                if deletes:
+                    conn.executemany("DELETE FROM providers WHERE id = ?", deletes)
+        except sqlite3.Error as e:
+            print(f"Error al guardar proveedores en {self.db_path}: {e}")
+            # Reencolar sin pisar cambios más recientes y reintentar en el siguiente ciclo
+            with self._lock:
+                for provider_id, provider in pending.items():
+                    self._pending.setdefault(provider_id, provider)
+            self._wakeup.set()
+
+    def close(self):
+        """Vuelca las escrituras pendientes y detiene el hilo de fondo"""
+        self._closed.set()
+        self._wakeup.set()
+        self._writer.join()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+Caché de respuestas JSON pre-codificadas para el middleware FastAPI
+
+Los listados grandes (catálogo de productos) se validan con Pydantic y se
+codifican a bytes una sola vez por llenado de caché. Las peticiones que
+encuentran la entrada vigente devuelven esos bytes directamente, sin volver
+a validar ni serializar cada elemento. Las variantes comprimidas (gzip/br)
+se guardan junto a los bytes originales y se calculan una vez por entrada.
+"""
+
+import json
+import time
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+
+from compression import compress, negotiate_encoding
+from tracing import span
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional; se usa json estándar si no está instalado
+    orjson = None
+
+
+def encode_json(data: Any) -> bytes:
+    """Codifica datos ya serializables a bytes JSON"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RawJSONResponse(Response):
+    """Respuesta JSON cuyo cuerpo ya está codificado en bytes"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return encode_json(content)
+
+
+class CachedPayload:
+    """Entrada de caché: elementos validados y su representación JSON"""
+    __slots__ = ("items", "body", "created_at", "variants")
+
+    def __init__(self, items: List[Dict[str, Any]], body: bytes):
+        self.items = items
+        self.body = body
+        self.created_at = time.monotonic()
+        self.variants: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        """Devuelve el cuerpo comprimido, comprimiéndolo solo la primera vez"""
+        variant = self.variants.get(encoding)
+        if variant is None:
+            with span("response.compress", encoding=encoding, size=len(self.body)):
+                variant = self.variants[encoding] = compress(self.body, encoding)
+        return variant
+
+    def response(self, accept_encoding: Optional[str] = None, minimum_size: int = 1024) -> Response:
+        """Construye la respuesta negociando una variante precomprimida"""
+        encoding = negotiate_encoding(accept_encoding) if len(self.body) >= minimum_size else None
+        if encoding is None:
+            return RawJSONResponse(self.body)
+        return RawJSONResponse(
+            self.encoded(encoding),
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+        )
+
+
+class PayloadCache:
+    """Caché en memoria con caducidad por tiempo para respuestas de listados"""
+
+    def __init__(self, ttl_seconds: float = 60):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, CachedPayload] = {}
+        self._adapters: Dict[Type[BaseModel], TypeAdapter] = {}
+
+    def _adapter(self, model: Type[BaseModel]) -> TypeAdapter:
+        adapter = self._adapters.get(model)
+        if adapter is None:
+            adapter = self._adapters[model] = TypeAdapter(List[model])
+        return adapter
+
+    def get(self, key: str) -> Optional[CachedPayload]:
+        """Devuelve la entrada vigente para la clave o None si no existe o caducó"""
+        with span("cache.get", key=key) as s:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created_at > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            s.set(hit=entry is not None)
+            return entry
+
+    def put(self, key: str, model: Type[BaseModel], items: List[Dict[str, Any]]) -> CachedPayload:
+        """Valida los elementos contra el modelo, los codifica y guarda el resultado"""
+        adapter = self._adapter(model)
+        with span("response.encode", key=key, record_count=len(items)):
+            validated = adapter.dump_python(adapter.validate_python(items), mode="json")
+            entry = CachedPayload(validated, encode_json(validated))
+        self._entries[key] = entry
+        return entry
+
+    def invalidate(self, key: Optional[str] = None):
+        """Elimina una entrada concreta o toda la caché"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
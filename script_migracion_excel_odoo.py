@@ -16,6 +16,8 @@ from datetime import datetime
 import re
 from typing import Dict, List, Optional, Tuple, Any
 
+from precios import parsear_precios
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -159,6 +161,14 @@ class MigradorExcelOdoo:
                     logger.error(f"Columna requerida '{col}' no encontrada en el archivo")
                     return 0
             
+            # Precios con formato local ("1.234,56 €") a números antes de recorrer las filas
+            for campo in ('precio_venta', 'precio_compra'):
+                columna = mapeo_columnas.get(campo)
+                if columna in df.columns:
+                    df[columna], no_reconocidos, _ = parsear_precios(df[columna])
+                    if len(no_reconocidos):
+                        logger.warning(f"{len(no_reconocidos)} valores de '{columna}' no son precios y se omiten")
+            
             # Procesar cada fila
             productos_creados = 0
             for _, fila in df.iterrows():
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+Índice de stock bajo para el middleware FastAPI
+
+Mantiene los productos ordenados por cantidad disponible (qty_available) para
+responder consultas de umbral ("stock < N") con una búsqueda binaria en lugar
+de recorrer el catálogo completo. El índice se carga entero la primera vez y
+después se actualiza solo con los cambios de Odoo: plantillas modificadas y
+quants de stock escritos desde la última sincronización.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# execute(modelo, método, args, kwargs) -> resultado de execute_kw
+OdooExecute = Callable[..., Any]
+
+PRODUCT_FIELDS = ['id', 'name', 'default_code', 'categ_id', 'list_price', 'qty_available', 'active']
+ODOO_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def product_from_odoo(p: Dict[str, Any], category_name: str) -> Dict[str, Any]:
+    """Transforma un product.template de Odoo al formato del frontend"""
+    return {
+        "id": p['id'],
+        "name": p['name'],
+        "code": p.get('default_code', '') or f"PROD-{p['id']}",
+        "category": category_name,
+        "price": p.get('list_price', 0.0),
+        "stock": int(p.get('qty_available', 0)),
+        "image_url": f"https://example.com/images/product_{p['id']}.jpg"
+    }
+
+
+class StockIndex:
+    """Productos ordenados por stock con actualización incremental desde Odoo"""
+
+    def __init__(self, refresh_seconds: float = 30, full_resync_seconds: float = 600):
+        self.refresh_seconds = refresh_seconds
+        self.full_resync_seconds = full_resync_seconds
+        self._lock = threading.Lock()
+        self._sorted: List[Tuple[float, int]] = []       # (qty_available, id)
+        self._products: Dict[int, Dict[str, Any]] = {}   # id -> producto en formato frontend
+        self._qty: Dict[int, float] = {}
+        self._watermark: Optional[str] = None            # último write_date sincronizado (UTC)
+        self._last_attempt = float("-inf")
+        self._last_full_sync = 0.0
+
+    def __len__(self):
+        return len(self._products)
+
+    @property
+    def loaded(self) -> bool:
+        return self._watermark is not None
+
+    # Mantenimiento del índice
+    def upsert(self, product: Dict[str, Any], qty: float):
+        with self._lock:
+            product_id = product["id"]
+            old_qty = self._qty.get(product_id)
+            if old_qty is not None:
+                pos = bisect_left(self._sorted, (old_qty, product_id))
+                del self._sorted[pos]
+            insort(self._sorted, (qty, product_id))
+            self._qty[product_id] = qty
+            self._products[product_id] = product
+
+    def remove(self, product_id: int):
+        with self._lock:
+            qty = self._qty.pop(product_id, None)
+            if qty is None:
+                return
+            del self._sorted[bisect_left(self._sorted, (qty, product_id))]
+            del self._products[product_id]
+
+    def replace(self, entries: Iterable[Tuple[Dict[str, Any], float]]):
+        """Sustituye todo el contenido por los pares (producto, cantidad)
+
+        El índice nuevo se construye fuera del cerrojo y se intercambia de una
+        vez: los lectores ven el anterior o el nuevo, nunca uno vacío o a medias.
+        """
+        products: Dict[int, Dict[str, Any]] = {}
+        qty: Dict[int, float] = {}
+        for product, quantity in entries:
+            products[product["id"]] = product
+            qty[product["id"]] = quantity
+        ordered = sorted((quantity, product_id) for product_id, quantity in qty.items())
+        with self._lock:
+            self._sorted, self._products, self._qty = ordered, products, qty
+
+    # Consultas
+    def count_below(self, threshold: float) -> int:
+        """Número de productos con stock estrictamente menor que el umbral"""
+        with self._lock:
+            return bisect_left(self._sorted, (threshold, -1))
+
+    def below(self, threshold: float) -> List[Dict[str, Any]]:
+        """Productos con stock menor que el umbral, de menor a mayor stock"""
+        with self._lock:
+            end = bisect_left(self._sorted, (threshold, -1))
+            return [self._products[product_id] for _, product_id in self._sorted[:end]]
+
+    def category_counts(self) -> Counter:
+        with self._lock:
+            return Counter(p["category"] for p in self._products.values())
+
+    # Sincronización con Odoo
+    def refresh_if_stale(self, connect: Callable[[], Optional[OdooExecute]]):
+        """Sincroniza con Odoo si ha pasado el tiempo de refresco desde el último intento
+
+        `connect` solo se invoca entonces: autenticar contra Odoo cuesta un RPC
+        y el índice se consulta en cada petición de stock bajo y del panel.
+        """
+        now = time.monotonic()
+        if now - self._last_attempt < self.refresh_seconds:
+            return
+        self._last_attempt = now
+        execute = connect()
+        if execute is None:
+            return
+        full = not self.loaded or now - self._last_full_sync >= self.full_resync_seconds
+        self.sync(execute, full=full)
+
+    def sync(self, execute: OdooExecute, full: bool = False):
+        """Carga todo el catálogo (full) o solo los productos cambiados desde la última vez"""
+        # Margen de unos segundos para no perder escrituras concurrentes con la consulta
+        started = (datetime.utcnow() - timedelta(seconds=5)).strftime(ODOO_DATETIME_FORMAT)
+
+        if full:
+            template_ids = execute('product.template', 'search', [[]])
+        else:
+            template_ids = self._changed_template_ids(execute)
+
+        records = []
+        if template_ids:
+            records = execute('product.template', 'read', [list(template_ids)], {'fields': PRODUCT_FIELDS})
+
+        categories = self._category_names(execute, records)
+        entries, archived = [], []
+        for p in records:
+            if p.get('active') is False:
+                archived.append(p['id'])
+                continue
+            category_name = categories.get(p['categ_id'][0], "Sin categoría") if p.get('categ_id') else "Sin categoría"
+            entries.append((product_from_odoo(p, category_name), float(p.get('qty_available', 0) or 0)))
+
+        if full:
+            # Índice nuevo construido aparte y sustituido de una vez
+            self.replace(entries)
+            self._last_full_sync = time.monotonic()
+        else:
+            for product_id in archived:
+                self.remove(product_id)
+            for product, qty in entries:
+                self.upsert(product, qty)
+        self._watermark = started
+
+    def _changed_template_ids(self, execute: OdooExecute) -> set:
+        since = [['write_date', '>', self._watermark]]
+        # Incluir archivados para poder retirarlos del índice
+        changed = set(execute('product.template', 'search', [since + [['active', 'in', [True, False]]]]))
+
+        quants = execute('stock.quant', 'search_read', [since], {'fields': ['product_id']})
+        variant_ids = list({q['product_id'][0] for q in quants if q.get('product_id')})
+        if variant_ids:
+            variants = execute('product.product', 'read', [variant_ids], {'fields': ['product_tmpl_id']})
+            changed.update(v['product_tmpl_id'][0] for v in variants if v.get('product_tmpl_id'))
+        return changed
+
+    @staticmethod
+    def _category_names(execute: OdooExecute, records: Iterable[Dict[str, Any]]) -> Dict[int, str]:
+        """Lee en una sola llamada los nombres de todas las categorías implicadas"""
+        category_ids = list({p['categ_id'][0] for p in records if p.get('categ_id')})
+        if not category_ids:
+            return {}
+        categories = execute('product.category', 'read', [category_ids], {'fields': ['name']})
+        return {c['id']: c['name'] for c in categories}
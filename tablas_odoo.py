@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Salidas columnares de la conversión a Odoo
+
+Junto a cada CSV de product_template y product_product el convertidor escribe
+una tabla Arrow IPC (.arrow) con un esquema explícito: precios en float64,
+indicadores en bool, secuencias en int64 y el resto como texto. Las
+herramientas que vuelven a leer las salidas prefieren la tabla al CSV: se abre
+con memoria mapeada sin parsear texto, y el número de filas sale de los
+metadatos de los lotes de la tabla sin leer ninguna fila.
+
+El CSV se sigue escribiendo porque es lo que importa Odoo. Con pyarrow también
+se genera con las funciones de cadenas de Arrow (ver escribir_csv); sin
+pyarrow solo se escriben y se leen los CSV, con pandas.
+"""
+
+import csv
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+except ImportError:  # pyarrow es opcional; sin él solo se escriben los CSV
+    pa = None
+
+EXTENSION = '.arrow'
+
+# Tipo Arrow de las columnas de Odoo que no son texto
+_TIPOS = {
+    'list_price': 'float64',
+    'lst_price': 'float64',
+    'standard_price': 'float64',
+    'website_sequence': 'int64',
+    'sale_ok': 'bool_',
+    'purchase_ok': 'bool_',
+    'active': 'bool_',
+    'available_in_pos': 'bool_',
+    'to_weight': 'bool_',
+    'is_published': 'bool_',
+}
+
+# Filas que se convierten a texto de una vez al escribir un CSV
+FILAS_CSV = 100_000
+
+# Caracteres que obligan a entrecomillar un campo del CSV (los de csv.QUOTE_MINIMAL con el fin de línea de to_csv)
+_ESPECIALES = '[,"' + os.linesep + ']'
+
+
+def ruta_tabla(ruta_csv):
+    """Ruta de la tabla Arrow que acompaña a un CSV de salida"""
+    return os.path.splitext(ruta_csv)[0] + EXTENSION
+
+
+def salidas_con_tablas(rutas_csv):
+    """Los CSV de salida seguidos de las tablas Arrow que se escribieron junto a ellos"""
+    tablas = [ruta_tabla(ruta) for ruta in rutas_csv]
+    return list(rutas_csv) + [ruta for ruta in tablas if os.path.exists(ruta)]
+
+
+def _a_array(serie, tipo):
+    if tipo == 'float64':
+        return pa.array(pd.to_numeric(serie, errors='coerce'), type=pa.float64(), from_pandas=True)
+    if tipo == 'int64':
+        return pa.array(pd.to_numeric(serie, errors='coerce').astype('Int64'), type=pa.int64())
+    if tipo == 'bool_':
+        return pa.array(serie.astype('boolean'), type=pa.bool_())
+    # Texto: los códigos numéricos (CECOTEC) se guardan como en el CSV
+    return _texto(serie)
+
+
+def _texto(serie):
+    """Array Arrow de texto de una columna (nulos como nulos)
+
+    Las categóricas se convierten categoría a categoría y las columnas de
+    texto de Arrow se pasan tal cual, sin un objeto de Python por celda.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = _texto(pd.Series(serie.cat.categories))
+        codigos = serie.cat.codes.to_numpy()
+        return categorias.take(pa.array(codigos, mask=codigos < 0))
+    if isinstance(serie.dtype, pd.StringDtype) and serie.dtype.storage == 'pyarrow':
+        return pc.cast(pa.array(serie), pa.string())
+    return pa.array(serie.astype('string'), type=pa.string())
+
+
+def a_tabla(df):
+    """Tabla Arrow con el esquema de las salidas de Odoo"""
+    arrays = [_a_array(df[nombre].reset_index(drop=True), _TIPOS.get(nombre, 'string'))
+              for nombre in df.columns]
+    return pa.Table.from_arrays(arrays, names=[str(nombre) for nombre in df.columns])
+
+
+class EscritorTabla:
+    """Escribe la tabla Arrow de un CSV de salida, de una vez o por bloques
+
+    Sin pyarrow no escribe nada y `ruta` es None.
+    """
+
+    def __init__(self, ruta_csv):
+        self.ruta = ruta_tabla(ruta_csv) if pa is not None else None
+        self._destino = None
+        self._escritor = None
+
+    def escribir(self, df):
+        if self.ruta is None:
+            return
+        tabla = a_tabla(df)
+        if self._escritor is None:
+            self._destino = pa.OSFile(self.ruta, 'wb')
+            self._escritor = pa.ipc.new_file(self._destino, tabla.schema)
+        self._escritor.write_table(tabla)
+
+    def cerrar(self):
+        if self._escritor is not None:
+            self._escritor.close()
+            self._destino.close()
+            self._escritor = self._destino = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+
+def _entrecomillar(textos):
+    """Campos del CSV: vacíos los nulos y entre comillas los que llevan comas, comillas o fines de línea"""
+    textos = pc.fill_null(textos, '')
+    especiales = pc.match_substring_regex(textos, _ESPECIALES)
+    if not pc.any(especiales).as_py():
+        return textos
+    citados = pc.binary_join_element_wise('"', pc.replace_substring(textos, '"', '""'), '"', '')
+    return pc.if_else(especiales, citados, textos)
+
+
+def _admite_csv(tipo):
+    """Tipos de columna que escribir_csv convierte a texto igual que to_csv"""
+    if isinstance(tipo, np.dtype):
+        return tipo.kind in 'biufO'
+    return isinstance(tipo, pd.CategoricalDtype) or (isinstance(tipo, pd.StringDtype) and tipo.storage == 'pyarrow')
+
+
+def _campos_csv(serie):
+    """Campos de una columna tal como los escribe to_csv, o un único texto si es constante"""
+    tipo = serie.dtype
+    if isinstance(tipo, pd.CategoricalDtype):
+        if len(tipo.categories) == 1 and (serie.cat.codes == 0).all():
+            return _entrecomillar(_texto(pd.Series(tipo.categories)))[0].as_py()
+    elif tipo.kind == 'b':
+        valores = serie.to_numpy()
+        if valores.all() or not valores.any():
+            return str(bool(valores[0]))
+        return pc.if_else(pa.array(valores), 'True', 'False')
+    elif tipo.kind == 'f':
+        # Representación de numpy, la misma que usa to_csv sin float_format
+        valores = serie.to_numpy()
+        return pc.fill_null(pa.array(valores.astype(str), mask=np.isnan(valores)), '')
+    elif tipo.kind in 'iu':
+        return pc.cast(pa.array(serie.to_numpy()), pa.string())
+    return _entrecomillar(_texto(serie))
+
+
+def _escribir_textos(f, textos):
+    """Escribe seguidos los textos de un array de Arrow directamente desde su buffer de datos"""
+    if isinstance(textos, pa.ChunkedArray):
+        for trozo in textos.chunks:
+            _escribir_textos(f, trozo)
+        return
+    _, desplazamientos, datos = textos.buffers()
+    desplazamientos = np.frombuffer(
+        desplazamientos, dtype=np.int64 if pa.types.is_large_string(textos.type) else np.int32)
+    f.write(memoryview(datos)[desplazamientos[textos.offset]:desplazamientos[textos.offset + len(textos)]])
+
+
+def escribir_csv(df, ruta, modo='w', cabecera=True):
+    """Escribe un DataFrame de salida en CSV con el mismo texto que to_csv(index=False)
+
+    Con pyarrow, cada bloque de FILAS_CSV filas se convierte a texto con las
+    funciones de cadenas de Arrow y sus líneas se escriben desde el buffer del
+    array: las columnas constantes (categóricas de una sola categoría,
+    indicadores iguales en todas las filas) se convierten una sola vez y
+    ninguna celda pasa por un objeto de Python. Sin pyarrow, con una sola
+    columna o con columnas de otros tipos (fechas) se usa to_csv.
+    """
+    if pa is None or len(df.columns) < 2 or not all(map(_admite_csv, df.dtypes)):
+        df.to_csv(ruta, mode=modo, header=cabecera, index=False)
+        return
+    with open(ruta, modo + 'b') as f:
+        if cabecera:
+            texto = io.StringIO()
+            csv.writer(texto, lineterminator=os.linesep).writerow(df.columns)
+            f.write(texto.getvalue().encode('utf-8'))
+        for inicio in range(0, len(df), FILAS_CSV):
+            bloque = df.iloc[inicio:inicio + FILAS_CSV]
+            campos = [_campos_csv(bloque.iloc[:, i]) for i in range(len(bloque.columns))]
+            lineas = pc.binary_join_element_wise(pc.binary_join_element_wise(*campos, ','), os.linesep, '')
+            if isinstance(lineas, pa.Scalar):
+                # Todas las columnas son constantes: la misma línea en cada fila
+                f.write(lineas.as_py().encode('utf-8') * len(bloque))
+            else:
+                _escribir_textos(f, lineas)
+
+
+def escribir_tabla(df, ruta_csv):
+    """Escribe la tabla Arrow de un CSV de salida y devuelve su ruta (None sin pyarrow)"""
+    with EscritorTabla(ruta_csv) as escritor:
+        escritor.escribir(df)
+    return escritor.ruta
+
+
+def abrir_tabla(ruta):
+    """Tabla Arrow de una salida (ruta del CSV o de la tabla) con memoria mapeada, o None si no hay"""
+    tabla = ruta if ruta.endswith(EXTENSION) else ruta_tabla(ruta)
+    if pa is None or not os.path.exists(tabla):
+        return None
+    # Los buffers de la tabla apuntan al archivo mapeado; no se copia ni se parsea nada
+    return pa.ipc.open_file(pa.memory_map(tabla, 'r')).read_all()
+
+
+def leer_salida(ruta_csv):
+    """DataFrame de una salida de la conversión, desde su tabla Arrow si existe"""
+    tabla = abrir_tabla(ruta_csv)
+    if tabla is not None:
+        return tabla.to_pandas()
+    return pd.read_csv(ruta_csv)
+
+
+def contar_filas(ruta_csv):
+    """Número de filas de una salida; con tabla Arrow solo se leen los metadatos de sus lotes"""
+    tabla = ruta_tabla(ruta_csv)
+    if pa is not None and os.path.exists(tabla):
+        lector = pa.ipc.open_file(pa.memory_map(tabla, 'r'))
+        return sum(lector.get_batch(i).num_rows for i in range(lector.num_record_batches))
+    return len(pd.read_csv(ruta_csv, usecols=[0]))
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+"""
+Trazas ligeras por petición para el middleware FastAPI
+
+Cada petición HTTP recibe un identificador de traza y registra spans anidados
+(llamadas XML-RPC a Odoo, consultas de caché, codificación de respuestas).
+Al terminar la petición se emite una línea de log JSON con todos los spans y
+el identificador se devuelve en la cabecera X-Trace-Id.
+"""
+
+import contextvars
+import json
+import logging
+import re
+import time
+import xmlrpc.client
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+TRACE_HEADER = "X-Trace-Id"
+
+# Solo se aceptan identificadores entrantes con formato razonable
+_VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9\-]{8,64}$")
+
+logger = logging.getLogger("odoo_middleware.tracing")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """Intervalo medido dentro de una traza"""
+    __slots__ = ("span_id", "parent_id", "name", "attributes", "start", "duration_ms", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.span_id = uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        """Añade atributos al span (número de registros, acierto de caché...)"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": self.duration_ms,
+        }
+        data.update(self.attributes)
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class _NoopSpan:
+    """Span vacío usado fuera de una petición trazada"""
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """Conjunto de spans de una petición"""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid4().hex
+        self.spans: List[Span] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace_id": self.trace_id, "spans": [s.to_dict() for s in self.spans]}
+
+
+def current_trace() -> Optional[Trace]:
+    """Devuelve la traza de la petición en curso, si la hay"""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Mide un bloque de código como span hijo del span activo"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent is not None else None, attributes)
+    trace.spans.append(current)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+        _current_span.reset(token)
+
+
+def emit(trace: Trace):
+    """Escribe la traza como una línea de log JSON"""
+    logger.info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+
+
+class TracedServerProxy:
+    """ServerProxy de XML-RPC que registra un span por cada llamada a Odoo"""
+
+    def __init__(self, uri: str, **kwargs):
+        self._proxy = xmlrpc.client.ServerProxy(uri, **kwargs)
+        self._service = uri.rstrip("/").rsplit("/", 1)[-1]
+
+    def __getattr__(self, name: str):
+        remote = getattr(self._proxy, name)
+        service = self._service
+
+        def traced(*args):
+            attributes = {"service": service, "method": name}
+            if name == "execute_kw" and len(args) >= 5:
+                attributes["model"] = args[3]
+                attributes["method"] = args[4]
+            with span("odoo.rpc", **attributes) as s:
+                result = remote(*args)
+                if isinstance(result, list):
+                    s.set(record_count=len(result))
+                return result
+
+        return traced
+
+
+class TracingMiddleware:
+    """Middleware ASGI que abre una traza por petición y la emite al terminar"""
+
+    def __init__(self, app: ASGIApp, header_name: str = TRACE_HEADER):
+        self.app = app
+        self.header_name = header_name
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = Headers(scope=scope).get(self.header_name)
+        trace = Trace(incoming if incoming and _VALID_TRACE_ID.match(incoming) else None)
+        token = _current_trace.set(trace)
+        status_code = {}
+
+        async def send_with_trace_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status_code["value"] = message["status"]
+                MutableHeaders(scope=message).append(self.header_name, trace.trace_id)
+            await send(message)
+
+        try:
+            with span("http.request", method=scope["method"], path=scope["path"]) as root:
+                await self.app(scope, receive, send_with_trace_id)
+                root.set(status_code=status_code.get("value"))
+        finally:
+            _current_trace.reset(token)
+            emit(trace)
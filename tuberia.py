@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tubería por bloques para convertir, enriquecer e importar productos
+
+Una tubería es una fuente de bloques (DataFrames, o diccionarios de
+DataFrames con nombre como {'product_template': ..., 'product_product': ...})
+seguida de etapas y sumideros:
+
+- Cada etapa es una función que recibe el iterable de bloques de la anterior
+  y devuelve otro (normalmente un generador), de modo que lectura,
+  normalización, enriquecimiento y emisión se encadenan sin materializar el
+  archivo completo.
+- Los sumideros reciben los bloques finales: CSV, tabla Arrow, Parquet o
+  creación directa en Odoo.
+
+Las etapas concretas (lectura de hojas, normalización según el perfil,
+plantillas de Odoo, enriquecimiento) viven en los módulos que ya las
+implementan; aquí solo está lo común a todas las tuberías: tiempos por etapa,
+contrapresión y sumideros.
+
+Con `max_bloques`, la fuente y las etapas se ejecutan en un hilo que adelanta
+como mucho ese número de bloques a los sumideros (contrapresión: si la
+escritura va más lenta, la lectura espera en lugar de acumular bloques).
+
+De cada etapa y sumidero se mide el tiempo de reloj; si se pide, también el
+tiempo de CPU del hilo que la ejecuta y las filas de los bloques que produce.
+"""
+
+import queue
+import threading
+import time
+
+import pandas as pd
+
+import tablas_odoo
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional; sin él no hay sumidero Parquet
+    pq = None
+
+# Señal de fin del hilo productor
+_FIN = object()
+
+
+def _filas(bloque):
+    """Filas de un bloque: un número para un DataFrame, {tabla: filas} para un bloque con nombre"""
+    if isinstance(bloque, dict):
+        return {nombre: len(df) for nombre, df in bloque.items()}
+    return len(bloque)
+
+
+def _sumar_filas(filas, nombre, bloque):
+    contadas = _filas(bloque)
+    if isinstance(contadas, dict):
+        total = filas.setdefault(nombre, {})
+        for tabla, n in contadas.items():
+            total[tabla] = total.get(tabla, 0) + n
+    else:
+        filas[nombre] = filas.get(nombre, 0) + contadas
+
+
+def _cronometrar(nombre, bloques, tiempos, metricas=None):
+    """Acumula en tiempos[nombre] lo que tarda cada bloque en llegar (incluye las etapas anteriores)
+
+    Con `metricas`, acumula también el tiempo de CPU del hilo en
+    metricas['cpu'] y las filas de los bloques en metricas['filas'].
+    """
+    iterador = iter(bloques)
+    tiempos.setdefault(nombre, 0.0)
+    if metricas is not None:
+        metricas['cpu'].setdefault(nombre, 0.0)
+    while True:
+        inicio = time.perf_counter()
+        inicio_cpu = time.thread_time()
+        try:
+            bloque = next(iterador)
+        except StopIteration:
+            bloque = _FIN
+        tiempos[nombre] += time.perf_counter() - inicio
+        if metricas is not None:
+            metricas['cpu'][nombre] += time.thread_time() - inicio_cpu
+        if bloque is _FIN:
+            return
+        if metricas is not None:
+            _sumar_filas(metricas['filas'], nombre, bloque)
+        yield bloque
+
+
+def encadenar(fuente, etapas, tiempos, metricas=None):
+    """Conecta la fuente con las etapas ([(nombre, etapa)]) midiendo el tiempo de cada una
+
+    Los tiempos que quedan en `tiempos` (y en metricas['cpu']) al agotar los
+    bloques son acumulados (cada etapa incluye a las anteriores); propios()
+    los convierte en el tiempo de cada etapa por separado.
+    """
+    bloques = _cronometrar('lectura', fuente, tiempos, metricas)
+    for nombre, etapa in etapas:
+        bloques = _cronometrar(nombre, etapa(bloques), tiempos, metricas)
+    return bloques
+
+
+def propios(tiempos, nombres):
+    """Tiempo propio de cada etapa a partir de los acumulados de encadenar()"""
+    anterior = 0.0
+    for nombre in nombres:
+        acumulado = tiempos.get(nombre, 0.0)
+        tiempos[nombre], anterior = max(acumulado - anterior, 0.0), acumulado
+    return tiempos
+
+
+def en_segundo_plano(bloques, max_bloques):
+    """Produce los bloques en un hilo, con como mucho `max_bloques` esperando a ser consumidos
+
+    Los errores del hilo productor se relanzan en el consumidor; si el
+    consumidor abandona (error en un sumidero), el productor se detiene.
+    """
+    cola = queue.Queue(maxsize=max_bloques)
+    parar = threading.Event()
+
+    def poner(elemento):
+        while not parar.is_set():
+            try:
+                cola.put(elemento, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producir():
+        try:
+            for bloque in bloques:
+                if not poner(bloque):
+                    return
+            poner(_FIN)
+        except BaseException as e:
+            poner(e)
+
+    hilo = threading.Thread(target=producir, name='tuberia', daemon=True)
+    hilo.start()
+    try:
+        while True:
+            elemento = cola.get()
+            if elemento is _FIN:
+                return
+            if isinstance(elemento, BaseException):
+                raise elemento
+            yield elemento
+    finally:
+        parar.set()
+        hilo.join()
+
+
+def ejecutar(fuente, etapas=(), sumideros=(), max_bloques=0, metricas=None):
+    """Ejecuta fuente -> etapas -> sumideros y devuelve los segundos de cada etapa y sumidero
+
+    `etapas` es una lista de (nombre, función sobre el iterable de bloques);
+    cada sumidero tiene `nombre`, escribir(bloque) y cerrar(). Con
+    `max_bloques` > 0 la lectura y las etapas van en un hilo aparte con
+    contrapresión; 'espera' es entonces lo que los sumideros esperaron bloques.
+
+    Si se pasa un diccionario `metricas`, se rellena con 'cpu' (segundos de
+    CPU de cada etapa y sumidero) y 'filas' (filas producidas por cada etapa).
+    """
+    tiempos = {}
+    if metricas is not None:
+        metricas.update(cpu={}, filas={})
+    bloques = encadenar(fuente, etapas, tiempos, metricas)
+    if max_bloques:
+        bloques = _cronometrar('espera', en_segundo_plano(bloques, max_bloques), tiempos)
+    try:
+        for bloque in bloques:
+            for sumidero in sumideros:
+                inicio = time.perf_counter()
+                inicio_cpu = time.thread_time()
+                sumidero.escribir(bloque)
+                tiempos[sumidero.nombre] = tiempos.get(sumidero.nombre, 0.0) + time.perf_counter() - inicio
+                if metricas is not None:
+                    metricas['cpu'][sumidero.nombre] = (metricas['cpu'].get(sumidero.nombre, 0.0)
+                                                        + time.thread_time() - inicio_cpu)
+    finally:
+        for sumidero in sumideros:
+            sumidero.cerrar()
+    nombres = ['lectura'] + [nombre for nombre, _ in etapas]
+    propios(tiempos, nombres)
+    if metricas is not None:
+        metricas['cpu'] = {nombre: round(segundos, 3)
+                           for nombre, segundos in propios(metricas['cpu'], nombres).items()}
+    return {nombre: round(segundos, 3) for nombre, segundos in tiempos.items()}
+
+
+def _tablas(bloque, rutas):
+    """Pares (ruta, DataFrame) de un bloque con nombre para las tablas que tienen ruta"""
+    return [(rutas[nombre], df) for nombre, df in bloque.items() if nombre in rutas]
+
+
+class SumideroCSV:
+    """Añade cada tabla del bloque a su CSV ({nombre de tabla: ruta}); el encabezado va con el primer bloque"""
+
+    nombre = 'csv'
+
+    def __init__(self, rutas):
+        self.rutas = rutas
+        self._escritas = set()
+
+    def escribir(self, bloque):
+        for ruta, df in _tablas(bloque, self.rutas):
+            primera = ruta not in self._escritas
+            tablas_odoo.escribir_csv(df, ruta, modo='w' if primera else 'a', cabecera=primera)
+            self._escritas.add(ruta)
+
+    def cerrar(self):
+        pass
+
+
+class SumideroArrow:
+    """Escribe cada tabla del bloque en la tabla Arrow tipada que acompaña a su CSV"""
+
+    nombre = 'arrow'
+
+    def __init__(self, rutas):
+        self._escritores = {nombre: tablas_odoo.EscritorTabla(ruta) for nombre, ruta in rutas.items()}
+
+    def escribir(self, bloque):
+        for nombre, df in bloque.items():
+            if nombre in self._escritores:
+                self._escritores[nombre].escribir(df)
+
+    def cerrar(self):
+        for escritor in self._escritores.values():
+            escritor.cerrar()
+
+
+class SumideroParquet:
+    """Escribe cada tabla del bloque en un archivo Parquet ({nombre de tabla: ruta}) con el esquema de Odoo"""
+
+    nombre = 'parquet'
+
+    def __init__(self, rutas):
+        if pq is None:
+            raise ImportError("El sumidero Parquet necesita pyarrow")
+        self.rutas = rutas
+        self._escritores = {}
+
+    def escribir(self, bloque):
+        for ruta, df in _tablas(bloque, self.rutas):
+            tabla = tablas_odoo.a_tabla(df)
+            if ruta not in self._escritores:
+                self._escritores[ruta] = pq.ParquetWriter(ruta, tabla.schema)
+            self._escritores[ruta].write_table(tabla)
+
+    def cerrar(self):
+        for escritor in self._escritores.values():
+            escritor.close()
+        self._escritores = {}
+
+
+class SumideroOdoo:
+    """Envía a Odoo cada bloque y cuenta los registros creados o actualizados
+
+    Con `cargar(df)` el bloque entero va en una sola llamada (por ejemplo
+    product.template.load, que crea o actualiza por ID externo) y devuelve
+    cuántos registros se cargaron. Con `crear(fila)` se crea fila a fila: recibe
+    la fila como diccionario y devuelve el id creado (o un valor falso si la
+    omitió). Con bloques con nombre se usa la tabla `tabla`.
+    """
+
+    nombre = 'odoo'
+
+    def __init__(self, crear=None, tabla=None, cargar=None):
+        self.crear = crear
+        self.cargar = cargar
+        self.tabla = tabla
+        self.creados = 0
+
+    def escribir(self, bloque):
+        df = bloque[self.tabla] if self.tabla else bloque
+        if self.cargar is not None:
+            self.creados += self.cargar(df)
+            return
+        for fila in df.to_dict('records'):
+            # Los nulos de pandas no se pueden enviar por XML-RPC
+            fila = {campo: (None if not isinstance(valor, (list, dict)) and pd.isna(valor) else valor)
+                    for campo, valor in fila.items()}
+            if self.crear(fila):
+                self.creados += 1
+
+    def cerrar(self):
+        pass